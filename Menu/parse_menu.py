@@ -7,203 +7,303 @@ import zipfile
 import xml.etree.ElementTree as ET
 import re
 
-try:
-    import pandas as pd
-except ImportError:  # pandas might not be available in some environments
-    pd = None
+# pandas chỉ là đường dự phòng (file .xls cũ...): import lười khi thật sự cần,
+# để import module này (web server, CLI, worker) không phải chờ import pandas
+_pandas = None
 
-def parse_excel_menu(filepath):
+# ============================================================================
+# CỘT TRONG FILE MENU
+# ============================================================================
+
+# Tên cột header theo thứ tự ưu tiên (format mới + cũ)
+NAME_HEADERS = ['Ten_san_pham', 'Tên', 'Ten', 'Tên món', 'Tên sản phẩm']
+UNIT_HEADERS = ['Don_vi_tinh', 'Đơn vị', 'Don_vi', 'Đơn vị tính']
+PRICE_HEADERS = ['Don_gia', 'Giá', 'Gia', 'Price']
+GROUP_HEADERS = ['Tên nhóm', 'Ten_nhom', 'Group', 'Nhóm']
+
+# File không có header nhận diện được: đọc theo vị trí cột A = tên, B = đơn vị, C = giá
+LEGACY_HEADER_NAMES = ['Ten_san_pham', 'Tinh_chat', 'Ma_so', 'Tên sản phẩm', 'Tính chất', 'Mã số']
+
+XLSX_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+DEFAULT_SHEET_PATH = 'xl/worksheets/sheet1.xml'
+
+CELL_REF_RE = re.compile(r'([A-Z]+)')
+
+def _load_pandas():
+    """Import pandas khi cần; None nếu môi trường không có pandas"""
+    global _pandas
+    if _pandas is None:
+        try:
+            import pandas
+        except ImportError:  # pandas might not be available in some environments
+            _pandas = False
+        else:
+            _pandas = pandas
+    return _pandas or None
+
+def _final_unit(unit):
+    """Chuẩn hóa đơn vị: trống / 'món' / 'dish' → 'Phần'"""
+    unit_clean = unit.strip() if unit else ''
+    unit_normalized = unit_clean.lower()
+    if not unit_clean:
+        return 'Phần'
+    if unit_normalized in {'món', 'mon', 'dish'}:
+        return 'Phần'
+    return unit_clean
+
+# ============================================================================
+# ĐỌC XLSX STREAMING (ZIPFILE + ITERPARSE, KHÔNG CẦN PANDAS)
+# ============================================================================
+
+def _column_index(cell_ref):
+    """'C12' -> 2 (cột tính từ 0); None nếu không có ref"""
+    match = CELL_REF_RE.match(cell_ref or '')
+    if not match:
+        return None
+    index = 0
+    for letter in match.group(1):
+        index = index * 26 + (ord(letter) - 64)
+    return index - 1
+
+def _string_item_text(elem):
+    """Text của <si> / <is>: <t> trực tiếp hoặc ghép các rich-text run <r><t>; bỏ phiên âm <rPh>"""
+    parts = []
+    for child in elem:
+        if child.tag == XLSX_MAIN_NS + 't':
+            parts.append(child.text or '')
+        elif child.tag == XLSX_MAIN_NS + 'r':
+            run_text = child.find(XLSX_MAIN_NS + 't')
+            if run_text is not None:
+                parts.append(run_text.text or '')
+    return ''.join(parts)
+
+def _read_shared_strings(zip_ref):
+    """Bảng shared strings (có thể không tồn tại nếu file chỉ dùng inline string)"""
+    strings = []
+    try:
+        f = zip_ref.open('xl/sharedStrings.xml')
+    except KeyError:
+        return strings
+    with f:
+        for _, elem in ET.iterparse(f, events=('end',)):
+            if elem.tag == XLSX_MAIN_NS + 'si':
+                strings.append(_string_item_text(elem))
+                elem.clear()
+    return strings
+
+def _first_sheet_path(zip_ref):
+    """Đường dẫn sheet đầu tiên theo workbook.xml + rels (giống pandas đọc sheet đầu)"""
+    try:
+        workbook = ET.fromstring(zip_ref.read('xl/workbook.xml'))
+        sheet = workbook.find(f'{XLSX_MAIN_NS}sheets/{XLSX_MAIN_NS}sheet')
+        rel_id = sheet.get(XLSX_REL_NS + 'id')
+        rels = ET.fromstring(zip_ref.read('xl/_rels/workbook.xml.rels'))
+    except (KeyError, AttributeError, ET.ParseError):
+        return DEFAULT_SHEET_PATH
+    for rel in rels.iter(XLSX_PACKAGE_REL_NS + 'Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target', '')
+            path = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+            return path if path in zip_ref.namelist() else DEFAULT_SHEET_PATH
+    return DEFAULT_SHEET_PATH
+
+def _cell_value(cell, strings):
+    """Giá trị cell dạng chuỗi (số giữ nguyên text trong <v>); None nếu cell trống"""
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        inline = cell.find(XLSX_MAIN_NS + 'is')
+        return _string_item_text(inline) if inline is not None else None
+    value = cell.find(XLSX_MAIN_NS + 'v')
+    if value is None or value.text is None:
+        return None
+    if cell_type == 's':
+        try:
+            return strings[int(value.text)]
+        except (ValueError, IndexError):
+            return None
+    if cell_type == 'b':
+        return 'True' if value.text == '1' else 'False'
+    return value.text
+
+def iter_xlsx_rows(filepath):
     """
-    Parse Excel file to extract menu items and prices
-    Returns list of dicts: [{'name': 'Taco Gà', 'unit': 'Phần', 'price': 55000}, ...]
+    Đọc sheet đầu tiên của file .xlsx theo kiểu streaming (iterparse từng <row>,
+    giải phóng ngay sau khi đọc). Yield list giá trị theo cột (None = cell trống).
     """
-    menu_items = []
+    with zipfile.ZipFile(filepath, 'r') as zip_ref:
+        strings = _read_shared_strings(zip_ref)
+        with zip_ref.open(_first_sheet_path(zip_ref)) as f:
+            for _, elem in ET.iterparse(f, events=('end',)):
+                if elem.tag != XLSX_MAIN_NS + 'row':
+                    continue
+                values = []
+                for cell in elem.iter(XLSX_MAIN_NS + 'c'):
+                    col = _column_index(cell.get('r'))
+                    if col is None:
+                        col = len(values)
+                    if col >= len(values):
+                        values.extend([None] * (col - len(values) + 1))
+                    values[col] = _cell_value(cell, strings)
+                elem.clear()
+                yield values
+
+def _resolve_header(header, candidates):
+    """Vị trí cột của header đầu tiên (theo thứ tự ưu tiên) có trong dòng header"""
+    for candidate in candidates:
+        if candidate in header:
+            return header[candidate]
+    return None
+
+def _items_from_header_rows(rows):
+    """
+    Món từ các dòng xlsx theo tên cột ở dòng đầu (cùng quy tắc với đường pandas).
+    Returns None nếu không tìm thấy cột tên / cột giá.
+    """
+    rows = iter(rows)
+    header = {}
+    for col, value in enumerate(next(rows, [])):
+        if value is not None:
+            header.setdefault(value.strip(), col)
+    name_col = _resolve_header(header, NAME_HEADERS)
+    price_col = _resolve_header(header, PRICE_HEADERS)
+    unit_col = _resolve_header(header, UNIT_HEADERS)
+    group_col = _resolve_header(header, GROUP_HEADERS)
+    if name_col is None or price_col is None:
+        return None
 
-    # ------------------------------------------------------------------
-    # 1) ƯU TIÊN ĐỌC BẰNG PANDAS (HỖ TRỢ FORMAT MỚI + CŨ)
-    # ------------------------------------------------------------------
-    if pd is not None:
+    def cell(values, col):
+        return values[col] if col is not None and col < len(values) else None
+
+    menu_items = []
+    for values in rows:
+        name = (cell(values, name_col) or '').strip()
+        if not name:
+            continue
         try:
-            df = pd.read_excel(filepath)
-            cols = list(df.columns)
-
-            # Tìm cột tên món
-            name_candidates = ['Ten_san_pham', 'Tên', 'Ten', 'Tên món', 'Tên sản phẩm']
-            name_col = next((c for c in name_candidates if c in cols), None)
-
-            # Tìm cột đơn vị
-            unit_candidates = ['Don_vi_tinh', 'Đơn vị', 'Don_vi', 'Đơn vị tính']
-            unit_col = next((c for c in unit_candidates if c in cols), None)
-
-            # Tìm cột giá
-            price_candidates = ['Don_gia', 'Giá', 'Gia', 'Price']
-            price_col = next((c for c in price_candidates if c in cols), None)
-
-            # Tìm cột nhóm (Tên nhóm / Group)
-            group_candidates = ['Tên nhóm', 'Ten_nhom', 'Group', 'Nhóm']
-            group_col = next((c for c in group_candidates if c in cols), None)
-
-            if name_col and price_col:
-                for _, row in df.iterrows():
-                    raw_name = row.get(name_col)
-                    if pd.isna(raw_name):
-                        continue
-                    name = str(raw_name).strip()
-                    if not name:
-                        continue
-
-                    raw_price = row.get(price_col, 0)
-                    try:
-                        price = float(raw_price)
-                    except (TypeError, ValueError):
-                        continue
-                    if price <= 0:
-                        continue
-
-                    if unit_col:
-                        raw_unit = row.get(unit_col)
-                        unit = str(raw_unit).strip() if pd.notna(raw_unit) else ''
-                    else:
-                        unit = ''
-
-                    unit_clean = unit.strip() if unit else ''
-                    unit_normalized = unit_clean.lower()
-                    if not unit_clean:
-                        final_unit = 'Phần'
-                    elif unit_normalized in {'món', 'mon', 'dish'}:
-                        final_unit = 'Phần'
-                    else:
-                        final_unit = unit_clean
-                    
-                    # Nhóm món (chỉ có ở một số file như simple-place-menu)
-                    if group_col:
-                        raw_group = row.get(group_col)
-                        group = str(raw_group).strip() if pd.notna(raw_group) else ''
-                    else:
-                        group = ''
-
-                    item = {
-                        'name': name,
-                        'unit': final_unit,
-                        'price': price
-                    }
-                    if group:
-                        item['group'] = group
-
-                    menu_items.append(item)
-
-                # Nếu đã đọc được dữ liệu hợp lệ thì trả về luôn
-                if menu_items:
-                    return menu_items
-        except Exception:
-            # Nếu pandas đọc lỗi (file lạ), fallback sang XML parsing cũ
-            menu_items = []
-
-    # ------------------------------------------------------------------
-    # 2) FALLBACK: PARSE TRỰC TIẾP BẰNG XML GIỐNG CODE CŨ
-    # ------------------------------------------------------------------
-    with zipfile.ZipFile(filepath, 'r') as zip_ref:
-        # Try to read shared strings (contains all text values) - may not exist
-        strings = []
+            price = float(cell(values, price_col) or 0)
+        except ValueError:
+            continue
+        if price <= 0:
+            continue
+
+        item = {
+            'name': name,
+            'unit': _final_unit(cell(values, unit_col)),
+            'price': price
+        }
+        # Nhóm món (chỉ có ở một số file như simple-place-menu)
+        group = (cell(values, group_col) or '').strip()
+        if group:
+            item['group'] = group
+        menu_items.append(item)
+    return menu_items
+
+def _items_from_positional_rows(rows):
+    """File không có header nhận diện được: cột A = tên, B = đơn vị, C = giá (như code cũ)"""
+    menu_items = []
+    rows = iter(rows)
+    next(rows, None)  # Skip header row
+    for values in rows:
+        if len(values) < 3:
+            continue
+        name = values[0] or ''
+        unit = values[1] or ''
+        price = 0
+        if values[2]:
+            try:
+                price = float(values[2])
+            except ValueError:
+                continue
+
+        # Only add valid menu items (bỏ các dòng header lặp lại)
+        if name and price > 0 and name not in LEGACY_HEADER_NAMES:
+            menu_items.append({
+                'name': name.strip(),
+                'unit': _final_unit(unit),
+                'price': price
+            })
+    return menu_items
+
+# ============================================================================
+# ĐƯỜNG DỰ PHÒNG: PANDAS (FILE KHÔNG PHẢI XLSX, VD .xls CŨ)
+# ============================================================================
+
+def _parse_menu_pandas(filepath, pd):
+    """Đọc bằng pandas.read_excel; Returns list món (rỗng nếu không có cột tên / giá)"""
+    df = pd.read_excel(filepath)
+    cols = list(df.columns)
+    name_col = next((c for c in NAME_HEADERS if c in cols), None)
+    unit_col = next((c for c in UNIT_HEADERS if c in cols), None)
+    price_col = next((c for c in PRICE_HEADERS if c in cols), None)
+    group_col = next((c for c in GROUP_HEADERS if c in cols), None)
+
+    menu_items = []
+    if not (name_col and price_col):
+        return menu_items
+    for _, row in df.iterrows():
+        raw_name = row.get(name_col)
+        if pd.isna(raw_name):
+            continue
+        name = str(raw_name).strip()
+        if not name:
+            continue
+
+        raw_price = row.get(price_col, 0)
         try:
-            with zip_ref.open('xl/sharedStrings.xml') as f:
-                strings_xml = f.read()
-                strings_root = ET.fromstring(strings_xml)
-                # Extract all text values
-                for t in strings_root.findall('.//{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t'):
-                    strings.append(t.text if t.text else '')
-        except KeyError:
-            # No shared strings file - will use inline strings
-            pass
-
-        # Read worksheet data
-        with zip_ref.open('xl/worksheets/sheet1.xml') as f:
-            sheet_xml = f.read()
-            sheet_root = ET.fromstring(sheet_xml)
-
-            # Parse rows
-            ns = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-            rows = sheet_root.findall('.//main:row', ns)
-
-            for row in rows[1:]:  # Skip header row
-                cells = row.findall('./main:c', ns)
-                if len(cells) < 3:
-                    continue
+            price = float(raw_price)
+        except (TypeError, ValueError):
+            continue
+        if price <= 0:
+            continue
 
-                # Get values from cells
-                name_cell = cells[0]
-                unit_cell = cells[1] if len(cells) > 1 else None
-                price_cell = cells[2] if len(cells) > 2 else None
-
-                # Extract name (from shared strings or inline)
-                name = ''
-                name_v = name_cell.find('./main:v', ns)
-                if name_v is not None:
-                    if name_cell.get('t') == 's':
-                        # Shared string
-                        idx = int(name_v.text)
-                        if idx < len(strings):
-                            name = strings[idx]
-                    else:
-                        # Inline string or direct value
-                        name = name_v.text if name_v.text else ''
-
-                # Try inline string if no shared string found
-                if not name:
-                    inline_str = name_cell.find('./main:is/main:t', ns)
-                    if inline_str is not None and inline_str.text:
-                        name = inline_str.text
-
-                # Extract unit (from shared strings or inline)
-                unit = ''
-                if unit_cell is not None:
-                    unit_v = unit_cell.find('./main:v', ns)
-                    if unit_v is not None:
-                        if unit_cell.get('t') == 's':
-                            # Shared string
-                            idx = int(unit_v.text)
-                            if idx < len(strings):
-                                unit = strings[idx]
-                        else:
-                            # Inline string or direct value
-                            unit = unit_v.text if unit_v.text else ''
-
-                    # Try inline string if no shared string found
-                    if not unit:
-                        inline_str = unit_cell.find('./main:is/main:t', ns)
-                        if inline_str is not None and inline_str.text:
-                            unit = inline_str.text
-
-                # Extract price (direct number)
-                price = 0
-                if price_cell is not None:
-                    price_v = price_cell.find('./main:v', ns)
-                    if price_v is not None and price_v.text:
-                        try:
-                            price = float(price_v.text)
-                        except (ValueError, TypeError):
-                            continue
-
-                # Only add valid menu items
-                if name and price > 0:
-                    # Skip header rows
-                    if name not in ['Ten_san_pham', 'Tinh_chat', 'Ma_so', 'Tên sản phẩm', 'Tính chất', 'Mã số']:
-                        unit_clean = unit.strip() if unit else ''
-                        unit_normalized = unit_clean.lower()
-                        if not unit_clean:
-                            final_unit = 'Phần'
-                        elif unit_normalized in {'món', 'mon', 'dish'}:
-                            final_unit = 'Phần'
-                        else:
-                            final_unit = unit_clean
-                        menu_items.append({
-                            'name': name.strip(),
-                            'unit': final_unit,
-                            'price': price
-                        })
+        if unit_col:
+            raw_unit = row.get(unit_col)
+            unit = str(raw_unit).strip() if pd.notna(raw_unit) else ''
+        else:
+            unit = ''
 
+        if group_col:
+            raw_group = row.get(group_col)
+            group = str(raw_group).strip() if pd.notna(raw_group) else ''
+        else:
+            group = ''
+
+        item = {
+            'name': name,
+            'unit': _final_unit(unit),
+            'price': price
+        }
+        if group:
+            item['group'] = group
+        menu_items.append(item)
     return menu_items
 
+# ============================================================================
+# API
+# ============================================================================
+
+def parse_excel_menu(filepath):
+    """
+    Parse Excel file to extract menu items and prices
+    Returns list of dicts: [{'name': 'Taco Gà', 'unit': 'Phần', 'price': 55000}, ...]
+
+    1) .xlsx: đọc streaming theo tên cột header (Ten_san_pham / Tên, Don_gia / Giá, ...)
+    2) Không nhận diện được header: đọc theo vị trí cột như code cũ
+    3) Không phải file xlsx (zip): pandas nếu có
+    """
+    try:
+        menu_items = _items_from_header_rows(iter_xlsx_rows(filepath))
+        if menu_items:
+            return menu_items
+        return _items_from_positional_rows(iter_xlsx_rows(filepath))
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        pd = _load_pandas()
+        if pd is None:
+            raise
+        return _parse_menu_pandas(filepath, pd)
+
 if __name__ == "__main__":
     print("Testing menu parsing...")
     print("=" * 70)
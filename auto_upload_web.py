@@ -5,8 +5,9 @@ WEB INTERFACE FOR AUTO UPLOAD
 Web interface để điều khiển auto_upload_simple.py từ trình duyệt
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 from flask_cors import CORS
+import os
 import threading
 import subprocess
 import sys
@@ -14,7 +15,6 @@ from pathlib import Path
 import json
 from datetime import datetime
 import io
-import contextlib
 
 # Project structure helpers
 BASE_DIR = Path(__file__).resolve().parent
@@ -27,19 +27,43 @@ if str(BASE_DIR) not in sys.path:
 from automation.process_invoices import (
     process_sale_by_payment_method,
     load_menus,
-    combine_files,
-    parse_invoices_from_html,
-    _process_and_save_invoices,
+    get_menu_index,
+    resolve_payment_sources,
+    process_invoice_sources,
     create_grab_invoice,
     SERVICE_FEE_ENABLED,
     SERVICE_FEE_PERCENTAGE,
     SERVICE_FEE_NAME,
     SERVICE_FEE_UNIT,
 )
+from automation.invoice_bundle import default_bundle_name, stream_invoice_bundle
+from automation.invoice_manifest import (
+    open_manifest,
+    rebuild_manifest,
+    remove_manifest_files,
+    manifest_file_names,
+    manifest_count,
+)
+from automation.job_queue import (
+    install_stdout_dispatcher,
+    capture_stdout,
+    submit_job,
+    get_job,
+    list_jobs,
+    cancel_job,
+)
+from automation.grab_batch import (
+    normalize_grab_records,
+    load_grab_records_text,
+    run_grab_batch,
+)
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app)
 
+# Log của từng request / job ghi theo thread (capture_stdout), không đổi sys.stdout của cả process
+install_stdout_dispatcher()
+
 # Global state
 script_process = None
 script_status = {
@@ -63,6 +87,23 @@ SCRIPT_PATH = AUTOMATION_DIR / "auto_upload_simple.py"
 FETCH_SCRIPT_PATH = AUTOMATION_DIR / "auto_fetch_fabi.py"
 DATA_DIR = BASE_DIR / "data"
 TAX_DIR = BASE_DIR / "tax_files"
+LOG_TAIL_LINES = 400
+
+def _wants_background(body):
+    """{"background": true} (hoặc ?background=1): chạy thành job nền, trả về job id ngay"""
+    value = body.get('background', request.args.get('background', ''))
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _job_accepted(job_id):
+    return jsonify({"success": True, "job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+def _tax_file_names():
+    """Tên các file trong tax_files/ theo manifest (không glob thư mục)"""
+    manifest = open_manifest(tax_dir=TAX_DIR)
+    try:
+        return manifest_file_names(manifest)
+    finally:
+        manifest.close()
 
 @app.route('/')
 def index():
@@ -214,12 +255,18 @@ def clear_files():
             return jsonify({"success": False, "error": "Thư mục tax_files không tồn tại"}), 400
         
         files_deleted = []
-        for file_path in TAX_DIR.glob("*.xlsx"):
-            try:
-                file_path.unlink()
-                files_deleted.append(file_path.name)
-            except Exception as e:
-                return jsonify({"success": False, "error": f"Lỗi khi xóa {file_path.name}: {str(e)}"}), 500
+        manifest = open_manifest(tax_dir=TAX_DIR)
+        try:
+            for file_path in TAX_DIR.glob("*.xlsx"):
+                try:
+                    file_path.unlink()
+                    files_deleted.append(file_path.name)
+                except Exception as e:
+                    return jsonify({"success": False, "error": f"Lỗi khi xóa {file_path.name}: {str(e)}"}), 500
+        finally:
+            remove_manifest_files(manifest, files_deleted)
+            manifest.commit()
+            manifest.close()
         
         return jsonify({
             "success": True,
@@ -328,68 +375,112 @@ def get_fetch_status():
         "exit_code": fetch_status["exit_code"],
     })
 
+def _parse_write_jobs(value):
+    """write_jobs từ request (0 = tất cả CPU). Raises ValueError nếu không phải số nguyên"""
+    try:
+        write_jobs = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("write_jobs must be an integer")
+    return write_jobs if write_jobs > 0 else (os.cpu_count() or 1)
+
+def _process_default_sources(full=False, write_jobs=1, bundle=None):
+    """
+    Xử lý file export trong data/ (nhiều file theo phương thức thanh toán hoặc 1 file),
+    không có data/ → file mặc định ở thư mục gốc. Returns số hóa đơn đã ghi.
+    """
+    # Prefer processing from data/ folder
+    if DATA_DIR.exists():
+        sources = resolve_payment_sources(DATA_DIR)
+        data_files = sorted([p for p in DATA_DIR.glob('*') if p.is_file()])
+
+        if len(sources) >= 2:
+            # Nhiều file theo phương thức thanh toán: đọc lần lượt, không gộp nội dung
+            print(f"\n📂 Using data/: " + " + ".join(f"{p.name} ({m})" for p, m in sources))
+            # Cache theo nội dung file + menu; hóa đơn không đổi so với ledger được bỏ qua
+            return process_invoice_sources(sources, 'combined', incremental=not full,
+                                           write_jobs=write_jobs, bundle=bundle)
+
+        # Single file path: pick the first .xls/.html-like file
+        preferred_exts = ['.xls', '.xlsx', '.html', '.htm']
+        candidates = [p for p in data_files if p.suffix.lower() in preferred_exts]
+        if not candidates and data_files:
+            candidates = data_files[:1]
+        if not candidates:
+            print("❌ No input files found in data/ folder")
+            return 0
+        input_path = candidates[0]
+        print(f"\n📂 Using data/: {input_path.name}")
+        # Detect source type from filename
+        name_lower = input_path.name.lower()
+        if 'atm' in name_lower:
+            source_type = 'atm'
+        elif 'transfer' in name_lower:
+            source_type = 'transfer'
+        else:
+            source_type = input_path.stem
+        return process_invoice_sources([(input_path, None)], source_type,
+                                       incremental=not full, write_jobs=write_jobs, bundle=bundle)
+
+    # Fallback to original default behavior (root files)
+    print("ℹ️ data/ not found, using default files in project root")
+    return process_sale_by_payment_method(incremental=not full, write_jobs=write_jobs, bundle=bundle) or 0
+
+def _process_default_job(full=False, write_jobs=1):
+    """Xử lý file export vào tax_files/. Returns dict created / processed / files (file mới)"""
+    TAX_DIR.mkdir(exist_ok=True)
+    before = _tax_file_names()
+    processed = _process_default_sources(full=full, write_jobs=write_jobs)  # Kể cả file trùng tên bị ghi đè
+    new_files = sorted(_tax_file_names() - before)
+    return {
+        "success": True,
+        "created": len(new_files),
+        "processed": processed,
+        "files": new_files,
+    }
+
 @app.route('/api/process-default', methods=['POST'])
 def process_default():
-    """Process invoices from data/ if present; otherwise fallback to defaults."""
-    TAX_DIR.mkdir(exist_ok=True)
-    before = set(p.name for p in TAX_DIR.glob('*.xlsx'))
+    """
+    Process invoices from data/ if present; otherwise fallback to defaults.
+    Optional JSON body: {"full": true, "write_jobs": 4} (write_jobs 0 = all CPUs).
+    {"background": true}: returns 202 {"job_id"} at once; poll /api/jobs/<job_id> for progress
+    (invoices parsed / written), logs and the result.
+    """
+    body = request.get_json(silent=True) or {}
+    # full=true: bỏ qua ledger, tạo lại file cho mọi hóa đơn
+    full = bool(body.get('full'))
+    try:
+        write_jobs = _parse_write_jobs(body.get('write_jobs', 1))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if _wants_background(body):
+        return _job_accepted(submit_job('process-default', _process_default_job, full=full, write_jobs=write_jobs))
+
     buf = io.StringIO()
     try:
-        with contextlib.redirect_stdout(buf):
-            # Prefer processing from data/ folder
-            if DATA_DIR.exists():
-                file_combined_1 = DATA_DIR / 'sale_by_payment_method.xls'
-                file_combined_2 = DATA_DIR / 'sale_by_payment_method (1).xls'
-                data_files = sorted([p for p in DATA_DIR.glob('*') if p.is_file()])
-
-                if file_combined_1.exists() and file_combined_2.exists():
-                    # Combined processing path
-                    print(f"\n📂 Using data/: {file_combined_1.name} + {file_combined_2.name}")
-                    content, _ = combine_files(str(file_combined_1), str(file_combined_2))
-                    all_menu_items, name_mapping, price_to_items = load_menus()
-                    invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, True)
-                    _process_and_save_invoices(invoices, 'combined', alcohol_items_found)
-                else:
-                    # Single file path: pick the first .xls/.html-like file
-                    preferred_exts = ['.xls', '.xlsx', '.html', '.htm']
-                    candidates = [p for p in data_files if p.suffix.lower() in preferred_exts]
-                    if not candidates and data_files:
-                        candidates = data_files[:1]
-                    if not candidates:
-                        print("❌ No input files found in data/ folder")
-                    else:
-                        input_path = candidates[0]
-                        print(f"\n📂 Using data/: {input_path.name}")
-                        with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                        all_menu_items, name_mapping, price_to_items = load_menus()
-                        is_combined = 'sale_by_payment_method' in input_path.name.lower()
-                        invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
-                        # Detect source type from filename
-                        name_lower = input_path.name.lower()
-                        if 'atm' in name_lower:
-                            source_type = 'atm'
-                        elif 'transfer' in name_lower:
-                            source_type = 'transfer'
-                        else:
-                            source_type = input_path.stem
-                        _process_and_save_invoices(invoices, source_type, alcohol_items_found)
-            else:
-                # Fallback to original default behavior (root files)
-                print("ℹ️ data/ not found, using default files in project root")
-                process_sale_by_payment_method()
-
-        logs = buf.getvalue().splitlines()[-400:]
-        after = set(p.name for p in TAX_DIR.glob('*.xlsx'))
-        new_files = sorted(list(after - before))
-        return jsonify({
-            "success": True,
-            "created": len(new_files),
-            "files": new_files,
-            "logs": logs,
-        })
+        with capture_stdout(buf):
+            result = _process_default_job(full=full, write_jobs=write_jobs)
+        return jsonify({**result, "logs": buf.getvalue().splitlines()[-LOG_TAIL_LINES:]})
     except Exception as e:
-        return jsonify({"success": False, "error": str(e), "logs": buf.getvalue().splitlines()[-400:]}), 500
+        return jsonify({"success": False, "error": str(e), "logs": buf.getvalue().splitlines()[-LOG_TAIL_LINES:]}), 500
+
+@app.route('/api/process-bundle', methods=['GET', 'POST'])
+def process_bundle():
+    """
+    Như /api/process-default nhưng không ghi file vào tax_files/: tất cả hóa đơn của lần chạy
+    (không bỏ qua hóa đơn đã tạo trước đó) được stream thành 1 file zip trong response.
+    Optional: ?write_jobs=4 hoặc JSON body {"write_jobs": 4}. Log in ra console của server.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        write_jobs = _parse_write_jobs(body.get('write_jobs', request.args.get('write_jobs', 1)))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    chunks = stream_invoice_bundle(
+        lambda bundle: _process_default_sources(full=True, write_jobs=write_jobs, bundle=bundle))
+    return Response(chunks, mimetype='application/zip',
+                    headers={"Content-Disposition": f'attachment; filename="{default_bundle_name()}"'})
 
 @app.route('/api/service-fee-status')
 def get_service_fee_status():
@@ -402,6 +493,36 @@ def get_service_fee_status():
         "unit": SERVICE_FEE_UNIT,
     })
 
+def _grab_invoice_job(menu_choice, total_with_tax, date_str, invoice_number, seed):
+    all_menu_items, _, _ = load_menus()
+    menu_by_source = get_menu_index(all_menu_items)['by_source']
+    simple_menu_items = menu_by_source['simple']
+    taco_menu_items = menu_by_source['taco']
+
+    if menu_choice in ['taco', 'grab_taco', 'taco place']:
+        menu_items = taco_menu_items
+        used_menu = 'taco'
+    else:
+        menu_items = simple_menu_items
+        used_menu = 'simple'
+
+    TAX_DIR.mkdir(exist_ok=True)
+    before = _tax_file_names()
+    out_file = create_grab_invoice(total_with_tax, menu_items, date_str, invoice_number, seed=seed)
+    after = _tax_file_names()
+    new_files = sorted(list(after - before))
+
+    if not out_file:
+        raise RuntimeError("Failed to create Grab invoice")
+
+    return {
+        "success": True,
+        "menu": used_menu,
+        "output": out_file,
+        "created_count": len(new_files),
+        "files": new_files,
+    }
+
 @app.route('/api/grab-invoice', methods=['POST'])
 def api_grab_invoice():
     """Create a Grab invoice by menu and total amount (with VAT)."""
@@ -411,6 +532,7 @@ def api_grab_invoice():
         total_with_tax = data.get('total_with_tax')
         date_str = data.get('date')
         invoice_number = data.get('invoice_number')
+        seed = data.get('seed')
 
         if total_with_tax is None:
             return jsonify({"success": False, "error": "total_with_tax is required"}), 400
@@ -418,37 +540,59 @@ def api_grab_invoice():
             total_with_tax = float(str(total_with_tax).replace(',', '').replace('.', '').strip())
         except Exception:
             return jsonify({"success": False, "error": "total_with_tax must be a number"}), 400
+        try:
+            seed = int(seed) if seed not in (None, '') else None
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "seed must be an integer"}), 400
+
+        if _wants_background(data):
+            return _job_accepted(submit_job('grab-invoice', _grab_invoice_job, menu_choice, total_with_tax,
+                                            date_str, invoice_number, seed))
+        return jsonify(_grab_invoice_job(menu_choice, total_with_tax, date_str, invoice_number, seed))
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        all_menu_items, _, _ = load_menus()
-        simple_menu_items = []
-        taco_menu_items = []
-        for item in all_menu_items:
-            src = item.get('menu_source', 'simple')
-            (taco_menu_items if src == 'taco' else simple_menu_items).append(item)
-
-        if menu_choice in ['taco', 'grab_taco', 'taco place']:
-            menu_items = taco_menu_items
-            used_menu = 'taco'
+def _grab_batch_job(records, jobs, seed):
+    TAX_DIR.mkdir(exist_ok=True)
+    all_menu_items, _, _ = load_menus()
+    summary = run_grab_batch(records, jobs=jobs, seed=seed,
+                             menu_by_source=get_menu_index(all_menu_items)['by_source'])
+    return {"success": summary['failed'] == 0, **summary}
+
+@app.route('/api/grab-invoice-batch', methods=['POST'])
+def api_grab_invoice_batch():
+    """
+    Create many Grab invoices at once (e.g. a month of daily totals).
+    JSON body: {"records": [{"date", "total_with_tax", "menu", "invoice_number"?, "seed"?}, ...],
+                "jobs": 4, "seed": 0}
+    or multipart form with a CSV / JSON file in "file" (+ optional "jobs", "seed" fields).
+    Returns the batch summary with per-invoice exactness.
+    """
+    try:
+        if request.is_json:
+            data = request.get_json(force=True) or {}
+            records = normalize_grab_records(data.get('records') or [])
         else:
-            menu_items = simple_menu_items
-            used_menu = 'simple'
-
-        TAX_DIR.mkdir(exist_ok=True)
-        before = set(p.name for p in TAX_DIR.glob('*.xlsx'))
-        out_file = create_grab_invoice(total_with_tax, menu_items, date_str, invoice_number)
-        after = set(p.name for p in TAX_DIR.glob('*.xlsx'))
-        new_files = sorted(list(after - before))
-
-        if not out_file:
-            return jsonify({"success": False, "error": "Failed to create Grab invoice"}), 500
-
-        return jsonify({
-            "success": True,
-            "menu": used_menu,
-            "output": out_file,
-            "created_count": len(new_files),
-            "files": new_files,
-        })
+            data = request.form
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({"success": False, "error": "records (JSON) or file (CSV/JSON) is required"}), 400
+            records = load_grab_records_text(upload.read().decode('utf-8'), upload.filename or '')
+        if not records:
+            return jsonify({"success": False, "error": "records is empty"}), 400
+        try:
+            jobs = int(data.get('jobs') or 1)
+            seed = data.get('seed')
+            seed = int(seed) if seed not in (None, '') else None
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "jobs and seed must be integers"}), 400
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    if _wants_background(data):
+        return _job_accepted(submit_job('grab-invoice-batch', _grab_batch_job, records, max(1, jobs), seed))
+    try:
+        return jsonify(_grab_batch_job(records, max(1, jobs), seed))
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -457,6 +601,8 @@ def api_beverage_replace():
     """Thay 5 hóa đơn ngẫu nhiên trong tax_files bằng hóa đơn bia/rượu (Sapporo, Tiger Draught, Coke)."""
     try:
         from automation.daily_beverage_invoices import run_beverage_replacement
+        if _wants_background(request.get_json(silent=True) or {}):
+            return _job_accepted(submit_job('beverage-replace', run_beverage_replacement))
         result = run_beverage_replacement()
         if not result.get('success'):
             return jsonify({"success": False, "error": result.get("error", "Lỗi không xác định")}), 400
@@ -470,11 +616,16 @@ def api_beverage_replace():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def _check_invoices_job(check_invoices_func):
+    return {'success': True, 'results': check_invoices_func()}
+
 @app.route('/api/check-invoices', methods=['POST'])
 def check_invoices():
     """Chạy script kiểm tra hóa đơn - so sánh với menu gốc, không lưu file, chỉ trả về kết quả"""
     try:
         from check_invoices import check_invoices as check_invoices_func
+        if _wants_background(request.get_json(silent=True) or {}):
+            return _job_accepted(submit_job('check-invoices', _check_invoices_job, check_invoices_func))
         results = check_invoices_func()
         
         return jsonify({
@@ -494,11 +645,51 @@ def get_check_results():
     except Exception as e:
         return jsonify({'error': f'Lỗi: {str(e)}'}), 500
 
+@app.route('/api/manifest-rebuild', methods=['POST'])
+def manifest_rebuild():
+    """Đối chiếu manifest tax_files với thư mục (sau khi thêm / sửa / xóa file bằng tay)"""
+    try:
+        manifest = open_manifest(tax_dir=TAX_DIR)
+        try:
+            counts = rebuild_manifest(manifest, TAX_DIR)
+            manifest.commit()
+            total = manifest_count(manifest)
+        finally:
+            manifest.close()
+        return jsonify({"success": True, "tax_files": total, **counts})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs')
+def api_jobs():
+    """Các job nền (mới nhất trước), không kèm log"""
+    return jsonify({"jobs": list_jobs()})
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Trạng thái job: status (queued/running/done/failed/cancelled), progress, result, error, logs"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Không tìm thấy job"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    """Hủy job: job đang chờ không chạy nữa, job đang chạy dừng sau hóa đơn / file hiện tại"""
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Không tìm thấy job"}), 404
+    return jsonify(job)
+
 @app.route('/api/status')
 def get_status():
     """Lấy trạng thái script và file counts"""
     data_files_count = len(list(DATA_DIR.glob("*"))) if DATA_DIR.exists() else 0
-    tax_files_count = len(list(TAX_DIR.glob("*.xlsx"))) if TAX_DIR.exists() else 0
+    tax_files_count = 0
+    if TAX_DIR.exists():
+        manifest = open_manifest(tax_dir=TAX_DIR)
+        tax_files_count = manifest_count(manifest)
+        manifest.close()
     
     return jsonify({
         "running": script_status["running"],
@@ -16,6 +16,7 @@ Sử dụng:
     python3 auto_upload_simple.py
 """
 
+import sys
 import time
 from pathlib import Path
 from selenium import webdriver
@@ -31,6 +32,10 @@ import subprocess
 # Resolve project root for shared directories
 PACKAGE_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = PACKAGE_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation.invoice_manifest import open_manifest, rebuild_manifest, manifest_files, mark_uploaded
 
 # ============================================================================
 # CẤU HÌNH
@@ -360,15 +365,30 @@ def upload_one_invoice(driver, file_path):
     
     return True
 
+def pending_invoice_files():
+    """
+    Các file chưa upload (theo manifest tax_files, đối chiếu trước với thư mục — file bị sửa
+    tay sau khi upload được upload lại). Returns (list Path theo tên file, số file đã upload)
+    """
+    manifest = open_manifest(tax_dir=INVOICE_DIR)
+    rebuild_manifest(manifest, INVOICE_DIR)
+    manifest.commit()
+    entries = manifest_files(manifest)
+    manifest.close()
+    files = [INVOICE_DIR / entry['file'] for entry in entries if not entry['uploaded']]
+    return files, len(entries) - len(files)
+
 def upload_all_invoices(driver):
-    """Upload tất cả files"""
+    """Upload tất cả files chưa upload"""
     if not INVOICE_DIR.exists():
         print(f"❌ Không tìm thấy folder: {INVOICE_DIR}")
         return
     
-    files = sorted(INVOICE_DIR.glob("*.xlsx"), key=lambda x: x.name)
+    files, uploaded_count = pending_invoice_files()
+    if uploaded_count:
+        print(f"\n⏭️  Bỏ qua {uploaded_count} file đã upload trước đó")
     if not files:
-        print(f"❌ Không tìm thấy file .xlsx nào trong {INVOICE_DIR}")
+        print(f"❌ Không có file .xlsx nào cần upload trong {INVOICE_DIR}")
         return
     
     print(f"\n📁 Tìm thấy {len(files)} file(s)")
@@ -381,13 +401,19 @@ def upload_all_invoices(driver):
         print("❌ Không thể đăng nhập")
         return
     
-    # Upload từng file
-    for i, file_path in enumerate(files, 1):
-        print(f"\n[{i}/{len(files)}] Processing...")
-        if upload_one_invoice(driver, file_path):
-            print(f"✅ Thành công: {file_path.name}")
-        else:
-            print(f"❌ Thất bại: {file_path.name}")
+    # Upload từng file (ghi trạng thái ngay sau mỗi file để chạy lại không upload trùng)
+    manifest = open_manifest(tax_dir=INVOICE_DIR)
+    try:
+        for i, file_path in enumerate(files, 1):
+            print(f"\n[{i}/{len(files)}] Processing...")
+            if upload_one_invoice(driver, file_path):
+                mark_uploaded(manifest, file_path.name)
+                manifest.commit()
+                print(f"✅ Thành công: {file_path.name}")
+            else:
+                print(f"❌ Thất bại: {file_path.name}")
+    finally:
+        manifest.close()
     
     print("\n✅ Hoàn thành upload tất cả files!")
 
@@ -407,9 +433,9 @@ def main():
         print("   Chạy process_invoices.py trước để tạo files")
         return
     
-    files = sorted(INVOICE_DIR.glob("*.xlsx"), key=lambda x: x.name)
+    files, _ = pending_invoice_files()
     if not files:
-        print(f"\n❌ Không tìm thấy file .xlsx trong {INVOICE_DIR}")
+        print(f"\n❌ Không có file .xlsx nào cần upload trong {INVOICE_DIR}")
         return
     
     print(f"\n📁 Sẵn sàng upload {len(files)} file(s) theo thứ tự")
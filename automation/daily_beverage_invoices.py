@@ -21,7 +21,15 @@ PROJECT_ROOT = SCRIPT_DIR.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from automation.process_invoices import create_invoice_file, OUTPUT_DIR
+from automation.process_invoices import create_invoice_file, invoice_file_rows, OUTPUT_DIR
+from automation.replacement_ledger import KIND_BEVERAGE, open_replacement_ledger, record_invoice_replacements
+from automation.invoice_manifest import (
+    open_manifest,
+    manifest_files,
+    manifest_entry,
+    record_manifest_entry,
+    remove_manifest_files,
+)
 
 # ============================================================================
 # CẤU HÌNH MÓN BIA/RƯỢU/COKE
@@ -48,15 +56,6 @@ BEVERAGE_ITEMS = [
 ]
 
 
-def parse_total_from_stem(total_str):
-    """'500.000đ' hoặc '1.234.567đ' -> 500000, 1234567."""
-    s = (total_str or "").strip().replace("đ", "").replace(".", "").replace(",", "")
-    try:
-        return int(s)
-    except ValueError:
-        return None
-
-
 def beverage_invoice_items_for_target(original_final_total):
     """
     Tạo danh sách món bia/rượu/Coke sao cho: sum(items) * 1.10 = original_final_total.
@@ -126,23 +125,23 @@ def build_beverage_invoice(invoice_id, payment_method, original_final_total, dat
     return invoice
 
 
-def parse_tax_filename(filepath):
+def beverage_replacement_row(old_file_name, invoice):
     """
-    Parse tên file tax: "123456 - atm - 500.000đ.xlsx"
-    Returns (invoice_id, payment_method, original_final_total) hoặc None.
+    Dòng sổ thay thế cho hóa đơn bia/rượu: món gốc = file hóa đơn bị thay (tổng sau thuế 8%),
+    món thay thế = các món bia/rượu, giá điều chỉnh = giá món cuối,
+    tax_delta = phần tiền trước thuế giảm đi khi chuyển thuế 8% → 10%.
     """
-    stem = filepath.stem
-    parts = stem.split(' - ')
-    if len(parts) < 3:
-        return None
-    inv_id = parts[0].strip()
-    payment = parts[1].strip().lower()
-    if payment not in ('atm', 'transfer'):
-        payment = 'atm'
-    original_total = parse_total_from_stem(parts[2].strip())
-    if original_total is None:
-        return None
-    return inv_id, payment, original_total
+    original_total = sum(item['quantity'] * item['price'] for item in invoice['items']) * 1.10
+    return {
+        'original_name': old_file_name,
+        'original_unit': '',
+        'quantity': 1,
+        'original_price': original_total,
+        'replacement_name': ', '.join(f"{item['name']} x{item['quantity']}" for item in invoice['items']),
+        'replacement_unit': '',
+        'adjusted_price': invoice['items'][-1]['price'],
+        'tax_delta': original_total / 1.08 - original_total / 1.10,
+    }
 
 
 STATE_FILE = PROJECT_ROOT / "beverage_replacement_state.json"
@@ -185,9 +184,10 @@ def run_beverage_replacement():
     if not tax_dir.exists():
         return {"success": False, "error": f"Không tìm thấy thư mục {OUTPUT_DIR}"}
 
-    all_files = list(tax_dir.glob("*.xlsx"))
-    all_files = [f for f in all_files if not f.name.startswith("Grab - ")]
+    manifest = open_manifest(tax_dir=tax_dir)
+    all_files = manifest_files(manifest, include_grab=False)
     if len(all_files) < 5:
+        manifest.close()
         return {
             "success": False,
             "error": f"Trong {OUTPUT_DIR} có {len(all_files)} file. Cần ít nhất 5 file để thay thế.",
@@ -201,22 +201,32 @@ def run_beverage_replacement():
         "",
     ]
     replaced = []
+    ledger = open_replacement_ledger()
 
-    for i, filepath in enumerate(to_replace, 1):
-        parsed = parse_tax_filename(filepath)
-        if not parsed:
+    for i, file_entry in enumerate(to_replace, 1):
+        filepath = tax_dir / file_entry['file']
+        if file_entry['total_with_vat'] is None:
             log_lines.append(f"  {i}. Bỏ qua (không parse được): {filepath.name}")
             continue
-        invoice_id, payment_method, original_final = parsed
+        invoice_id = file_entry['invoice_id']
+        payment_method = file_entry['payment_method']
+        if payment_method not in ('atm', 'transfer'):
+            payment_method = 'atm'
+        original_final = int(file_entry['total_with_vat'])
         invoice = build_beverage_invoice(invoice_id, payment_method, original_final, date_str)
         total_str = f"{original_final:,}".replace(',', '.')
         output_path = tax_dir / f"{invoice_id} - {payment_method} - {total_str}đ.xlsx"
         create_invoice_file(invoice, str(output_path))
-        if output_path != filepath and filepath.exists():
-            filepath.unlink()
+        if output_path != filepath:
+            if filepath.exists():
+                filepath.unlink()
+            remove_manifest_files(manifest, [filepath.name])
+        record_manifest_entry(manifest, manifest_entry(output_path, invoice_file_rows(invoice)))
 
         last_item = invoice['items'][-1]
         old_name = filepath.name
+        record_invoice_replacements(ledger, invoice_id, output_path.name,
+                                    [beverage_replacement_row(old_name, invoice)], kind=KIND_BEVERAGE)
         log_lines.append(f"  {i}. Hóa đơn bị thay thế: {old_name}")
         log_lines.append(f"     → HĐ {invoice_id}, {payment_method.upper()}, tổng {original_final:,}đ. Món cuối: {last_item['price']:,}đ")
         replaced.append({
@@ -227,6 +237,11 @@ def run_beverage_replacement():
             "last_item_price": last_item["price"],
         })
 
+    ledger.commit()
+    ledger.close()
+    manifest.commit()
+    manifest.close()
+
     log_file = PROJECT_ROOT / f"beverage_replacement_log_{datetime.now().strftime('%Y-%m-%d')}.txt"
     log_file.write_text("\n".join(log_lines), encoding="utf-8")
     # Ghi trạng thái: hôm nay đã thay đủ 5, không cho thay thêm nữa trong ngày
@@ -11,7 +11,9 @@ TAX_DIR = BASE_DIR / "tax_files"
 if str(BASE_DIR) not in sys.path:
     sys.path.insert(0, str(BASE_DIR))
 
-from automation.list_beverage_replaced_invoices import is_beverage_only_invoice
+from automation.list_beverage_replaced_invoices import beverage_replaced_files
+from automation.replacement_ledger import open_replacement_ledger
+from automation.invoice_manifest import open_manifest, manifest_files, remove_manifest_files
 
 
 def main():
@@ -19,16 +21,13 @@ def main():
         print("Không tìm thấy thư mục tax_files")
         return 1
 
-    all_xlsx = list(TAX_DIR.glob("*.xlsx"))
-    to_keep = []
-    to_delete = []
-
-    for f in all_xlsx:
-        is_beverage, _ = is_beverage_only_invoice(f)
-        if is_beverage:
-            to_keep.append(f)
-        else:
-            to_delete.append(f)
+    manifest = open_manifest(tax_dir=TAX_DIR)
+    all_files = manifest_files(manifest)
+    ledger = open_replacement_ledger()
+    beverage_names = {file_entry["file"] for file_entry, _ in beverage_replaced_files(all_files, ledger)}
+    ledger.close()
+    to_keep = [TAX_DIR / entry["file"] for entry in all_files if entry["file"] in beverage_names]
+    to_delete = [TAX_DIR / entry["file"] for entry in all_files if entry["file"] not in beverage_names]
 
     print("=" * 60)
     print("XÓA HÓA ĐƠN BÌNH THƯỜNG – CHỈ GIỮ LẠI HÓA ĐƠN BIA/RƯỢU")
@@ -39,15 +38,21 @@ def main():
 
     if not to_delete:
         print("Không có file nào cần xóa.")
+        manifest.close()
         return 0
 
-    for f in sorted(to_delete):
-        try:
-            f.unlink()
-            print(f"  Đã xóa: {f.name}")
-        except Exception as e:
-            print(f"  ❌ Lỗi xóa {f.name}: {e}")
-            return 1
+    try:
+        for f in sorted(to_delete):
+            try:
+                f.unlink(missing_ok=True)
+                remove_manifest_files(manifest, [f.name])
+                print(f"  Đã xóa: {f.name}")
+            except Exception as e:
+                print(f"  ❌ Lỗi xóa {f.name}: {e}")
+                return 1
+    finally:
+        manifest.commit()
+        manifest.close()
 
     print()
     print(f"✅ Đã xóa {len(to_delete)} file. Còn lại {len(to_keep)} file (chỉ bia/rượu).")
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+ĐỌC FILE EXPORT SALE_BY_PAYMENT_METHOD (HTML .xls)
+=================================================
+Đọc file export theo kiểu streaming: đọc từng chunk, trả về từng row một,
+không bao giờ giữ toàn bộ file trong memory.
+
+Mỗi "row" trả về giống hệt một phần tử của content.split('<tr>')
+(phần đầu tiên là header trước thẻ <tr> đầu tiên), nên parser cũ và parser
+streaming cho kết quả giống nhau.
+
+Ngoài ra có thể quét ranh giới hóa đơn trực tiếp trên bytes (mmap) để lấy
+(offset, length) của từng hóa đơn và chỉ decode hóa đơn cần đọc.
+"""
+
+import contextlib
+import functools
+import html
+import mmap
+import os
+import re
+import unicodedata
+
+# ============================================================================
+# REGEX DÙNG CHUNG
+# ============================================================================
+
+ROW_MARKER = '<tr>'
+
+# Row bắt đầu hóa đơn: <td rowspan="N">DDDDDD</td>
+INVOICE_MARKER_RE = re.compile(r'rowspan="\d+">(\d{6})</td>')
+# Bản bytes của 2 marker trên, dùng để quét file qua mmap mà không decode
+ROW_MARKER_BYTES = ROW_MARKER.encode('ascii')
+INVOICE_MARKER_BYTES_RE = re.compile(rb'rowspan="\d+">(\d{6})</td>')
+DATE_RE = re.compile(r'>(\d{2}/\d{2}/\d{4})</td>')
+DATE_VALUE_RE = re.compile(r'\d{2}/\d{2}/\d{4}')
+CELL_RE = re.compile(r'<td[^>]*>(.*?)</td>')
+CELL_WITH_ATTRS_RE = re.compile(r'<td([^>]*)>(.*?)</td>')
+TAG_RE = re.compile(r'<[^>]+>')
+HEADER_CELL_RE = re.compile(r'<t([hd])([^>]*)>(.*?)</t\1>', re.S)
+COLSPAN_RE = re.compile(r'colspan="?(\d+)')
+
+DEFAULT_CHUNK_SIZE = 1 << 16  # 64KB
+
+
+def extract_cells(row):
+    """Lấy danh sách text đã làm sạch (bỏ tag, strip) của các <td> trong row"""
+    return [TAG_RE.sub('', cell).strip() for cell in CELL_RE.findall(row)]
+
+
+def extract_cells_with_attrs(row):
+    """Giống extract_cells nhưng trả thêm attributes của từng <td> (để biết cell nào có rowspan)"""
+    matches = CELL_WITH_ATTRS_RE.findall(row)
+    attrs = [attr for attr, _ in matches]
+    cells = [TAG_RE.sub('', cell).strip() for _, cell in matches]
+    return attrs, cells
+
+
+def iter_export_rows(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Đọc file export theo chunk và yield từng row (chuỗi giữa 2 thẻ <tr>).
+
+    State machine đơn giản:
+    - pending: phần text chưa kết thúc (row hiện tại đang đọc dở)
+    - Mỗi khi gặp '<tr>' trong pending → row trước đó đã đủ → yield
+    - Hết file → yield phần còn lại
+
+    Memory chỉ phụ thuộc vào chunk_size và độ dài 1 row, không phụ thuộc kích thước file.
+    """
+    marker_len = len(ROW_MARKER)
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        pending = ''
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            # Chỉ tìm lại từ cuối phần cũ (trường hợp '<tr>' bị cắt ngang giữa 2 chunk)
+            search_from = max(0, len(pending) - marker_len + 1)
+            pending += chunk
+            start = 0
+            pos = pending.find(ROW_MARKER, search_from)
+            while pos >= 0:
+                yield pending[start:pos]
+                start = pos + marker_len
+                pos = pending.find(ROW_MARKER, start)
+            pending = pending[start:]
+        yield pending
+
+
+def count_invoice_rows(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Đếm số hóa đơn (số row có marker rowspan + mã 6 số) bằng 1 lượt đọc streaming"""
+    return sum(1 for row in iter_export_rows(file_path, chunk_size) if INVOICE_MARKER_RE.search(row))
+
+
+# ============================================================================
+# QUÉT RANH GIỚI HÓA ĐƠN TRÊN BYTES (MMAP)
+# ============================================================================
+# Mỗi hóa đơn = 1 span (offset, length) tính bằng byte: từ thẻ <tr> của row có
+# marker hóa đơn đến ngay trước thẻ <tr> của hóa đơn kế tiếp (hoặc hết file).
+# Chỉ span nào cần đọc mới được decode UTF-8; đọc 1 hóa đơn = 1 lần seek + read.
+
+
+@contextlib.contextmanager
+def open_export_map(file_path):
+    """mmap chỉ đọc của file export (file rỗng → b'' vì mmap không map được 0 byte)"""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def scan_invoice_spans(data):
+    """
+    Tìm ranh giới hóa đơn trên bytes (mmap hoặc bytes) bằng INVOICE_MARKER_BYTES_RE.
+    Returns list of (invoice_id, offset, length) theo thứ tự trong file.
+    """
+    starts = []
+    last_start = -1
+    for match in INVOICE_MARKER_BYTES_RE.finditer(data):
+        row_start = data.rfind(ROW_MARKER_BYTES, 0, match.start())
+        if row_start < 0:
+            row_start = 0
+        # Row đã có marker trước đó (vd. 2 cell rowspan 6 số) → chỉ tính marker đầu tiên
+        if row_start == last_start:
+            continue
+        starts.append((match.group(1).decode('ascii'), row_start))
+        last_start = row_start
+
+    spans = []
+    for i, (invoice_id, offset) in enumerate(starts):
+        end = starts[i + 1][1] if i + 1 < len(starts) else len(data)
+        spans.append((invoice_id, offset, end - offset))
+    return spans
+
+
+def scan_export_file(file_path):
+    """scan_invoice_spans trên 1 file (mmap), không decode nội dung"""
+    with open_export_map(file_path) as data:
+        return scan_invoice_spans(data)
+
+
+def index_invoice_spans(spans):
+    """{invoice_id: (offset, length)} — lấy span đầu tiên nếu mã hóa đơn bị lặp"""
+    index = {}
+    for invoice_id, offset, length in spans:
+        index.setdefault(invoice_id, (offset, length))
+    return index
+
+
+def read_export_span(file_path, offset, length):
+    """Đọc và decode đúng 1 span của file (seek + read), không đọc phần còn lại"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length).decode('utf-8', errors='ignore')
+
+
+def span_rows(text):
+    """Các row (chuỗi sau mỗi thẻ <tr>) của 1 span đã decode — giống content.split('<tr>')[1:]"""
+    return text.split(ROW_MARKER)[1:]
+
+
+# ============================================================================
+# NHẬN DIỆN CỘT TỪ HEADER (<thead>) CỦA FILE EXPORT B07
+# ============================================================================
+
+# Tên cột (đã chuẩn hóa: lowercase, NFC, gom khoảng trắng) -> field
+COLUMN_ALIASES = {
+    'invoice_id': ['mã hoá đơn', 'mã hóa đơn', 'số hoá đơn', 'số hóa đơn', 'mã hđ'],
+    'date': ['ngày', 'ngày bán', 'ngày tạo', 'ngày hoá đơn', 'ngày hóa đơn'],
+    'item_name': ['tên món', 'tên hàng', 'tên sản phẩm', 'tên hàng hoá', 'tên hàng hóa', 'món'],
+    'quantity': ['số lượng', 'sl'],
+    'unit': ['đơn vị', 'đơn vị tính', 'đvt'],
+    'price': ['đơn giá', 'giá'],
+    'discount': ['giảm giá', 'tiền giảm giá'],
+    'payment_discount': ['chiết khấu thanh toán', 'ck thanh toán', 'chiết khấu'],
+    'final_total': ['thành tiền', 'tổng thanh toán', 'khách phải trả', 'tổng cộng'],
+}
+
+# Header phải có đủ các cột này thì mới đọc theo vị trí cột, nếu không dùng heuristic
+REQUIRED_COLUMNS = ('invoice_id', 'item_name', 'quantity', 'price')
+
+# Các cột thuộc từng món (không bao giờ có rowspan)
+ITEM_COLUMNS = ('item_name', 'quantity', 'unit', 'price')
+
+_ALIAS_TO_COLUMN = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+
+def normalize_header(text):
+    """'Mã hoá&nbsp;đơn ' -> 'mã hoá đơn'"""
+    text = html.unescape(TAG_RE.sub('', text))
+    text = unicodedata.normalize('NFC', text).lower()
+    return ' '.join(text.replace(':', ' ').split())
+
+
+def detect_column_schema(row):
+    """
+    Đọc 1 row header và tạo schema: {'columns': {field: vị trí cột}, 'width': số cột}.
+    Cột có colspan được tính đúng số cột chiếm.
+    Trả về None nếu row không phải header hoặc thiếu cột bắt buộc.
+    """
+    header_cells = HEADER_CELL_RE.findall(row)
+    if not header_cells:
+        return None
+    
+    columns = {}
+    position = 0
+    for _, attrs, text in header_cells:
+        column = _ALIAS_TO_COLUMN.get(normalize_header(text))
+        if column and column not in columns:
+            columns[column] = position
+        colspan = COLSPAN_RE.search(attrs)
+        position += int(colspan.group(1)) if colspan else 1
+    
+    if not all(column in columns for column in REQUIRED_COLUMNS):
+        return None
+    return {'columns': columns, 'width': position}
+
+
+def schema_row_layout(schema, cell_attrs):
+    """
+    Tính vị trí cột món cho 1 hóa đơn dựa vào row đầu tiên của hóa đơn.
+
+    Row đầu có đủ tất cả cột; các cột cấp hóa đơn (mã HĐ, ngày, tổng tiền...) dùng rowspan,
+    nên các row tiếp theo của hóa đơn không có các cột đó → vị trí cột món bị dịch trái
+    đúng bằng số cột rowspan đứng trước nó.
+
+    Returns dict layout, hoặc None nếu row đầu không khớp header (→ dùng heuristic)
+    """
+    if len(cell_attrs) != schema['width']:
+        return None
+    
+    columns = schema['columns']
+    has_rowspan = ['rowspan' in attrs for attrs in cell_attrs]
+    full_columns = tuple(columns.get(column) for column in ITEM_COLUMNS)
+    
+    continuation_columns = None
+    continuation_width = -1
+    if not any(has_rowspan[idx] for idx in full_columns if idx is not None):
+        continuation_columns = tuple(
+            idx - sum(has_rowspan[:idx]) if idx is not None else None for idx in full_columns
+        )
+        continuation_width = schema['width'] - sum(has_rowspan)
+    
+    return {
+        'full_width': schema['width'],
+        'full_columns': full_columns,
+        'continuation_width': continuation_width,
+        'continuation_columns': continuation_columns,
+    }
+
+
+def layout_item_columns(layout, cells):
+    """
+    Vị trí (tên, số lượng, đơn vị, đơn giá) cho row này theo layout,
+    hoặc None nếu số cell không khớp (→ dùng heuristic cho row này)
+    """
+    n = len(cells)
+    if n == layout['full_width']:
+        return layout['full_columns']
+    if n == layout['continuation_width']:
+        return layout['continuation_columns']
+    return None
+
+
+# ============================================================================
+# PHÂN LOẠI CELL (DÙNG CHO HEURISTIC TÌM MÓN)
+# ============================================================================
+# Mỗi cell được làm sạch và phân loại đúng 1 lần (có cache theo nội dung cell),
+# tag của cả row gói trong 1 mảng bytes. Cửa sổ 4 cell (name, qty, unit, price)
+# chỉ còn so sánh bit trên mảng tag, không regex / replace trong vòng lặp.
+
+CELL_NAME = 1       # Có thể là tên món (len > 2, không thuộc tên bỏ qua)
+CELL_SKIP_NAME = 2  # Text khớp pattern bỏ qua (crispy, payment, ghi chú, ...)
+CELL_QTY = 4        # Số nguyên 1 - 200
+CELL_PRICE = 8      # Số tiền 500đ - 2.000.000đ (sau khi bỏ ' ', ',', '.')
+CELL_UNIT = 16      # Có thể là đơn vị (không rỗng, không phải số)
+
+# Gộp các pattern bỏ qua thành 1 regex (compile 1 lần khi import)
+SKIP_NAME_PATTERNS = [
+    r'\bcrispy\b', r'\bsoft\b', r'cut in 4', r'- edit\s*$',
+    r'đổi phương thức', r'\bpayment\b', r'\btransfer\b',
+    r'\bcod\b', r'\batm\b', 'background-color', 'vertical-align',
+    'ghi chú', 'giảm sốt'
+]
+SKIP_NAME_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in SKIP_NAME_PATTERNS))
+
+RESERVED_NAMES = frozenset(['', 'STT', 'Mã hoá đơn', 'Simple Place'])
+
+MIN_ITEM_PRICE = 500
+MAX_ITEM_PRICE = 2000000
+MAX_ITEM_QTY = 200
+
+
+def is_skipped_name(name):
+    """Tên không phải món (tên bỏ qua hoặc khớp SKIP_NAME_RE)"""
+    return name in RESERVED_NAMES or SKIP_NAME_RE.search(name.lower()) is not None
+
+
+@functools.lru_cache(maxsize=65536)
+def classify_cell(cell):
+    """
+    Phân loại 1 cell. Returns (tag, qty, price) — qty/price = 0 nếu cell không phải số.
+    Có cache theo nội dung cell vì tên món / đơn vị / giá lặp lại rất nhiều trong 1 file.
+    """
+    tag = 0
+    qty = 0
+    price = 0.0
+    
+    if cell.isdigit():
+        try:
+            value = int(cell)
+        except ValueError:
+            value = 0
+        if 1 <= value <= MAX_ITEM_QTY:
+            tag |= CELL_QTY
+            qty = value
+    elif cell:
+        tag |= CELL_UNIT
+    
+    price_clean = cell.replace(' ', '').replace(',', '').replace('.', '')
+    if price_clean.isdigit():
+        try:
+            value = float(price_clean)
+        except ValueError:
+            value = 0.0
+        if MIN_ITEM_PRICE <= value <= MAX_ITEM_PRICE:
+            tag |= CELL_PRICE
+            price = value
+    
+    if len(cell) > 2:
+        if is_skipped_name(cell):
+            tag |= CELL_SKIP_NAME
+        else:
+            tag |= CELL_NAME
+    
+    return tag, qty, price
+
+
+def classify_cells(cells):
+    """
+    Phân loại tất cả cell của 1 row.
+    Returns (tags, classified): tags là bytes (1 byte/cell), classified là list (tag, qty, price)
+    """
+    classified = list(map(classify_cell, cells))
+    tags = bytes([entry[0] for entry in classified])
+    return tags, classified
+
+
+def scan_item_windows(cells):
+    """
+    Tìm các món theo cửa sổ 4 cell (name, qty, unit, price) dựa trên tag đã phân loại.
+    Returns list of (name, qty, unit, price_value)
+    """
+    tags, classified = classify_cells(cells)
+    items = []
+    for i in range(len(cells) - 3):
+        if tags[i + 1] & CELL_QTY and tags[i] & CELL_NAME and tags[i + 3] & CELL_PRICE:
+            unit = cells[i + 2] if tags[i + 2] & CELL_UNIT else 'Phần'
+            items.append((cells[i], classified[i + 1][1], unit, classified[i + 3][2]))
+    return items
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+TẠO HÓA ĐƠN GRAB HÀNG LOẠT
+==========================
+Cuối tháng cần tạo ~30 hóa đơn Grab (mỗi ngày 1 tổng doanh thu). Thay vì nhập từng tổng
+qua /api/grab-invoice hoặc menu CLI, đưa vào 1 file danh sách (date, total_with_tax, menu):
+
+    CSV:  date,total_with_tax,menu[,invoice_number[,seed]]
+          01/02/2026,1500000,simple
+    JSON: [{"date": "01/02/2026", "total_with_tax": 1500000, "menu": "taco"}, ...]
+          (hoặc {"records": [...]})
+
+- Menu load 1 lần cho cả lô, gửi 1 lần cho mỗi worker (initializer)
+- Các hóa đơn tạo song song trên --jobs process
+- Mỗi hóa đơn có seed riêng: mặc định như create_grab_invoice (fingerprint menu, ngày, tổng
+  tiền, mã hóa đơn), hoặc suy ra từ --seed + nội dung dòng → cùng file vào thì ra cùng bộ
+  món, không phụ thuộc số worker hay thứ tự chạy; bộ món đã giải được lấy lại từ cache
+- Kết quả: 1 bảng tổng hợp (file tạo ra, chênh lệch tổng, điều chỉnh giá món cuối, chính xác?)
+
+Chạy từ thư mục gốc dự án:
+    python automation/grab_batch.py grab_thang_02.csv --jobs 4
+    python automation/grab_batch.py grab_thang_02.json --seed 7 --summary summary.json
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation.process_invoices import (
+    load_menus,
+    get_menu_index,
+    create_grab_invoice,
+    grab_items_check,
+    GRAB_MAX_PRICE_ADJUSTMENT,
+)
+from automation.grab_cache import default_grab_seed
+from automation.job_queue import capture_stdout, report_job_progress
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+# Tên menu chấp nhận cho Taco Place (còn lại là Simple Place, giống /api/grab-invoice)
+TACO_MENU_NAMES = {'taco', 'grab_taco', 'taco place'}
+
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y')
+
+# ============================================================================
+# ĐỌC DANH SÁCH
+# ============================================================================
+
+
+def grab_menu_source(menu_choice):
+    """'taco' / 'grab_taco' / 'taco place' → 'taco', còn lại → 'simple'"""
+    menu_choice = str(menu_choice or 'simple').strip().lower()
+    return 'taco' if menu_choice in TACO_MENU_NAMES else 'simple'
+
+
+def parse_grab_total(value):
+    """1500000 / '1,500,000' / '1.500.000' → 1500000.0"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).replace(',', '').replace('.', '').strip())
+
+
+def parse_grab_date(value):
+    """dd/mm/yyyy, yyyy-mm-dd, dd-mm-yyyy → dd/mm/yyyy (định dạng của create_grab_invoice)"""
+    text = str(value or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime('%d/%m/%Y')
+        except ValueError:
+            continue
+    raise ValueError(f"ngày không hợp lệ: {text!r}")
+
+
+def normalize_grab_records(records):
+    """
+    Kiểm tra + chuẩn hóa danh sách dict (date, total_with_tax, menu, invoice_number?, seed?).
+    Lỗi ở dòng nào → ValueError ghi rõ số dòng (bắt đầu từ 1), không tạo hóa đơn nào.
+    """
+    normalized = []
+    for number, record in enumerate(records, start=1):
+        try:
+            date_str = parse_grab_date(record.get('date'))
+            total = record.get('total_with_tax', record.get('total'))
+            if total in (None, ''):
+                raise ValueError("thiếu total_with_tax")
+            try:
+                total_with_tax = parse_grab_total(total)
+            except ValueError:
+                raise ValueError(f"total_with_tax không phải số: {total!r}")
+            if total_with_tax <= 0:
+                raise ValueError("total_with_tax phải lớn hơn 0")
+            seed = record.get('seed')
+            normalized.append({
+                'date': date_str,
+                'total_with_tax': total_with_tax,
+                'menu': grab_menu_source(record.get('menu')),
+                'invoice_number': str(record.get('invoice_number') or '').strip() or None,
+                'seed': int(seed) if seed not in (None, '') else None,
+            })
+        except (AttributeError, ValueError) as e:
+            raise ValueError(f"Dòng {number}: {e}")
+    return normalized
+
+
+def load_grab_records(file_path):
+    """Đọc danh sách từ file .json hoặc .csv (UTF-8, có header)"""
+    file_path = Path(file_path)
+    if file_path.suffix.lower() == '.json':
+        data = json.loads(file_path.read_text(encoding='utf-8'))
+        if isinstance(data, dict):
+            data = data.get('records', [])
+        return normalize_grab_records(data)
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        return normalize_grab_records(list(csv.DictReader(f)))
+
+
+def load_grab_records_text(text, file_name=''):
+    """Như load_grab_records nhưng từ nội dung (file upload qua web)"""
+    text = text.lstrip('\ufeff')
+    if file_name.lower().endswith('.json') or text.lstrip().startswith(('[', '{')):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get('records', [])
+        return normalize_grab_records(data)
+    return normalize_grab_records(list(csv.DictReader(io.StringIO(text))))
+
+# ============================================================================
+# TẠO HÓA ĐƠN (WORKER)
+# ============================================================================
+
+_worker_menu_by_source = None  # {'simple': [...], 'taco': [...]} trong process worker
+
+
+def grab_record_seed(batch_seed, record, index):
+    """
+    Seed của 1 hóa đơn: seed riêng của dòng, hoặc hash(batch_seed + nội dung dòng).
+    batch_seed None → None (dùng seed mặc định của create_grab_invoice).
+    """
+    if record.get('seed') is not None:
+        return record['seed']
+    if batch_seed is None:
+        return None
+    key = (f"{batch_seed}|{index}|{record['date']}|{record['menu']}|"
+           f"{record['total_with_tax']:.0f}|{record.get('invoice_number') or ''}")
+    return int(hashlib.sha256(key.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def grab_batch_invoice_number(record, index):
+    """Mã hóa đơn mặc định trong lô: GRAB_<yyyymmdd>_<số thứ tự> (không trùng trong cùng lô)"""
+    if record.get('invoice_number'):
+        return record['invoice_number']
+    day, month, year = record['date'].split('/')
+    return f"GRAB_{year}{month}{day}_{index + 1:03d}"
+
+
+def _init_grab_worker(menu_by_source):
+    global _worker_menu_by_source
+    _worker_menu_by_source = menu_by_source
+
+
+def _create_grab_batch_invoice(task):
+    """
+    Worker: tạo 1 hóa đơn. task = (index, record, seed)
+    Returns dict kết quả (không có món) + log — output print của create_grab_invoice.
+    """
+    index, record, seed = task
+    menu_items = _worker_menu_by_source[record['menu']]
+    invoice_number = grab_batch_invoice_number(record, index)
+    if seed is None:
+        seed = default_grab_seed(get_menu_index(menu_items)['fingerprint'], record['date'],
+                                 record['total_with_tax'], invoice_number)
+    chosen_items = []
+    log = io.StringIO()
+    with capture_stdout(log):
+        try:
+            output_file = create_grab_invoice(record['total_with_tax'], menu_items, record['date'],
+                                              invoice_number, chosen_items=chosen_items, seed=seed)
+            error = None if output_file else 'Không chọn được món phù hợp'
+        except Exception as e:
+            output_file = None
+            error = str(e)
+
+    result = {
+        'index': index,
+        'date': record['date'],
+        'menu': record['menu'],
+        'total_with_tax': record['total_with_tax'],
+        'invoice_number': invoice_number,
+        'seed': seed,
+        'output': Path(output_file).name if output_file else None,
+        'items': len(chosen_items),
+        'difference': None,
+        'last_item_adjustment': None,
+        'exact': False,
+        'error': error,
+    }
+    if chosen_items:
+        menu_by_name = get_menu_index(menu_items)['by_name']
+        difference, adjustment = grab_items_check(chosen_items, record['total_with_tax'] / 1.08, menu_by_name)
+        result['difference'] = round(difference, 2)
+        result['last_item_adjustment'] = round(adjustment, 2) if adjustment != float('inf') else None
+        result['exact'] = difference < 1 and adjustment <= GRAB_MAX_PRICE_ADJUSTMENT
+    return result, log.getvalue()
+
+# ============================================================================
+# API
+# ============================================================================
+
+
+def run_grab_batch(records, jobs=1, seed=None, menu_by_source=None, show_logs=False):
+    """
+    Tạo hóa đơn Grab cho cả danh sách records (đã qua normalize_grab_records).
+    menu_by_source: {'simple', 'taco'} đã load sẵn (mặc định load_menus() 1 lần).
+    Returns dict tổng hợp: count, created, exact, failed, seconds, invoices (theo thứ tự records).
+    """
+    start = time.perf_counter()
+    if menu_by_source is None:
+        all_menu_items, _, _ = load_menus()
+        menu_by_source = get_menu_index(all_menu_items)['by_source']
+    tasks = [(index, record, grab_record_seed(seed, record, index)) for index, record in enumerate(records)]
+    jobs = max(1, min(jobs, len(tasks) or 1))
+
+    outputs = []
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_grab_worker,
+                                 initargs=(menu_by_source,)) as executor:
+            for output in executor.map(_create_grab_batch_invoice, tasks):
+                outputs.append(output)
+                report_job_progress(written=1)
+    else:
+        _init_grab_worker(menu_by_source)
+        for task in tasks:
+            outputs.append(_create_grab_batch_invoice(task))
+            report_job_progress(written=1)
+
+    invoices = []
+    for result, log in outputs:
+        if show_logs and log:
+            sys.stdout.write(log)
+        invoices.append(result)
+    return {
+        'count': len(invoices),
+        'created': sum(1 for invoice in invoices if invoice['output']),
+        'exact': sum(1 for invoice in invoices if invoice['exact']),
+        'failed': sum(1 for invoice in invoices if not invoice['output']),
+        'jobs': jobs,
+        'seed': seed,
+        'seconds': round(time.perf_counter() - start, 3),
+        'invoices': invoices,
+    }
+
+
+def print_grab_batch_summary(summary):
+    print(f"\n{'Ngày':<11} {'Menu':<7} {'Tổng (có thuế)':>15} {'Chênh lệch':>11} {'Đ.chỉnh giá':>12}  File")
+    for invoice in summary['invoices']:
+        status = '✓' if invoice['output'] and invoice['exact'] else '✗'
+        difference = '-' if invoice['difference'] is None else f"{invoice['difference']:,.2f}"
+        adjustment = '-' if invoice['last_item_adjustment'] is None else f"{invoice['last_item_adjustment']:,.0f}"
+        print(f"{invoice['date']:<11} {invoice['menu']:<7} {invoice['total_with_tax']:>15,.0f} "
+              f"{difference:>11} {adjustment:>12}  {status} {invoice['output'] or invoice['error']}")
+    print(f"\n✅ Đã tạo {summary['created']}/{summary['count']} hóa đơn, "
+          f"chính xác {summary['exact']}/{summary['count']} "
+          f"({summary['jobs']} process, {summary['seconds']:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tạo hóa đơn Grab hàng loạt từ file CSV / JSON.")
+    parser.add_argument('records', help="File .csv hoặc .json: date, total_with_tax, menu")
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Số process song song (0 = số CPU)")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Seed của cả lô (mỗi hóa đơn có seed riêng suy ra từ đây); "
+                             "mặc định: seed theo menu + ngày + tổng tiền + mã hóa đơn")
+    parser.add_argument('--summary', help="Ghi bảng tổng hợp ra file JSON")
+    parser.add_argument('--verbose', '-v', action='store_true', help="In chi tiết món của từng hóa đơn")
+    args = parser.parse_args()
+
+    try:
+        records = load_grab_records(args.records)
+    except (OSError, ValueError) as e:
+        print(f"❌ Không đọc được danh sách: {e}")
+        sys.exit(1)
+    if not records:
+        print("⚠️  Danh sách trống")
+        return
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    seed_label = 'mặc định' if args.seed is None else args.seed
+    print(f"🏪 Tạo {len(records)} hóa đơn Grab ({jobs} process, seed {seed_label})...")
+    summary = run_grab_batch(records, jobs=jobs, seed=args.seed, show_logs=args.verbose)
+    print_grab_batch_summary(summary)
+    if args.summary:
+        Path(args.summary).write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"📄 Tổng hợp: {args.summary}")
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
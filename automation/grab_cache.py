@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+SEED + CACHE BỘ MÓN HÓA ĐƠN GRAB
+================================
+Tạo lại hóa đơn Grab cho cùng ngày / tổng tiền phải ra đúng file cũ:
+
+- Seed mặc định suy ra từ (fingerprint menu, ngày, tổng tiền, mã hóa đơn) → cùng input thì
+  solver / generator random chọn cùng bộ món
+- Bộ món đã giải được lưu trên đĩa (GRAB_BASKET_CACHE_DIR, mỗi entry 1 file JSON nhỏ),
+  key = cùng bộ trên + solver + seed → lần sau trả về ngay, không tìm lại
+- Menu đổi (giá, tên, nhóm...) → fingerprint khác → seed / key khác
+- Số entry vượt MAX_GRAB_BASKETS → xóa entry dùng lâu nhất (theo mtime)
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+GRAB_BASKET_CACHE_DIR = PROJECT_ROOT / '.grab_basket_cache'
+MAX_GRAB_BASKETS = 5000
+# Tăng khi solver / generator đổi cách chọn món để bỏ qua các bộ món cũ
+GRAB_BASKET_CACHE_VERSION = 1
+
+# ============================================================================
+# SEED / KEY
+# ============================================================================
+
+
+def menu_items_fingerprint(menu_items):
+    """SHA-256 của các món (tên, đơn vị, giá, nhóm) theo đúng thứ tự trong menu"""
+    digest = hashlib.sha256()
+    for item in menu_items:
+        digest.update(json.dumps([item['name'], item.get('unit', ''), item['price'], item.get('group', '')],
+                                 ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _invoice_tuple(menu_fp, date_str, total_with_tax, invoice_number):
+    return f"{menu_fp}|{date_str}|{float(total_with_tax):.2f}|{invoice_number}"
+
+
+def default_grab_seed(menu_fp, date_str, total_with_tax, invoice_number):
+    """Seed mặc định (int 64 bit) của 1 hóa đơn Grab"""
+    data = _invoice_tuple(menu_fp, date_str, total_with_tax, invoice_number)
+    return int(hashlib.sha256(data.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def grab_basket_key(menu_fp, date_str, total_with_tax, invoice_number, solver, seed):
+    """Key cache của bộ món: cùng bộ (menu, ngày, tổng, mã hóa đơn) + solver + seed"""
+    data = (f"v{GRAB_BASKET_CACHE_VERSION}:" + _invoice_tuple(menu_fp, date_str, total_with_tax, invoice_number) +
+            f"|{solver}|{seed}")
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+# ============================================================================
+# ĐỌC / GHI
+# ============================================================================
+
+
+def _entry_path(key, cache_dir=None):
+    return Path(cache_dir or GRAB_BASKET_CACHE_DIR) / f"{key}.json"
+
+
+def load_grab_basket(key, cache_dir=None):
+    """List món đã lưu cho key, hoặc None nếu chưa có / entry hỏng"""
+    path = _entry_path(key, cache_dir)
+    try:
+        items = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    # Đánh dấu vừa dùng để eviction giữ lại entry này
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return items
+
+
+def store_grab_basket(key, items, cache_dir=None, max_entries=MAX_GRAB_BASKETS):
+    """
+    Lưu bộ món (list dict name/unit/price/quantity). Ghi file tạm rồi os.replace — an toàn
+    khi nhiều worker (tạo hóa đơn hàng loạt) cùng ghi. Lỗi ghi chỉ bỏ qua cache.
+    """
+    cache_dir = Path(cache_dir or GRAB_BASKET_CACHE_DIR)
+    path = _entry_path(key, cache_dir)
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(items, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        return None
+    evict_grab_baskets(cache_dir, max_entries)
+    return path
+
+
+def evict_grab_baskets(cache_dir=None, max_entries=MAX_GRAB_BASKETS):
+    """Xóa entry cũ nhất (mtime) cho đến khi còn <= max_entries. Returns số entry đã xóa"""
+    cache_dir = Path(cache_dir or GRAB_BASKET_CACHE_DIR)
+    if not cache_dir.exists():
+        return 0
+    entries = []
+    for path in cache_dir.glob('*.json'):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    removed = 0
+    for _, path in sorted(entries)[:max(0, len(entries) - max_entries)]:
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        removed += 1
+    return removed
+
+
+def clear_grab_basket_cache(cache_dir=None):
+    """Xóa toàn bộ cache bộ món Grab"""
+    return evict_grab_baskets(cache_dir, max_entries=0)
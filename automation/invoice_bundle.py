@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+GÓI HÓA ĐƠN VÀO 1 FILE ZIP
+==========================
+Thay vì ghi từng file vào tax_files/ rồi copy / xóa (/api/clear-files), mỗi file hóa đơn
+của 1 lần chạy được tạo trong memory và ghi ngay thành 1 entry của file zip:
+
+- CLI: process_invoices.py ... --zip hoa_don.zip → ghi thẳng ra file zip
+- Web: /api/process-bundle → zip được stream về HTTP response theo từng chunk
+
+Memory giữ cố định: mỗi lúc chỉ giữ 1 workbook (vài KB) + hàng đợi chunk giới hạn.
+File xlsx đã nén deflate bên trong nên entry được ghi dạng ZIP_STORED (nén lại không nhỏ
+hơn đáng kể, chỉ tốn CPU).
+"""
+
+import queue
+import sys
+import threading
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+INVOICE_BUNDLE_COMPRESSION = zipfile.ZIP_STORED
+BUNDLE_CHUNK_SIZE = 64 * 1024  # Gom các lần ghi nhỏ của ZipFile thành chunk ~64KB
+BUNDLE_QUEUE_CHUNKS = 64  # Số chunk tối đa chờ gửi khi stream (giới hạn memory ~4MB)
+BUNDLE_PUT_TIMEOUT = 0.5  # Giây — kiểm tra client đã ngắt kết nối chưa
+
+# ============================================================================
+# GHI ZIP
+# ============================================================================
+
+
+def default_bundle_name(now=None):
+    """hoa_don_<yyyymmdd_HHMMSS>.zip"""
+    return f"hoa_don_{(now or datetime.now()).strftime('%Y%m%d_%H%M%S')}.zip"
+
+
+def open_invoice_bundle(target):
+    """ZipFile để ghi bundle. target: đường dẫn file zip hoặc file object (có thể không seek được)"""
+    return zipfile.ZipFile(target, 'w', compression=INVOICE_BUNDLE_COMPRESSION)
+
+
+def add_invoice_to_bundle(bundle, file_name, data):
+    """
+    Thêm 1 file hóa đơn (bytes xlsx) vào bundle. Tên trùng (ghi ra tax_files/ thì file sau
+    ghi đè file trước) → thêm hậu tố ' (2)', ' (3)'... để không mất hóa đơn nào.
+    Returns tên entry đã ghi.
+    """
+    entry_name = file_name
+    stem, suffix = Path(file_name).stem, Path(file_name).suffix
+    counter = 1
+    while entry_name in bundle.NameToInfo:
+        counter += 1
+        entry_name = f"{stem} ({counter}){suffix}"
+    if entry_name != file_name:
+        print(f"   ⚠️  Trùng tên file trong zip: {file_name} → {entry_name}")
+    bundle.writestr(entry_name, data)
+    return entry_name
+
+# ============================================================================
+# STREAM RA HTTP
+# ============================================================================
+
+
+def _queue_sink(chunks, cancelled):
+    """
+    File object chỉ ghi (không seek) cho ZipFile: gom dữ liệu thành chunk BUNDLE_CHUNK_SIZE
+    rồi đưa vào hàng đợi; flush (ZipFile gọi khi đóng) gửi phần còn lại.
+    """
+    pending = bytearray()
+
+    def put(data):
+        while not cancelled.is_set():
+            try:
+                chunks.put(data, timeout=BUNDLE_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+        raise OSError("Đã ngắt kết nối, dừng ghi bundle")
+
+    def write(data):
+        pending.extend(data)
+        if len(pending) >= BUNDLE_CHUNK_SIZE:
+            put(bytes(pending))
+            pending.clear()
+        return len(data)
+
+    def flush():
+        if pending:
+            put(bytes(pending))
+            pending.clear()
+
+    return SimpleNamespace(write=write, flush=flush)
+
+
+def stream_invoice_bundle(produce, max_chunks=BUNDLE_QUEUE_CHUNKS):
+    """
+    Generator các chunk bytes của file zip. produce(bundle) chạy trên 1 thread riêng và ghi
+    các hóa đơn vào bundle (ZipFile trên hàng đợi chunk giới hạn → producer chờ khi client
+    đọc chậm). Lỗi trong produce được raise lại ở generator sau các chunk đã gửi.
+    Generator bị đóng giữa chừng (client ngắt kết nối) → producer dừng ở lần ghi kế tiếp.
+    """
+    chunks = queue.Queue(maxsize=max_chunks)
+    cancelled = threading.Event()
+    done = object()
+    errors = []
+
+    def run():
+        try:
+            with open_invoice_bundle(_queue_sink(chunks, cancelled)) as bundle:
+                produce(bundle)
+        except Exception as e:  # Chuyển lỗi về thread đang stream
+            errors.append(e)
+        finally:
+            while not cancelled.is_set():
+                try:
+                    chunks.put(done, timeout=BUNDLE_PUT_TIMEOUT)
+                    break
+                except queue.Full:
+                    continue
+
+    producer = threading.Thread(target=run, name='invoice-bundle', daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        cancelled.set()
+    producer.join()
+    if errors:
+        raise errors[0]
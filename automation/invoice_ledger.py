@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+SỔ GHI HÓA ĐƠN ĐÃ XỬ LÝ (LEDGER)
+================================
+File export mỗi ngày chồng lên khoảng thời gian của ngày trước, nên phần lớn hóa đơn
+đã được tạo file từ lần chạy trước. Ledger lưu cho mỗi mã hóa đơn:
+    - hash nội dung (các món thô + ngày, giảm giá, tổng, phương thức thanh toán)
+    - context (fingerprint menu + cấu hình phí dịch vụ) lúc tạo file
+    - tên file đã tạo trong tax_files
+
+Lần chạy sau, hóa đơn có cùng hash + context và file vẫn còn → bỏ qua, không match menu,
+không ghi lại file. Chỉ hóa đơn mới / thay đổi mới được xử lý và báo cáo.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+LEDGER_FILE = PROJECT_ROOT / "processed_invoices_ledger.json"
+
+# Các field cấp hóa đơn ảnh hưởng tới file output (cùng với danh sách món thô)
+HASHED_INVOICE_FIELDS = ('invoice_id', 'date', 'discount', 'payment_discount', 'final_total', 'payment_method')
+
+
+def invoice_content_hash(invoice, raw_items):
+    """
+    SHA-256 của hóa đơn trước khi match menu.
+    raw_items: list of (name, qty, unit, price_value) đúng như đọc từ file export.
+    """
+    payload = {field: invoice.get(field) for field in HASHED_INVOICE_FIELDS}
+    payload['items'] = [list(item) for item in raw_items]
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_ledger(path=None):
+    """Đọc ledger. Returns dict {'invoices': {invoice_id: {...}}}; file hỏng / chưa có → ledger rỗng"""
+    path = Path(path or LEDGER_FILE)
+    if not path.exists():
+        return {'invoices': {}}
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {'invoices': {}}
+    if not isinstance(data.get('invoices'), dict):
+        return {'invoices': {}}
+    return data
+
+
+def save_ledger(ledger, path=None):
+    """Ghi ledger (ghi file tạm rồi os.replace để không bao giờ để lại file ghi dở)"""
+    path = Path(path or LEDGER_FILE)
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(ledger, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def unchanged_invoice_hashes(ledger, context, output_dir):
+    """
+    {invoice_id: content_hash} của các hóa đơn có thể bỏ qua: cùng context và file output
+    vẫn còn trong output_dir. Dict này được truyền xuống parser (kể cả worker song song).
+    """
+    output_dir = Path(output_dir)
+    unchanged = {}
+    for invoice_id, entry in ledger['invoices'].items():
+        if entry.get('context') != context:
+            continue
+        file_name = entry.get('file')
+        if file_name and (output_dir / file_name).exists():
+            unchanged[invoice_id] = entry.get('hash')
+    return unchanged
+
+
+def record_invoice(ledger, invoice, file_name, context):
+    """
+    Ghi nhận hóa đơn vừa tạo file (cần invoice['content_hash'] do parser gắn vào).
+    Returns tên file đã ghi nhận trước đó cho mã hóa đơn này (None nếu chưa có).
+    """
+    content_hash = invoice.get('content_hash')
+    if not content_hash:
+        return None
+    previous = ledger['invoices'].get(invoice['invoice_id'], {})
+    ledger['invoices'][invoice['invoice_id']] = {
+        'hash': content_hash,
+        'context': context,
+        'file': file_name,
+        'updated': datetime.now().isoformat(timespec='seconds'),
+    }
+    return previous.get('file')
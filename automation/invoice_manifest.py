@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+MANIFEST THƯ MỤC tax_files (SQLITE)
+===================================
+Nhiều nơi glob tax_files/*.xlsx rồi tách tên file / mở từng workbook (/api/status, thay hóa
+đơn bia/rượu, liệt kê hóa đơn bia/rượu, kiểm tra tổng tiền, kiểm tra thiếu món, upload).
+Manifest lưu sẵn cho mỗi file:
+    - mã hóa đơn, phương thức thanh toán, tổng tiền có VAT (theo tên file)
+    - tổng tiền các món (chưa VAT), số dòng, số món thuế 8% / 10% (không tính phí dịch vụ)
+    - hash nội dung, size + mtime (phát hiện file bị sửa tay), trạng thái upload
+
+Nơi ghi file (process_invoices, hóa đơn Grab, hóa đơn bia/rượu hằng ngày) cập nhật manifest
+từ chính các dòng vừa ghi — không mở lại workbook. File bị thêm / sửa / xóa bằng tay:
+    python automation/invoice_manifest.py        → đối chiếu lại với thư mục (chỉ mở file
+                                                    có size / mtime khác)
+Lần đầu mở manifest (chưa đối chiếu lần nào) tự đối chiếu toàn bộ thư mục.
+"""
+
+import hashlib
+import re
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation.tax_classifier import is_tax_10_name
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+MANIFEST_FILE = PROJECT_ROOT / "tax_files_manifest.sqlite3"
+TAX_FILES_DIR = PROJECT_ROOT / "tax_files"
+
+GRAB_PAYMENT_METHOD = 'grab'  # "Grab - dd-mm-yyyy - SỐ.xlsx" không có tổng tiền trong tên
+
+MANIFEST_FIELDS = ('file', 'invoice_id', 'payment_method', 'total_with_vat', 'items_total', 'item_count',
+                   'items_8', 'items_10', 'content_hash', 'size', 'mtime_ns', 'read_error')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file TEXT PRIMARY KEY,
+    invoice_id TEXT,
+    payment_method TEXT,
+    total_with_vat REAL,
+    items_total REAL NOT NULL,
+    item_count INTEGER NOT NULL,
+    items_8 INTEGER NOT NULL,
+    items_10 INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    read_error TEXT,
+    uploaded TEXT,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_invoice ON files(invoice_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+INVOICE_FILE_RE = re.compile(r'^(?P<invoice_id>[^ ]+) - (?P<payment>[^ ]+) - (?P<total>[\d.,]+)\s*đ$')
+GRAB_FILE_RE = re.compile(r'^Grab - (?P<date>[\d-]+) - (?P<invoice_id>.+)$')
+
+# ============================================================================
+# ĐỌC FILE HÓA ĐƠN
+# ============================================================================
+
+
+def parse_invoice_file_name(file_name):
+    """
+    "240002 - transfer - 642.600đ.xlsx" → ('240002', 'transfer', 642600.0)
+    "Grab - 01-02-2025 - 123.xlsx" → ('123', 'grab', None). Tên khác → (stem, None, None)
+    """
+    stem = Path(file_name).stem
+    match = INVOICE_FILE_RE.match(stem)
+    if match:
+        total = float(match.group('total').replace('.', '').replace(',', ''))
+        return match.group('invoice_id'), match.group('payment').lower(), total
+    match = GRAB_FILE_RE.match(stem)
+    if match:
+        return match.group('invoice_id'), GRAB_PAYMENT_METHOD, None
+    return stem, None, None
+
+
+def _is_service_fee(name):
+    name = name.lower()
+    return 'phí dịch vụ' in name or 'service fee' in name
+
+
+def read_invoice_rows(path):
+    """Các dòng món trong file: list of (tên, đơn vị, số lượng, đơn giá) — cột C, D, E, F"""
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = []
+        for row in wb.active.iter_rows(min_row=2, max_col=6, values_only=True):
+            if len(row) < 6 or not row[2] or not str(row[2]).strip():
+                continue
+            rows.append((str(row[2]).strip(), row[3] or '', row[4], row[5]))
+        return rows
+    finally:
+        wb.close()
+
+
+def manifest_entry(path, rows, data=None, read_error=None):
+    """
+    Entry manifest của 1 file từ các dòng món (như invoice_file_rows / read_invoice_rows).
+    data: bytes của file nếu đã có sẵn (không thì đọc lại để tính hash).
+    """
+    path = Path(path)
+    stat = path.stat()
+    if data is None:
+        data = path.read_bytes()
+    invoice_id, payment_method, total_with_vat = parse_invoice_file_name(path.name)
+    items_total = 0.0
+    items_8 = items_10 = 0
+    for name, _, quantity, price in rows:
+        try:
+            items_total += float(quantity or 0) * float(price or 0)
+        except (ValueError, TypeError):
+            pass
+        if _is_service_fee(name):
+            continue
+        if is_tax_10_name(name):
+            items_10 += 1
+        else:
+            items_8 += 1
+    return {
+        'file': path.name,
+        'invoice_id': invoice_id,
+        'payment_method': payment_method,
+        'total_with_vat': total_with_vat,
+        'items_total': items_total,
+        'item_count': len(rows),
+        'items_8': items_8,
+        'items_10': items_10,
+        'content_hash': hashlib.sha256(data).hexdigest(),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'read_error': read_error,
+    }
+
+
+def scan_invoice_file(path):
+    """Entry manifest đọc từ workbook trên đĩa; file không đọc được → entry rỗng có read_error"""
+    try:
+        rows = read_invoice_rows(path)
+        read_error = None
+    except Exception as e:
+        rows = []
+        read_error = str(e)
+    return manifest_entry(path, rows, read_error=read_error)
+
+# ============================================================================
+# GHI
+# ============================================================================
+
+
+def open_manifest(path=None, tax_dir=None, reconcile=True):
+    """
+    Mở manifest (tạo bảng nếu chưa có). Lần đầu (chưa đối chiếu lần nào) → đối chiếu với
+    tax_dir để các file tạo trước khi có manifest cũng có entry. Dùng commit() / close().
+    """
+    conn = sqlite3.connect(str(path or MANIFEST_FILE), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    if reconcile and conn.execute("SELECT 1 FROM meta WHERE key = 'reconciled'").fetchone() is None:
+        rebuild_manifest(conn, tax_dir)
+        conn.commit()
+    return conn
+
+
+def record_manifest_entry(conn, entry):
+    """Ghi / cập nhật entry. Trạng thái upload giữ nguyên nếu nội dung không đổi. Không commit."""
+    columns = ', '.join(MANIFEST_FIELDS)
+    updates = ', '.join(f"{field} = excluded.{field}" for field in MANIFEST_FIELDS if field != 'file')
+    conn.execute(
+        f"INSERT INTO files ({columns}, updated) VALUES ({', '.join('?' * len(MANIFEST_FIELDS))}, ?) "
+        f"ON CONFLICT(file) DO UPDATE SET {updates}, updated = excluded.updated, "
+        f"uploaded = CASE WHEN files.content_hash = excluded.content_hash THEN files.uploaded END",
+        (*(entry[field] for field in MANIFEST_FIELDS), datetime.now().isoformat(timespec='seconds')))
+
+
+def record_invoice_file(path, rows, data=None):
+    """Ghi entry cho 1 file vừa tạo (mở / commit / đóng manifest riêng — cho nơi ghi lẻ từng file)"""
+    conn = open_manifest()
+    try:
+        record_manifest_entry(conn, manifest_entry(path, rows, data))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def remove_manifest_files(conn, file_names):
+    """Xóa entry của các file đã bị xóa khỏi tax_files. Không commit."""
+    conn.executemany("DELETE FROM files WHERE file = ?", [(name,) for name in file_names])
+
+
+def mark_uploaded(conn, file_name):
+    """Đánh dấu file đã upload lên hệ thống hóa đơn điện tử. Không commit."""
+    conn.execute("UPDATE files SET uploaded = ? WHERE file = ?",
+                 (datetime.now().isoformat(timespec='seconds'), file_name))
+
+
+def rebuild_manifest(conn, tax_dir=None):
+    """
+    Đối chiếu manifest với thư mục: file mới / có size hoặc mtime khác → đọc lại workbook;
+    entry không còn file → xóa. Returns dict số file added, updated, removed, unchanged.
+    Không commit.
+    """
+    tax_dir = Path(tax_dir or TAX_FILES_DIR)
+    known = {row['file']: (row['size'], row['mtime_ns'])
+             for row in conn.execute("SELECT file, size, mtime_ns FROM files")}
+    counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    present = set()
+    if tax_dir.exists():
+        for path in sorted(tax_dir.glob("*.xlsx")):
+            if path.name.startswith(('.', '~$')):
+                continue
+            present.add(path.name)
+            stat = path.stat()
+            if known.get(path.name) == (stat.st_size, stat.st_mtime_ns):
+                counts['unchanged'] += 1
+                continue
+            counts['updated' if path.name in known else 'added'] += 1
+            record_manifest_entry(conn, scan_invoice_file(path))
+    removed = [name for name in known if name not in present]
+    remove_manifest_files(conn, removed)
+    counts['removed'] = len(removed)
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('reconciled', ?)",
+                 (datetime.now().isoformat(timespec='seconds'),))
+    return counts
+
+# ============================================================================
+# ĐỌC
+# ============================================================================
+
+
+def _grab_filter(include_grab):
+    return ("", ()) if include_grab else (" WHERE payment_method IS NOT ?", (GRAB_PAYMENT_METHOD,))
+
+
+def manifest_files(conn, include_grab=True):
+    """Tất cả entry (dict), sắp theo tên file. include_grab=False: bỏ hóa đơn Grab"""
+    where, params = _grab_filter(include_grab)
+    return [dict(row) for row in conn.execute(f"SELECT * FROM files{where} ORDER BY file", params)]
+
+
+def manifest_file_names(conn):
+    return {row['file'] for row in conn.execute("SELECT file FROM files")}
+
+
+def manifest_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+def files_by_invoice(conn, include_grab=True):
+    """{mã hóa đơn: tên file} (mã có nhiều file → file đầu tiên theo tên)"""
+    where, params = _grab_filter(include_grab)
+    result = {}
+    for row in conn.execute(f"SELECT invoice_id, file FROM files{where} ORDER BY file", params):
+        result.setdefault(row['invoice_id'], row['file'])
+    return result
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+
+def main():
+    conn = open_manifest(reconcile=False)
+    counts = rebuild_manifest(conn)
+    conn.commit()
+    entries = manifest_files(conn)
+    conn.close()
+    print(f"📒 Manifest {TAX_FILES_DIR.name}/: {len(entries)} file "
+          f"(+{counts['added']} mới, {counts['updated']} cập nhật, -{counts['removed']} đã xóa, "
+          f"{counts['unchanged']} không đổi)")
+    uploaded = sum(1 for entry in entries if entry['uploaded'])
+    errors = sum(1 for entry in entries if entry['read_error'])
+    print(f"   Đã upload: {uploaded}, chưa upload: {len(entries) - uploaded}")
+    if errors:
+        print(f"   ⚠️  {errors} file không đọc được")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+GHI FILE EXCEL HÓA ĐƠN THEO TEMPLATE
+====================================
+Mọi file hóa đơn có cùng cấu trúc: 1 sheet, 6 cột cố định độ rộng, dòng header, các dòng
+món (Tinh_chat=1, Ma_so trống, tên, đơn vị, số lượng, đơn giá). Tạo 1 xlsxwriter.Workbook
+cho mỗi hóa đơn (format, set_column, ghi 10 file tạm rồi nén) tốn thời gian nhưng chỉ có
+các dòng món là khác nhau.
+
+Module này render 1 lần cho mỗi process một workbook mẫu bằng chính xlsxwriter (cùng format,
+cùng độ rộng cột, 1 dòng món mẫu để biết style id), tách ra:
+    - các part tĩnh của package (content types, rels, workbook, styles, theme, app.xml)
+    - sheet1.xml: phần đầu (cols, header) / phần cuối
+    - sharedStrings.xml: các chuỗi header
+Mỗi hóa đơn chỉ sinh XML các dòng món + shared strings + core.xml (ngày tạo) rồi ghi zip
+thẳng ra file, đúng định dạng xlsxwriter tạo ra (file giống hệt từng byte khi cùng 'created').
+
+Dữ liệu mà xlsxwriter.write() sẽ hiểu khác chuỗi thường (công thức '=...', URL, chuỗi quá
+dài, số NaN/inf) → ghi bằng xlsxwriter như cũ.
+"""
+
+import math
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import xlsxwriter
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# ============================================================================
+# CẤU HÌNH FILE HÓA ĐƠN
+# ============================================================================
+
+INVOICE_HEADERS = ['Tinh_chat', 'Ma_so', 'Ten_san_pham', 'Don_vi_tinh', 'So_luong', 'Don_gia']
+INVOICE_COLUMN_WIDTHS = [('A:A', 11.57), ('B:B', 9.14), ('C:C', 26.57), ('D:D', 13.71), ('E:E', 11.29), ('F:F', 11)]
+
+# Ngày tạo giả dùng khi render template, được thay bằng ngày tạo thật của từng file
+_TEMPLATE_CREATED = datetime(1999, 12, 31, 23, 59, 58)
+_TEMPLATE_PROBE_ROW = ('__probe_name__', '__probe_unit__', 1.0, 1.0)
+
+# Chuỗi mà worksheet.write() của xlsxwriter không ghi thành chuỗi thường
+_URL_RE = re.compile(r'(ftp|http)s?://|mailto:|(in|ex)ternal:|file://')
+_CONTROL_ESCAPE_RE = re.compile('(_x[0-9a-fA-F]{4}_)')
+_CONTROL_CHARS_RE = re.compile(r'([\x00-\x08\x0b-\x1f])')
+_WHITESPACE_EDGE_RE = re.compile(r'^\s|\s$')
+STRING_MAX_LENGTH = 32767
+
+_template = None  # dict template, render 1 lần cho mỗi process
+
+# ============================================================================
+# GHI BẰNG XLSXWRITER (CÁCH CŨ / DỰ PHÒNG)
+# ============================================================================
+
+
+def write_invoice_xlsxwriter(rows, output_file, created=None):
+    """
+    Ghi file hóa đơn bằng xlsxwriter.
+    rows: list of (tên món, đơn vị, số lượng, đơn giá) đã chuẩn hóa tên.
+    created: datetime ghi vào thuộc tính file (mặc định: lúc tạo)
+    """
+    workbook = xlsxwriter.Workbook(output_file)
+    if created is not None:
+        workbook.set_properties({'created': created})
+    worksheet = workbook.add_worksheet()
+
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#D9D9D9', 'border': 1})
+    cell_format = workbook.add_format({'border': 1})
+    number_format = workbook.add_format({'border': 1, 'num_format': '#,##0.00'})
+
+    for columns, width in INVOICE_COLUMN_WIDTHS:
+        worksheet.set_column(columns, width)
+
+    for col, header in enumerate(INVOICE_HEADERS):
+        worksheet.write(0, col, header, header_format)
+
+    for row_idx, (item_name, unit_value, quantity, price) in enumerate(rows, 1):
+        worksheet.write(row_idx, 0, 1, cell_format)
+        worksheet.write(row_idx, 1, '', cell_format)
+        worksheet.write(row_idx, 2, item_name, cell_format)
+        worksheet.write(row_idx, 3, unit_value, cell_format)
+        worksheet.write(row_idx, 4, quantity, number_format)
+        worksheet.write(row_idx, 5, price, number_format)
+
+    workbook.close()
+
+# ============================================================================
+# TEMPLATE
+# ============================================================================
+
+
+def _split_once(text, separator):
+    before, found, after = text.partition(separator)
+    if not found:
+        raise ValueError(f"template xlsx không có {separator!r}")
+    return before, after
+
+
+def _build_template():
+    """Render workbook mẫu (header + 1 dòng món mẫu) bằng xlsxwriter và tách các part"""
+    with tempfile.TemporaryDirectory() as tmp:
+        probe_path = os.path.join(tmp, 'template.xlsx')
+        write_invoice_xlsxwriter([_TEMPLATE_PROBE_ROW], probe_path, created=_TEMPLATE_CREATED)
+        with zipfile.ZipFile(probe_path) as probe:
+            parts = [(info.filename, info.date_time, info.external_attr, info.create_system,
+                      probe.read(info.filename)) for info in probe.infolist()]
+
+    contents = {name: data for name, _, _, _, data in parts}
+
+    # sheet1.xml: <dimension> thay theo số dòng, dòng món mẫu (r="2") bỏ đi, lấy style id
+    sheet = contents['xl/worksheets/sheet1.xml'].decode('utf-8')
+    sheet_head, sheet_rest = _split_once(sheet, '<dimension ref="A1:F2"/>')
+    header_part, probe_rest = _split_once(sheet_rest, '<row r="2" ')
+    probe_row, sheet_tail = _split_once(probe_rest, '</row>')
+    cell_style = re.search(r'<c r="A2" s="(\d+)"', probe_row).group(1)
+    number_style = re.search(r'<c r="E2" s="(\d+)"', probe_row).group(1)
+
+    # sharedStrings.xml: chỉ giữ các chuỗi header
+    sst = contents['xl/sharedStrings.xml'].decode('utf-8')
+    sst_head, sst_rest = _split_once(sst, '<si>')
+    sst_head = re.sub(r' count="\d+" uniqueCount="\d+"', ' count="{count}" uniqueCount="{unique}"', sst_head)
+    header_strings = '<si>' + sst_rest[:sst_rest.index(f'<si><t>{_TEMPLATE_PROBE_ROW[0]}</t></si>')]
+
+    template_iso = _TEMPLATE_CREATED.strftime('%Y-%m-%dT%H:%M:%SZ')
+    core = contents['docProps/core.xml'].decode('utf-8')
+    if template_iso not in core:
+        raise ValueError("template xlsx không có ngày tạo mẫu trong core.xml")
+
+    return {
+        'parts': [(name, date_time, external_attr, create_system) for name, date_time, external_attr, create_system, _ in parts],
+        'static': contents,
+        'sheet_head': sheet_head,
+        'sheet_header': header_part,
+        'sheet_tail': sheet_tail,
+        'cell_style': cell_style,
+        'number_style': number_style,
+        'sst_head': sst_head,
+        'sst_header_strings': header_strings,
+        'core_parts': core.split(template_iso),
+    }
+
+
+def get_invoice_template():
+    """Template của process hiện tại (render lần đầu gọi)"""
+    global _template
+    if _template is None:
+        _template = _build_template()
+    return _template
+
+# ============================================================================
+# GHI THEO TEMPLATE
+# ============================================================================
+
+
+def _is_plain_string(value):
+    """Chuỗi mà xlsxwriter.write() ghi thành shared string / ô trống (không phải công thức, URL...)"""
+    if not isinstance(value, str) or len(value) > STRING_MAX_LENGTH:
+        return False
+    if value.startswith('=') or (value.startswith('{=') and value.endswith('}')):
+        return False
+    return not (':' in value and _URL_RE.match(value))
+
+
+def _is_plain_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _escape_shared_string(value):
+    """Giống sharedstrings.py của xlsxwriter: _xHHHH_ cho ký tự điều khiển, &<> và xml:space"""
+    value = _CONTROL_ESCAPE_RE.sub(r'_x005F\1', value)
+    value = _CONTROL_CHARS_RE.sub(lambda match: f"_x{ord(match.group(1)):04X}_", value)
+    value = value.replace('\ufffe', '_xFFFE_').replace('\uffff', '_xFFFF_')
+    space = ' xml:space="preserve"' if _WHITESPACE_EDGE_RE.search(value) else ''
+    value = value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return f'<si><t{space}>{value}</t></si>'
+
+
+def _render_invoice_parts(rows, template, created):
+    """Returns (sheet1.xml, sharedStrings.xml, core.xml) dạng bytes"""
+    cell_style = template['cell_style']
+    number_style = template['number_style']
+    strings = {}
+    new_strings = []
+    string_count = len(INVOICE_HEADERS)
+
+    def string_cell(ref, value):
+        nonlocal string_count
+        if value == '':
+            return f'<c r="{ref}" s="{cell_style}"/>'
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(INVOICE_HEADERS) + len(new_strings)
+            new_strings.append(_escape_shared_string(value))
+        string_count += 1
+        return f'<c r="{ref}" s="{cell_style}" t="s"><v>{index}</v></c>'
+
+    row_xml = []
+    for row_number, (item_name, unit_value, quantity, price) in enumerate(rows, 2):
+        row_xml.append(
+            f'<row r="{row_number}" spans="1:6">'
+            f'<c r="A{row_number}" s="{cell_style}"><v>1</v></c>'
+            f'<c r="B{row_number}" s="{cell_style}"/>'
+            f'{string_cell(f"C{row_number}", item_name)}'
+            f'{string_cell(f"D{row_number}", unit_value)}'
+            f'<c r="E{row_number}" s="{number_style}"><v>{quantity:.16G}</v></c>'
+            f'<c r="F{row_number}" s="{number_style}"><v>{price:.16G}</v></c>'
+            '</row>'
+        )
+
+    sheet = (template['sheet_head'] + f'<dimension ref="A1:F{len(rows) + 1}"/>' +
+             template['sheet_header'] + ''.join(row_xml) + template['sheet_tail'])
+    shared_strings = (template['sst_head'].format(count=string_count, unique=len(INVOICE_HEADERS) + len(new_strings)) +
+                      template['sst_header_strings'] + ''.join(new_strings) + '</sst>')
+    if created is None:
+        created = datetime.now(timezone.utc)
+    core = created.strftime('%Y-%m-%dT%H:%M:%SZ').join(template['core_parts'])
+    return sheet.encode('utf-8'), shared_strings.encode('utf-8'), core.encode('utf-8')
+
+
+def write_invoice_template(rows, output_file, created=None):
+    """
+    Ghi file hóa đơn từ template (cùng nội dung với write_invoice_xlsxwriter).
+    Hóa đơn không có món (styles.xml khác: xlsxwriter bỏ format không dùng) hoặc có dữ liệu
+    xlsxwriter xử lý đặc biệt → ghi bằng xlsxwriter.
+    """
+    if not rows or not all(_is_plain_string(name) and _is_plain_string(unit) and
+               _is_plain_number(quantity) and _is_plain_number(price)
+               for name, unit, quantity, price in rows):
+        write_invoice_xlsxwriter(rows, output_file, created)
+        return
+
+    template = get_invoice_template()
+    sheet, shared_strings, core = _render_invoice_parts(rows, template, created)
+    dynamic = {
+        'xl/worksheets/sheet1.xml': sheet,
+        'xl/sharedStrings.xml': shared_strings,
+        'docProps/core.xml': core,
+    }
+    static = template['static']
+    with zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=False) as xlsx_file:
+        for name, date_time, external_attr, create_system in template['parts']:
+            zip_info = zipfile.ZipInfo(name, date_time)
+            zip_info.compress_type = zipfile.ZIP_DEFLATED
+            zip_info.external_attr = external_attr
+            zip_info.create_system = create_system
+            xlsx_file.writestr(zip_info, dynamic.get(name, static[name]))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+HÀNG ĐỢI JOB NỀN CHO WEB
+========================
+Các endpoint nặng (xử lý file export, tạo hóa đơn Grab, thay hóa đơn bia/rượu, kiểm tra hóa
+đơn) chạy như 1 job trên thread pool (JOB_WORKERS thread) thay vì trong thread của request:
+
+- submit_job(kind, func, ...) → job id ngay lập tức; get_job(id) → trạng thái, tiến độ, log
+- Log theo từng job: sys.stdout được thay 1 lần duy nhất bằng bộ chia (install_stdout_dispatcher)
+  ghi vào log của job đang chạy trên thread hiện tại (contextvar). contextlib.redirect_stdout
+  đổi sys.stdout của cả process → output của các request chạy song song bị lẫn vào nhau;
+  capture_stdout() làm việc tương tự nhưng chỉ cho thread hiện tại.
+- Tiến độ + hủy: code xử lý gọi report_job_progress(parsed=1, ...) — tăng bộ đếm của job
+  hiện tại và raise InterruptedError nếu job đã bị hủy (no-op khi không chạy trong job).
+"""
+
+import contextlib
+import contextvars
+import io
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+JOB_WORKERS = 2            # Số job chạy cùng lúc; job khác chờ trong hàng đợi
+MAX_FINISHED_JOBS = 50     # Số job đã xong giữ lại để tra cứu
+JOB_LOG_TAIL = 200         # Số dòng log cuối trả về trong trạng thái job
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# ============================================================================
+# LOG THEO THREAD (KHÔNG ĐỔI sys.stdout KHI CHẠY)
+# ============================================================================
+
+_stdout_target = contextvars.ContextVar('stdout_target', default=None)
+_original_stdout = None
+_dispatcher_lock = threading.Lock()
+
+
+def _dispatch_write(text):
+    target = _stdout_target.get()
+    return (_original_stdout if target is None else target).write(text)
+
+
+def _dispatch_writelines(lines):
+    for line in lines:
+        _dispatch_write(line)
+
+
+def _dispatch_flush():
+    target = _stdout_target.get()
+    if target is None:
+        _original_stdout.flush()
+
+
+def install_stdout_dispatcher():
+    """
+    Thay sys.stdout (1 lần) bằng bộ chia: thread đang capture → buffer của thread đó,
+    còn lại → stdout gốc. Gọi lại nhiều lần không sao.
+    """
+    global _original_stdout
+    with _dispatcher_lock:
+        if _original_stdout is not None:
+            return
+        _original_stdout = sys.stdout
+        sys.stdout = SimpleNamespace(
+            write=_dispatch_write,
+            writelines=_dispatch_writelines,
+            flush=_dispatch_flush,
+            isatty=lambda: _stdout_target.get() is None and _original_stdout.isatty(),
+            fileno=_original_stdout.fileno,
+            encoding=getattr(_original_stdout, 'encoding', 'utf-8'),
+            errors=getattr(_original_stdout, 'errors', 'strict'),
+        )
+
+
+@contextlib.contextmanager
+def capture_stdout(buffer):
+    """
+    Như contextlib.redirect_stdout(buffer) nhưng chỉ cho thread hiện tại khi đã cài bộ chia
+    (web); chưa cài (CLI) → redirect_stdout như cũ.
+    """
+    if _original_stdout is None:
+        with contextlib.redirect_stdout(buffer):
+            yield buffer
+        return
+    token = _stdout_target.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _stdout_target.reset(token)
+
+# ============================================================================
+# JOB
+# ============================================================================
+
+_current_job = contextvars.ContextVar('current_job', default=None)
+_jobs = {}  # job_id -> job dict (theo thứ tự submit)
+_jobs_lock = threading.Lock()
+_executor = None
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+    return _executor
+
+
+def _prune_finished_jobs():
+    finished = [job_id for job_id, job in _jobs.items() if job['status'] in FINISHED_STATUSES]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def _run_job(job, func, args, kwargs):
+    if job['cancel'].is_set():
+        job['status'] = JOB_CANCELLED
+        job['finished'] = _now()
+        job['done'].set()
+        return
+    job['status'] = JOB_RUNNING
+    job['started'] = _now()
+    job_token = _current_job.set(job)
+    try:
+        with capture_stdout(job['log']):
+            job['result'] = func(*args, **kwargs)
+        job['status'] = JOB_DONE
+    except Exception as e:
+        job['status'] = JOB_CANCELLED if job['cancel'].is_set() else JOB_FAILED
+        job['error'] = str(e)
+    finally:
+        _current_job.reset(job_token)
+        job['finished'] = _now()
+        job['done'].set()
+
+
+def submit_job(kind, func, *args, **kwargs):
+    """Đưa func(*args, **kwargs) vào hàng đợi. Kết quả job = giá trị func trả về. Returns job id"""
+    install_stdout_dispatcher()
+    job = {
+        'id': uuid.uuid4().hex[:12],
+        'kind': kind,
+        'status': JOB_QUEUED,
+        'created': _now(),
+        'started': None,
+        'finished': None,
+        'progress': {},
+        'result': None,
+        'error': None,
+        'log': io.StringIO(),
+        'cancel': threading.Event(),
+        'done': threading.Event(),
+    }
+    with _jobs_lock:
+        _prune_finished_jobs()
+        _jobs[job['id']] = job
+    _get_executor().submit(_run_job, job, func, args, kwargs)
+    return job['id']
+
+
+def job_snapshot(job, log_lines=JOB_LOG_TAIL):
+    """Trạng thái job dạng JSON: id, kind, status, thời gian, progress, result, error, logs (dòng cuối)"""
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'created': job['created'],
+        'started': job['started'],
+        'finished': job['finished'],
+        'progress': dict(job['progress']),
+        'result': job['result'],
+        'error': job['error'],
+        'logs': job['log'].getvalue().splitlines()[-log_lines:] if log_lines else [],
+    }
+
+
+def get_job(job_id, log_lines=JOB_LOG_TAIL):
+    job = _jobs.get(job_id)
+    return job_snapshot(job, log_lines) if job is not None else None
+
+
+def list_jobs():
+    """Trạng thái (không kèm log) các job, mới nhất trước"""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return [job_snapshot(job, log_lines=0) for job in reversed(jobs)]
+
+
+def wait_job(job_id, timeout=None, log_lines=JOB_LOG_TAIL):
+    """Chờ job xong (hoặc hết timeout). Returns trạng thái job, None nếu không có job"""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    job['done'].wait(timeout)
+    return job_snapshot(job, log_lines)
+
+
+def cancel_job(job_id):
+    """
+    Hủy job: job đang chờ không chạy nữa; job đang chạy dừng ở lần report_job_progress kế
+    tiếp. Returns trạng thái job, None nếu không có job.
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    if job['status'] not in FINISHED_STATUSES:
+        job['cancel'].set()
+    return job_snapshot(job)
+
+
+def report_job_progress(**increments):
+    """
+    Cộng các bộ đếm tiến độ của job đang chạy trên thread hiện tại (vd. parsed=1, written=1).
+    Job đã bị hủy → raise InterruptedError. Không chạy trong job → không làm gì.
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+    progress = job['progress']
+    for key, value in increments.items():
+        progress[key] = progress.get(key, 0) + value
+    if job['cancel'].is_set():
+        raise InterruptedError("Job đã bị hủy")
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Quét tax_files, liệt kê TẤT CẢ hóa đơn đã bị thay bằng bia/rượu (chỉ có Sapporo, Tiger Draught, Coke).
+Danh sách file lấy từ manifest tax_files (invoice_manifest). File có trong sổ thay thế
+(replacement_ledger) → tra theo nguồn đã ghi; file tạo trước khi có sổ → theo số món thuế
+8% / 10% trong manifest. Không mở file nào.
 """
 
 import sys
@@ -8,35 +11,30 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 TAX_DIR = BASE_DIR / "tax_files"
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
 
-# Tên món trong hóa đơn bia/rượu do daily_beverage_invoices tạo
-BEVERAGE_KEYWORDS = ("sapporo", "tiger draught", "coke")
+from automation.replacement_ledger import KIND_BEVERAGE, open_replacement_ledger, file_replacements
+from automation.invoice_manifest import open_manifest, manifest_files
 
 
-def is_beverage_only_invoice(filepath):
-    """Kiểm tra file có phải hóa đơn chỉ toàn bia/rượu (đã thay thế) không."""
-    try:
-        import openpyxl
-        wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
-        ws = wb.active
-        product_names = []
-        for row in range(2, ws.max_row + 1):
-            val = ws.cell(row=row, column=3).value  # Ten_san_pham
-            if val and str(val).strip():
-                product_names.append(str(val).strip().lower())
-        wb.close()
-    except Exception:
-        return False, []
+def is_beverage_only_entry(file_entry):
+    """Entry manifest của hóa đơn chỉ toàn món thuế 10% (bia/rượu/Coke, không tính phí dịch vụ)"""
+    return file_entry['items_10'] > 0 and file_entry['items_8'] == 0
 
-    if not product_names:
-        return False, []
 
-    for name in product_names:
-        if "phí dịch vụ" in name or "service" in name:
-            continue
-        if not any(kw in name for kw in BEVERAGE_KEYWORDS):
-            return False, product_names  # có món không phải bia/rượu
-    return True, product_names
+def beverage_replaced_files(file_entries, ledger):
+    """Các entry manifest là hóa đơn đã bị thay bằng bia/rượu. Returns list of (entry, tên món thay thế)"""
+    result = []
+    for file_entry in file_entries:
+        ledger_entry = file_replacements(ledger, file_entry['file'])
+        if ledger_entry is not None:
+            _, kind, rows = ledger_entry
+            if kind == KIND_BEVERAGE:
+                result.append((file_entry, [row['replacement_name'] for row in rows]))
+        elif is_beverage_only_entry(file_entry):
+            result.append((file_entry, []))
+    return result
 
 
 def main():
@@ -44,24 +42,22 @@ def main():
         print("Không tìm thấy thư mục tax_files")
         return 1
 
-    files = sorted(f for f in TAX_DIR.glob("*.xlsx") if not f.name.startswith("Grab - "))
+    manifest = open_manifest(tax_dir=TAX_DIR)
+    files = manifest_files(manifest, include_grab=False)
+    manifest.close()
     beverage_invoices = []
 
-    for f in files:
-        is_beverage, names = is_beverage_only_invoice(f)
-        if is_beverage:
-            stem = f.stem  # "070092 - atm - 612.800đ"
-            parts = stem.split(" - ")
-            inv_id = parts[0].strip() if parts else ""
-            payment = parts[1].strip() if len(parts) > 1 else ""
-            total_str = parts[2].strip() if len(parts) > 2 else ""
-            beverage_invoices.append({
-                "file": f.name,
-                "invoice_id": inv_id,
-                "payment": payment,
-                "total_str": total_str,
-                "items": names,
-            })
+    ledger = open_replacement_ledger()
+    for file_entry, names in beverage_replaced_files(files, ledger):
+        total = file_entry["total_with_vat"]
+        beverage_invoices.append({
+            "file": file_entry["file"],
+            "invoice_id": file_entry["invoice_id"] or "",
+            "payment": file_entry["payment_method"] or "",
+            "total_str": f"{int(total):,}đ".replace(",", ".") if total is not None else "",
+            "items": names,
+        })
+    ledger.close()
 
     # In báo cáo
     print("=" * 70)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+CACHE MENU (DÙNG CHUNG WEB / CLI / SCRIPT KIỂM TRA)
+===================================================
+Mỗi request /api/grab-invoice, /api/process-default và mỗi lần chạy check_invoices
+đều đọc lại 2 file menu Excel. Module này giữ kết quả parse của từng file menu:
+
+- Trong bộ nhớ (cả process): file không đổi (size + mtime) → trả về đúng list cũ,
+  không đọc Excel, MenuIndex đã build cũng được dùng lại
+- Snapshot nhị phân trên đĩa (MENU_SNAPSHOT_FILE, cạnh thư mục Menu/): process mới
+  khởi động cũng không cần đọc Excel
+- Size / mtime khác → so SHA-256 nội dung; chỉ parse lại khi nội dung thật sự đổi
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from Menu.parse_menu import parse_excel_menu
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+MENU_SNAPSHOT_FILE = PROJECT_ROOT / '.menu_snapshot.pickle'
+# Tăng khi format item của parse_excel_menu thay đổi để bỏ qua snapshot cũ
+MENU_SNAPSHOT_VERSION = 2
+
+HASH_CHUNK_SIZE = 1 << 20  # 1MB
+
+# resolved path (str) -> {'size', 'mtime_ns', 'sha256', 'items'}
+_menu_entries = None
+
+# ============================================================================
+# SNAPSHOT TRÊN ĐĨA
+# ============================================================================
+
+
+def _file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_snapshot():
+    """Đọc snapshot 1 lần cho mỗi process; snapshot hỏng / khác version → bắt đầu rỗng"""
+    global _menu_entries
+    if _menu_entries is None:
+        _menu_entries = {}
+        try:
+            with open(MENU_SNAPSHOT_FILE, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') == MENU_SNAPSHOT_VERSION:
+                _menu_entries = data['files']
+        except Exception:
+            # Snapshot chỉ là cache: đọc lỗi thì parse lại Excel
+            pass
+    return _menu_entries
+
+
+def _save_snapshot(entries):
+    """Ghi file tạm rồi os.replace; lỗi ghi (thư mục read-only...) chỉ bỏ qua snapshot"""
+    tmp_path = MENU_SNAPSHOT_FILE.with_name(MENU_SNAPSHOT_FILE.name + f'.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': MENU_SNAPSHOT_VERSION, 'files': entries}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, MENU_SNAPSHOT_FILE)
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+# ============================================================================
+# API
+# ============================================================================
+
+
+def load_cached_menu(menu_path):
+    """
+    Các món của 1 file menu (như parse_excel_menu), có cache.
+    File không đổi → trả về cùng 1 list object (không được sửa các món trong list).
+    """
+    menu_path = Path(menu_path).resolve()
+    stat = menu_path.stat()
+    entries = _load_snapshot()
+    key = str(menu_path)
+    entry = entries.get(key)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['items']
+
+    # Size / mtime khác (copy lại file, checkout git...): chỉ parse lại khi nội dung đổi
+    sha256 = _file_sha256(menu_path)
+    if entry is not None and entry['sha256'] == sha256:
+        items = entry['items']
+    else:
+        items = parse_excel_menu(str(menu_path))
+    entries[key] = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256,
+        'items': items,
+    }
+    _save_snapshot(entries)
+    return items
+
+
+def clear_menu_cache():
+    """Xóa cache trong bộ nhớ và snapshot trên đĩa (lần load sau sẽ đọc lại Excel)"""
+    global _menu_entries
+    _menu_entries = {}
+    try:
+        MENU_SNAPSHOT_FILE.unlink()
+    except OSError:
+        pass
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+CACHE KẾT QUẢ PARSE FILE EXPORT
+===============================
+Bấm "process" nhiều lần trên cùng các file trong data/ không cần load menu và
+parse lại: kết quả (danh sách hóa đơn + alcohol_items_found) được lưu trên đĩa,
+key = SHA-256 của nội dung các file input (kèm payment_method) + fingerprint menu.
+
+- Mỗi entry = 1 file JSON nén zlib trong PARSE_CACHE_DIR
+- File input hoặc menu thay đổi → key khác → parse lại
+- Tổng dung lượng vượt MAX_PARSE_CACHE_BYTES → xóa entry dùng lâu nhất (theo mtime)
+"""
+
+import hashlib
+import json
+import os
+import sys
+import zlib
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+PARSE_CACHE_DIR = PROJECT_ROOT / '.parse_cache'
+MAX_PARSE_CACHE_BYTES = 200 * 1024 * 1024  # 200MB
+# Tăng khi logic parse thay đổi để bỏ qua các entry cũ
+PARSE_CACHE_VERSION = 6
+
+HASH_CHUNK_SIZE = 1 << 20  # 1MB
+
+# ============================================================================
+# KEY
+# ============================================================================
+
+
+def file_sha256(file_path):
+    """SHA-256 nội dung file (đọc theo chunk)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def menu_fingerprint(menu_paths):
+    """Fingerprint các file menu (tên file + SHA-256 nội dung); file không tồn tại cũng được tính"""
+    digest = hashlib.sha256()
+    for menu_path in menu_paths:
+        menu_path = Path(menu_path)
+        digest.update(menu_path.name.encode('utf-8'))
+        digest.update(file_sha256(menu_path).encode('ascii') if menu_path.exists() else b'-')
+    return digest.hexdigest()
+
+
+def parse_cache_key(sources, menu_fp):
+    """
+    Key của 1 lần parse. sources: list of (file_path, payment_method) — thứ tự có ý nghĩa
+    (số thứ tự hóa đơn đánh liên tục qua các file).
+    """
+    digest = hashlib.sha256(f"v{PARSE_CACHE_VERSION}:{menu_fp}".encode('ascii'))
+    for file_path, payment_method in sources:
+        digest.update(f"|{file_sha256(file_path)}:{payment_method or ''}".encode('utf-8'))
+    return digest.hexdigest()
+
+# ============================================================================
+# ĐỌC / GHI
+# ============================================================================
+
+
+def _entry_path(key, cache_dir=None):
+    return Path(cache_dir or PARSE_CACHE_DIR) / f"{key}.json.z"
+
+
+def encode_invoice(invoice):
+    """Chụp lại 1 hóa đơn dạng JSON (trước khi bước ghi file thêm phí dịch vụ, sửa giá...)"""
+    return json.dumps(invoice, ensure_ascii=False)
+
+
+def load_parse_cache(key, cache_dir=None):
+    """Returns (invoices, alcohol_items_found) hoặc None nếu chưa có / entry hỏng"""
+    path = _entry_path(key, cache_dir)
+    try:
+        data = json.loads(zlib.decompress(path.read_bytes()).decode('utf-8'))
+    except (OSError, zlib.error, ValueError):
+        return None
+    # Đánh dấu vừa dùng để eviction giữ lại entry này
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data['invoices'], data['alcohol_items_found']
+
+
+def store_parse_cache(key, encoded_invoices, alcohol_items_found, cache_dir=None,
+                      max_bytes=MAX_PARSE_CACHE_BYTES):
+    """
+    Lưu 1 entry. encoded_invoices: list chuỗi JSON từ encode_invoice().
+    Ghi ra file tạm rồi os.replace để không bao giờ để lại entry ghi dở.
+    """
+    cache_dir = Path(cache_dir or PARSE_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    payload = (
+        '{"invoices": [' + ', '.join(encoded_invoices) + '], '
+        '"alcohol_items_found": ' + json.dumps(alcohol_items_found, ensure_ascii=False) + '}'
+    )
+    path = _entry_path(key, cache_dir)
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    tmp_path.write_bytes(zlib.compress(payload.encode('utf-8'), 6))
+    os.replace(tmp_path, path)
+    evict_parse_cache(cache_dir, max_bytes)
+    return path
+
+
+def evict_parse_cache(cache_dir=None, max_bytes=MAX_PARSE_CACHE_BYTES):
+    """Xóa entry cũ nhất (mtime) cho đến khi tổng dung lượng <= max_bytes. Returns số entry đã xóa"""
+    cache_dir = Path(cache_dir or PARSE_CACHE_DIR)
+    if not cache_dir.exists():
+        return 0
+    entries = []
+    for path in cache_dir.glob('*.json.z'):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear_parse_cache(cache_dir=None):
+    """Xóa toàn bộ cache parse"""
+    return evict_parse_cache(cache_dir, max_bytes=0)
@@ -17,13 +17,28 @@ Sử dụng:
     1. Process sale_by_payment_method (combine và split)
     2. Process single file
     3. Create Grab invoice
+    
+    Hoặc truyền nhiều file export, mỗi file kèm phương thức thanh toán:
+    python3 process_invoices.py "sale_by_payment_method.xls=transfer" "sale_by_payment_method (1).xls=atm"
+    
+    Thêm --jobs N để parse song song trên N process (file lớn / backfill nhiều tháng).
+    Thêm --write-jobs N để ghi các file xlsx song song trên N process.
+    Thêm --zip FILE.zip để ghi tất cả hóa đơn vào 1 file zip (không tạo file trong tax_files/).
+    Mặc định chỉ tạo file cho hóa đơn mới / thay đổi so với lần chạy trước; --full để tạo lại tất cả.
 """
 
 import re
 import xlsxwriter
 import sys
 import os
+import io
+import contextlib
+import math
 import random
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -33,9 +48,71 @@ PROJECT_ROOT = PACKAGE_DIR.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-# Import parse_menu
+# Import menu (parse_excel_menu qua cache)
 script_dir = PROJECT_ROOT
-from Menu.parse_menu import parse_excel_menu
+from automation.menu_cache import load_cached_menu
+from automation.tax_classifier import (
+    ALCOHOL_GROUPS,
+    TAX_STANDARD,
+    TAX_COKE,
+    FLAG_COKE,
+    tax_name_flags,
+    classify_tax_names,
+    classify_menu_item,
+)
+from automation.invoice_ledger import (
+    invoice_content_hash,
+    load_ledger,
+    save_ledger,
+    unchanged_invoice_hashes,
+    record_invoice,
+)
+from automation.parse_cache import (
+    PARSE_CACHE_VERSION,
+    menu_fingerprint,
+    parse_cache_key,
+    encode_invoice,
+    load_parse_cache,
+    store_parse_cache,
+)
+from automation.grab_cache import (
+    menu_items_fingerprint,
+    default_grab_seed,
+    grab_basket_key,
+    load_grab_basket,
+    store_grab_basket,
+)
+from automation.invoice_xlsx import write_invoice_template, write_invoice_xlsxwriter
+from automation.invoice_bundle import open_invoice_bundle, add_invoice_to_bundle
+from automation.replacement_ledger import open_replacement_ledger, record_invoice_replacements
+from automation.invoice_manifest import (
+    open_manifest,
+    manifest_entry,
+    record_manifest_entry,
+    record_invoice_file,
+    remove_manifest_files,
+)
+from automation.job_queue import capture_stdout, report_job_progress
+from automation.export_reader import (
+    ROW_MARKER,
+    INVOICE_MARKER_RE,
+    DATE_RE,
+    DATE_VALUE_RE,
+    extract_cells,
+    extract_cells_with_attrs,
+    detect_column_schema,
+    schema_row_layout,
+    layout_item_columns,
+    is_skipped_name,
+    scan_item_windows,
+    iter_export_rows,
+    open_export_map,
+    scan_invoice_spans,
+    read_export_span,
+    MIN_ITEM_PRICE,
+    MAX_ITEM_PRICE,
+    MAX_ITEM_QTY,
+)
 
 # ============================================================================
 # HÀM TIỆN ÍCH CHUẨN HÓA KEY TÊN MÓN
@@ -76,6 +153,31 @@ OUTPUT_DIR = 'tax_files'
 DEFAULT_FILE1 = 'sale_by_payment_method.xls'  # transfer
 DEFAULT_FILE2 = 'sale_by_payment_method (1).xls'  # atm
 
+# Parse song song (--jobs N): mỗi worker nhận nhiều shard nhỏ để chia tải đều hơn
+SHARDS_PER_JOB = 4
+# Ghi file song song (--write-jobs N): số file tối đa đang chờ ghi cho mỗi worker
+WRITE_QUEUE_PER_JOB = 8
+
+# Các file export theo phương thức thanh toán: (tên file, payment_method).
+# Thêm file COD / GRAB_ONLINE... chỉ cần thêm 1 dòng, không phải gộp file.
+DEFAULT_SOURCES = [
+    (DEFAULT_FILE1, 'transfer'),
+    (DEFAULT_FILE2, 'atm'),
+]
+
+# Hóa đơn Grab: 'exact' = solver knapsack (số nguyên VND), 'random' = generator random cũ.
+# Solver không tìm được nghiệm → tự động dùng generator random.
+GRAB_SOLVER = 'exact'
+GRAB_MAX_PRICE_ADJUSTMENT = 10000  # Món cuối được lệch giá tối đa 10,000 VND
+GRAB_SOLVER_ATTEMPTS = 30  # Số bộ món thử lại khi bộ món đã chọn không có nghiệm
+# Generator random: đánh giá cả loạt bộ món bằng ma trận NumPy (không có numpy → vòng lặp cũ)
+GRAB_VECTORIZED = True
+GRAB_VECTOR_CANDIDATES = 4096  # Số bộ món sinh + đánh giá trong 1 lần
+
+# Ghi file hóa đơn: 'template' = ghi thẳng XML các dòng món vào package xlsx dựng sẵn
+# (giống hệt file xlsxwriter tạo ra), 'xlsxwriter' = tạo Workbook cho từng file như cũ
+INVOICE_WRITER = 'template'
+
 # ============================================================================
 # CẤU HÌNH PHÍ DỊCH VỤ (CHỈ ÁP DỤNG HÔM NAY - NGÀY LỄ)
 # ============================================================================
@@ -96,27 +198,83 @@ SERVICE_FEE_UNIT = ""  # Để trống, không cần đơn vị
 # LOAD MENU VÀ TẠO MAPPING
 # ============================================================================
 
+# (key các list menu, các list menu, all_items) của lần load_menus() gần nhất
+_loaded_menus = None
+
 def load_menus():
-    """Load tất cả menu và tạo mapping"""
-    all_items = []
-    
+    """
+    Load tất cả menu và tạo mapping.
+    Returns (all_items, name_mapping, price_to_items); MenuIndex đầy đủ của all_items
+    được build luôn ở đây và lấy lại bằng get_menu_index(all_items) (không build lại).
+    """
+    global _loaded_menus
+    menu_lists = []
     for menu_file in MENU_FILES:
         menu_path = script_dir / menu_file
         if menu_path.exists():
-            items = parse_excel_menu(str(menu_path))
+            menu_lists.append((menu_file, load_cached_menu(menu_path)))
+    
+    # Không file menu nào đổi (cache trả về đúng các list cũ) → dùng lại all_items
+    # và MenuIndex đã build, không đọc Excel, không build lại mapping
+    menus_key = [(menu_file, id(items)) for menu_file, items in menu_lists]
+    if _loaded_menus is not None and _loaded_menus[0] == menus_key:
+        all_items = _loaded_menus[2]
+    else:
+        all_items = []
+        for menu_file, items in menu_lists:
             # Track source menu for each item
             menu_type = 'simple' if 'simple-place' in menu_file.lower() else 'taco'
             for item in items:
                 item['menu_source'] = menu_type
                 all_items.append(item)
+        # Giữ tham chiếu tới các list menu để id() không bị dùng lại
+        _loaded_menus = (menus_key, menu_lists, all_items)
+    
+    menu_index = get_menu_index(all_items)
+    return all_items, menu_index['name_mapping'], menu_index['price_to_items']
+
+def build_menu_index(all_items):
+    """
+    MenuIndex: mọi tra cứu menu dạng dict, build 1 lần cho 1 list món.
+        items:          list món gốc
+        name_mapping:   key chuẩn hóa (tên đầy đủ / phần tiếng Anh) -> tên đầy đủ
+        by_name:        tên đầy đủ -> món
+        by_key:         normalize_menu_key(tên đầy đủ) -> món
+        by_english:     normalize_menu_key(phần tiếng Anh) -> món
+        price_to_items: giá -> list món không phải bia/rượu/Coke (dùng để thay thế)
+        groups:         tên đầy đủ -> Tên nhóm (viết hoa)
+        tax_classes:    tên đầy đủ -> loại thuế (TAX_STANDARD / TAX_ALCOHOL / TAX_COKE)
+        tax_10_names:   tên các món thuế 10% (bia/rượu/Coke thường)
+        by_source:      'simple' / 'taco' -> list món theo menu gốc
+        token_index:    build_menu_token_index() cho fuzzy match
+        fingerprint:    menu_items_fingerprint() (seed / cache bộ món Grab)
+    Trùng tên/key: giữ món xuất hiện trước (Simple Place ưu tiên).
+    """
+    by_name = {}
+    by_key = {}
+    by_english = {}
+    groups = {}
+    tax_classes = {}
+    tax_10_names = set()
+    by_source = {'simple': [], 'taco': []}
+    
+    for item in all_items:
+        full_name = item['name']
+        by_name.setdefault(full_name, item)
+        groups.setdefault(full_name, str(item.get('group', '')).strip().upper())
+        full_name_key = normalize_menu_key(full_name)
+        if full_name_key:
+            by_key.setdefault(full_name_key, item)
+        if ' / ' in full_name:
+            eng_key = normalize_menu_key(full_name.split(' / ')[-1].strip())
+            if eng_key:
+                by_english.setdefault(eng_key, item)
+        by_source['taco' if item.get('menu_source') == 'taco' else 'simple'].append(item)
     
     # Tạo mapping: English name (lowercase) -> Full name (Vietnamese / English)
     name_mapping = {}
     price_to_items = {}
     
-    # Nhóm được xem là bia/rượu: chỉ các nhóm sau trong menu
-    alcohol_groups = {'BEER & CRAFT BEERS', 'SANGRIA', 'RED', 'WHITE'}
-    
     for item in all_items:
         full_name = item['name']
         price = item['price']
@@ -135,35 +293,104 @@ def load_menus():
         if full_name_key and full_name_key not in name_mapping:
             name_mapping[full_name_key] = full_name
         
-        # Tạo price mapping cho món không phải bia/rượu và không phải Coke
-        group_name = str(item.get('group', '')).strip().upper()
-        is_alcohol = group_name in alcohol_groups
+        # Loại thuế tính 1 lần khi load (nhóm menu + từ khóa, Coke thường nhưng KHÔNG Coke Light/Zero)
+        tax_class = classify_menu_item(item)
+        tax_classes.setdefault(full_name, tax_class)
         
-        # Kiểm tra tên món có chứa từ khóa bia/rượu không (bao gồm cả Coke thường, nhưng KHÔNG bao gồm Coke Light/Zero)
-        if not is_alcohol:
-            item_name_lower = full_name.lower()
-            alcohol_keywords = ['bia', 'beer', 'heineken', 'tiger', 'saigon', '333', 'rượu', 'wine', 'whisky', 'vodka']
-            is_alcohol = any(keyword in item_name_lower for keyword in alcohol_keywords)
-            
-            # Kiểm tra Coke thường (KHÔNG phải Light/Zero)
-            if not is_alcohol and ('coke' in item_name_lower or 'coca' in item_name_lower):
-                exclude_keywords = ['light', 'zero', 'ít đường', 'không đường', 'it duong', 'khong duong']
-                is_coke_light_or_zero = any(exclude_kw in item_name_lower for exclude_kw in exclude_keywords)
-                if not is_coke_light_or_zero:
-                    is_alcohol = True
-        
-        # Chỉ thêm món không phải bia/rượu vào price_to_items
-        if not is_alcohol:
+        # Chỉ thêm món không phải bia/rượu/Coke vào price_to_items
+        if tax_class == TAX_STANDARD:
             if price not in price_to_items:
                 price_to_items[price] = []
             price_to_items[price].append(item)
-    
-    return all_items, name_mapping, price_to_items
+        else:
+            tax_10_names.add(full_name)
+    
+    return {
+        'items': all_items,
+        'name_mapping': name_mapping,
+        'by_name': by_name,
+        'by_key': by_key,
+        'by_english': by_english,
+        'price_to_items': price_to_items,
+        'groups': groups,
+        'tax_classes': tax_classes,
+        'tax_10_names': tax_10_names,
+        'by_source': by_source,
+        'token_index': build_menu_token_index(all_items),
+        'fingerprint': menu_items_fingerprint(all_items),
+    }
+
+# Cache MenuIndex theo list món (giữ tham chiếu để so sánh bằng `is`): menu đầy đủ
+# + các list con (menu Simple / Taco cho Grab) — mỗi list chỉ build 1 lần
+MENU_INDEX_CACHE_SIZE = 8
+_menu_index_cache = {}
+
+def get_menu_index(menu_items):
+    """MenuIndex của menu_items; chỉ build lại khi gặp list mới / list đã đổi số món"""
+    cached = _menu_index_cache.get(id(menu_items))
+    if cached is not None and cached[0] is menu_items and cached[1] == len(menu_items):
+        return cached[2]
+    menu_index = build_menu_index(menu_items)
+    _menu_index_cache.pop(id(menu_items), None)
+    while len(_menu_index_cache) >= MENU_INDEX_CACHE_SIZE:
+        _menu_index_cache.pop(next(iter(_menu_index_cache)))
+    _menu_index_cache[id(menu_items)] = (menu_items, len(menu_items), menu_index)
+    return menu_index
 
 # ============================================================================
 # XỬ LÝ THAY THẾ RƯỢU/BIA
 # ============================================================================
 
+# Chỉ thay bằng món có giá lệch tối đa chừng này so với giá bia/rượu gốc
+MAX_REPLACEMENT_PRICE_DELTA = 20000
+
+def build_replacement_index(price_to_items):
+    """
+    Index giá cho việc thay thế bia/rượu (build 1 lần cho 1 price_to_items):
+        prices:   array giá tăng dần của các bucket có món thuế 8%
+        pools:    pools[i] = list món thuế 8% có giá prices[i]
+        fallback: tất cả món thuế 8% (khi không có giá nào đủ gần)
+    """
+    buckets = []
+    for price in sorted(price_to_items):
+        pool = [item for item in price_to_items[price] if classify_menu_item(item) == TAX_STANDARD]
+        if pool:
+            buckets.append((price, pool))
+    return {
+        'prices': array('d', (price for price, _ in buckets)),
+        'pools': [pool for _, pool in buckets],
+        'fallback': [item for items in price_to_items.values() for item in items
+                     if classify_menu_item(item) == TAX_STANDARD],
+    }
+
+# Cache 1 index cho price_to_items đang dùng (giữ tham chiếu để so sánh bằng `is`)
+_replacement_index_cache = (None, 0, None)
+
+def get_replacement_index(price_to_items):
+    """Index giá của price_to_items, chỉ build lại khi dict khác / đổi số bucket"""
+    global _replacement_index_cache
+    cached_dict, cached_len, cached_index = _replacement_index_cache
+    if cached_dict is not price_to_items or cached_len != len(price_to_items):
+        cached_index = build_replacement_index(price_to_items)
+        _replacement_index_cache = (price_to_items, len(price_to_items), cached_index)
+    return cached_index
+
+def nearest_replacement_pool(replacement_index, price, max_delta=MAX_REPLACEMENT_PRICE_DELTA):
+    """
+    Bucket món có giá gần price nhất (bisect, O(log n)); bằng khoảng cách thì ưu tiên
+    giá cao hơn. None nếu không có giá nào trong khoảng ±max_delta.
+    """
+    prices = replacement_index['prices']
+    upper = bisect_left(prices, price)
+    best = None
+    if upper < len(prices) and prices[upper] - price <= max_delta:
+        best = upper
+    lower = upper - 1
+    if lower >= 0 and price - prices[lower] <= max_delta:
+        if best is None or price - prices[lower] < prices[upper] - price:
+            best = lower
+    return replacement_index['pools'][best] if best is not None else None
+
 def find_replacement_for_alcohol(alcohol_name, alcohol_price, price_to_items):
     """
     Tìm món thay thế không cồn và điều chỉnh giá cho thuế.
@@ -179,40 +406,9 @@ def find_replacement_for_alcohol(alcohol_name, alcohol_price, price_to_items):
     - Để tổng bằng P * 1.10 (như bia với thuế 10%): F * 1.08 = P * 1.10
     - Vậy: F = P * 1.10 / 1.08
     
-    QUAN TRỌNG: Không bao giờ thay thế bia/rượu bằng bia/rượu khác.
+    QUAN TRỌNG: Không bao giờ thay thế bia/rượu bằng bia/rượu khác
+    (index chỉ chứa món thuế 8%, xem build_replacement_index).
     """
-    import random
-    
-    # Nhóm được xem là bia/rượu: chỉ các nhóm sau trong menu
-    alcohol_groups = {'BEER & CRAFT BEERS', 'SANGRIA', 'RED', 'WHITE'}
-    
-    # Từ khóa để nhận diện bia/rượu trong tên món (KHÔNG bao gồm Coke Light/Zero)
-    alcohol_keywords = ['bia', 'beer', 'heineken', 'tiger', 'saigon', '333', 'rượu', 'wine', 'whisky', 'vodka']
-    
-    def is_alcohol_item(item):
-        """Kiểm tra xem món có phải là bia/rượu không"""
-        # Kiểm tra nhóm
-        group_name = str(item.get('group', '')).strip().upper()
-        if group_name in alcohol_groups:
-            return True
-        
-        # Kiểm tra tên món
-        item_name_lower = str(item.get('name', '')).lower()
-        if any(keyword in item_name_lower for keyword in alcohol_keywords):
-            return True
-        
-        # Kiểm tra Coke thường (KHÔNG phải Light/Zero)
-        if 'coke' in item_name_lower or 'coca' in item_name_lower:
-            exclude_keywords = ['light', 'zero', 'ít đường', 'không đường', 'it duong', 'khong duong']
-            is_coke_light_or_zero = any(exclude_kw in item_name_lower for exclude_kw in exclude_keywords)
-            if not is_coke_light_or_zero:
-                return True
-        
-        return False
-    
-    # Tính số tiền thuế 10% (áp dụng cho bia/rượu và Coke 10% đường)
-    tax_10_percent = alcohol_price * 0.10
-    
     # Giá món thay thế = giá gốc (bia/rượu hoặc Coke) + thuế 10%, sau đó điều chỉnh để sau thuế 8% vẫn đủ
     # Công thức: adjusted_price = (alcohol_price + tax_10_percent) / 1.08 * 1.08 / 1.08
     # Đơn giản hóa: adjusted_price = alcohol_price * 1.10 / 1.08
@@ -220,29 +416,18 @@ def find_replacement_for_alcohol(alcohol_name, alcohol_price, price_to_items):
     # Làm tròn thành số nguyên (không có phần thập phân)
     adjusted_price = round(alcohol_price * 1.10 / 1.08)
     
-    # Tìm món có giá gần với giá gốc, đảm bảo không phải bia/rượu
-    for delta in [0, 5000, -5000, 10000, -10000, 15000, -15000, 20000, -20000]:
-        nearby_price = alcohol_price + delta
-        if nearby_price in price_to_items and len(price_to_items[nearby_price]) > 0:
-            # Lọc ra các món không phải bia/rượu
-            non_alcohol_items = [item for item in price_to_items[nearby_price] if not is_alcohol_item(item)]
-            
-            if len(non_alcohol_items) > 0:
-                best_replacement = random.choice(non_alcohol_items)
-                return best_replacement['name'], best_replacement['unit'], adjusted_price
-    
-    # Fallback: chọn random từ tất cả món, nhưng đảm bảo không phải bia/rượu
-    if price_to_items:
-        # Thu thập tất cả món không phải bia/rượu
-        all_non_alcohol_items = []
-        for price, items in price_to_items.items():
-            for item in items:
-                if not is_alcohol_item(item):
-                    all_non_alcohol_items.append(item)
-        
-        if len(all_non_alcohol_items) > 0:
-            replacement = random.choice(all_non_alcohol_items)
-            return replacement['name'], replacement['unit'], adjusted_price
+    replacement_index = get_replacement_index(price_to_items)
+    
+    # Tìm món có giá gần với giá gốc nhất (trong khoảng ±MAX_REPLACEMENT_PRICE_DELTA)
+    pool = nearest_replacement_pool(replacement_index, alcohol_price)
+    
+    # Fallback: chọn random từ tất cả món không phải bia/rượu
+    if pool is None and replacement_index['fallback']:
+        pool = replacement_index['fallback']
+    
+    if pool:
+        replacement = random.choice(pool)
+        return replacement['name'], replacement['unit'], adjusted_price
     
     return alcohol_name, 'Lon', alcohol_price
 
@@ -291,12 +476,58 @@ def fix_item_name_format(item_name):
     # Nếu chỉ có tiếng Việt, thêm lại chính nó
     return f"{item_name} / {item_name}"
 
+# ============================================================================
+# INDEX TOKEN CHO FUZZY MATCH
+# ============================================================================
+
+def build_menu_token_index(all_menu_items):
+    """
+    Chuẩn hóa phần tiếng Anh của mỗi món 1 lần (thay vì mỗi lần match):
+        entries: list of (full_name, eng_clean, eng_words) theo thứ tự menu
+        tokens:  token -> list id món (vị trí trong entries) có chứa token đó
+    """
+    entries = []
+    tokens = {}
+    for item_idx, item in enumerate(all_menu_items):
+        full_name = item['name']
+        if ' / ' in full_name:
+            english_part = full_name.split(' / ')[-1].strip().lower()
+        else:
+            english_part = full_name.lower()
+        eng_clean = re.sub(r'[^\w\s]', '', english_part)
+        eng_words = set(eng_clean.split())
+        entries.append((full_name, eng_clean, eng_words))
+        for word in eng_words:
+            tokens.setdefault(word, []).append(item_idx)
+    return {'entries': entries, 'tokens': tokens}
+
+def _fuzzy_candidate_ids(candidates_to_try, token_index):
+    """
+    Id các món (tăng dần = thứ tự menu) có thể đạt ngưỡng với ít nhất 1 biến thể tên:
+    - có chung ít nhất 1 token, hoặc
+    - tên 1 từ: chuỗi con của nhau (+0.3, đủ ngưỡng 0.3 dù không chung token).
+      Tên nhiều từ không chung token chỉ được tối đa 0.3 < 0.5 nên không cần xét.
+    """
+    tokens = token_index['tokens']
+    item_ids = set()
+    for raw_clean, raw_words in candidates_to_try:
+        for word in raw_words:
+            item_ids.update(tokens.get(word, ()))
+        if len(raw_words) == 1:
+            for item_idx, (_, eng_clean, eng_words) in enumerate(token_index['entries']):
+                if eng_words and (raw_clean in eng_clean or eng_clean in raw_clean):
+                    item_ids.add(item_idx)
+    return sorted(item_ids)
+
 # ============================================================================
 # MATCH TÊN MÓN VỚI MENU
 # ============================================================================
 
-def match_menu_name(raw_name, all_menu_items, name_mapping):
-    """Match tên món từ file với tên trong menu"""
+def match_menu_name(raw_name, all_menu_items, name_mapping, token_index=None):
+    """
+    Match tên món từ file với tên trong menu.
+    token_index: kết quả build_menu_token_index(all_menu_items); None = lấy từ MenuIndex.
+    """
     raw_lower = raw_name.lower().strip()
     
     # Loại bỏ variations
@@ -318,25 +549,22 @@ def match_menu_name(raw_name, all_menu_items, name_mapping):
     # Handle singular/plural variations
     raw_normalized_singular = raw_normalized.rstrip('s')
     raw_normalized_plural = raw_normalized + 's' if not raw_normalized.endswith('s') else raw_normalized
-    candidates_to_try = [raw_normalized, raw_normalized_singular, raw_normalized_plural]
-    
-    for item in all_menu_items:
-        full_name = item['name']
-        
-        if ' / ' in full_name:
-            english_part = full_name.split(' / ')[-1].strip().lower()
-        else:
-            english_part = full_name.lower()
+    candidates_to_try = []
+    for raw_candidate in [raw_normalized, raw_normalized_singular, raw_normalized_plural]:
+        raw_clean = re.sub(r'[^\w\s]', '', raw_candidate)
+        raw_words = set(raw_clean.split())
+        candidates_to_try.append((raw_clean, raw_words))
+    
+    # Chỉ chấm điểm các món có thể đạt ngưỡng, theo đúng thứ tự menu
+    token_index = token_index or get_menu_index(all_menu_items)['token_index']
+    entries = token_index['entries']
+    
+    for item_idx in _fuzzy_candidate_ids(candidates_to_try, token_index):
+        full_name, eng_clean, eng_words = entries[item_idx]
         
         # Try each candidate variation
-        for raw_candidate in candidates_to_try:
-            raw_clean = re.sub(r'[^\w\s]', '', raw_candidate)
-            eng_clean = re.sub(r'[^\w\s]', '', english_part)
-            
-            raw_words = set(raw_clean.split())
-            eng_words = set(eng_clean.split())
-            
-            if raw_words and eng_words:
+        for raw_clean, raw_words in candidates_to_try:
+            if raw_words:
                 common_words = raw_words & eng_words
                 
                 if len(raw_words) == 1:
@@ -362,434 +590,726 @@ def match_menu_name(raw_name, all_menu_items, name_mapping):
 # KẾT HỢP FILES
 # ============================================================================
 
-def combine_files(file1_path, file2_path):
-    """Kết hợp 2 file HTML thành 1, xử lý trực tiếp trong memory"""
-    
-    with open(file1_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content1 = f.read()
-    
-    with open(file2_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content2 = f.read()
-    
-    # Extract rows from both files
-    parts1 = content1.split('<tr>')
-    header = parts1[0] if parts1 else ''
-    rows1 = ['<tr>' + part for part in parts1[1:] if part.strip()]
+def resolve_payment_sources(base_dir, sources=None):
+    """
+    Ghép tên file trong sources (mặc định DEFAULT_SOURCES) với base_dir.
+    Returns list of (Path, payment_method) cho các file tồn tại, giữ nguyên thứ tự.
+    """
+    resolved = []
+    for file_name, payment_method in (sources or DEFAULT_SOURCES):
+        path = Path(base_dir) / file_name
+        if path.exists():
+            resolved.append((path, payment_method))
+    return resolved
+
+def parse_jobs_arg(args, option='--jobs', short_option='-j'):
+    """
+    Tách '--jobs N' / '--jobs=N' / '-j N' khỏi danh sách tham số dòng lệnh
+    (option / short_option khác cho '--write-jobs N'...).
+    Returns (các tham số còn lại, jobs) — jobs mặc định 1, 0 = số CPU của máy.
+    """
+    remaining = []
+    jobs = 1
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = None
+        if arg in (option, short_option) and i + 1 < len(args):
+            value = args[i + 1]
+            i += 1
+        elif arg.startswith(option + '='):
+            value = arg.split('=', 1)[1]
+        else:
+            remaining.append(arg)
+        if value is not None:
+            try:
+                jobs = int(value)
+            except ValueError:
+                print(f"⚠️  {option} không hợp lệ: {value} (dùng 1)")
+                jobs = 1
+        i += 1
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return remaining, jobs
+
+def parse_source_arg(arg):
+    """'file.xls=atm' -> ('file.xls', 'atm'); 'file.xls' -> ('file.xls', None)"""
+    file_name, sep, payment_method = arg.rpartition('=')
+    if not sep or not file_name:
+        return arg, None
+    return file_name, payment_method.strip().lower() or None
+
+# ============================================================================
+# PARSE FILE XLS
+# ============================================================================
+
+def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, payment_method=None):
+    """
+    Parse HTML content và group theo hóa đơn
+    Returns list of invoices
+    """
+    alcohol_items_found = []
+    invoices = list(iter_invoices_from_html(content, all_menu_items, name_mapping, price_to_items,
+                                            payment_method, alcohol_items_found))
+    return invoices, alcohol_items_found
+
+def parse_invoices_from_file(file_path, all_menu_items, name_mapping, price_to_items, payment_method=None):
+    """
+    Giống parse_invoices_from_html nhưng đọc file theo kiểu streaming
+    (từng chunk, từng row) thay vì load cả file vào 1 chuỗi.
+    """
+    alcohol_items_found = []
+    invoices = list(iter_invoices(file_path, all_menu_items, name_mapping, price_to_items,
+                                  payment_method, alcohol_items_found))
+    return invoices, alcohol_items_found
+
+def iter_invoices(file_path, all_menu_items, name_mapping, price_to_items, payment_method=None,
+                  alcohol_items_found=None, print_summary=True, jobs=1, unchanged=None, skipped_ids=None):
+    """
+    Generator: đọc file streaming và yield từng hóa đơn ngay khi gặp row cuối của nó
+    (đã áp dụng giảm giá, bỏ qua hóa đơn không có món).
+    
+    payment_method: phương thức thanh toán của cả file (vd. 'transfer', 'atm'), dùng khi
+    row hóa đơn không ghi rõ ATM / TRANSFER.
+    alcohol_items_found: list (tùy chọn) để nhận các món bia/rượu đã thay thế; được cập nhật
+    trước khi hóa đơn tương ứng được yield nên có thể dùng ngay trong vòng lặp ghi file.
+    jobs > 1: chia file thành các shard theo ranh giới hóa đơn và parse song song
+    (xem _iter_invoices_parallel); thứ tự hóa đơn giữ nguyên như file gốc.
+    unchanged / skipped_ids: bỏ qua hóa đơn không đổi theo ledger (xem _iter_invoice_rows).
+    """
+    if jobs > 1:
+        return _iter_invoices_parallel(file_path, all_menu_items, name_mapping, price_to_items,
+                                       payment_method, alcohol_items_found, print_summary, jobs,
+                                       unchanged, skipped_ids)
+    
+    rows = iter_export_rows(file_path)
+    return _iter_invoice_rows(rows, all_menu_items, name_mapping, price_to_items,
+                              alcohol_items_found, payment_method, print_summary,
+                              unchanged, skipped_ids)
+
+def iter_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, payment_method=None,
+                            alcohol_items_found=None):
+    """Giống iter_invoices nhưng với nội dung HTML đã có sẵn trong memory"""
+    rows = content.split(ROW_MARKER)
+    return _iter_invoice_rows(rows, all_menu_items, name_mapping, price_to_items,
+                              alcohol_items_found, payment_method)
+
+def iter_invoices_from_sources(sources, all_menu_items, name_mapping, price_to_items,
+                               alcohol_items_found=None, jobs=1, unchanged=None, skipped_ids=None):
+    """
+    Đọc lần lượt nhiều file export, mỗi file gắn 1 phương thức thanh toán.
+    sources: list of (file_path, payment_method) — vd. resolve_payment_sources(DATA_DIR)
     
-    parts2 = content2.split('<tr>')
-    rows2 = ['<tr>' + part for part in parts2[1:] if part.strip()]
+    Mỗi file được parse streaming và chỉ mở khi file trước đã đọc xong, không gộp
+    nội dung thành 1 chuỗi. Số thứ tự hóa đơn ('number') được đánh liên tục qua các file.
+    """
+    if alcohol_items_found is None:
+        alcohol_items_found = []
+    
+    number = 0
+    for file_path, payment_method in sources:
+        for invoice in iter_invoices(str(file_path), all_menu_items, name_mapping, price_to_items,
+                                     payment_method, alcohol_items_found, print_summary=False, jobs=jobs,
+                                     unchanged=unchanged, skipped_ids=skipped_ids):
+            number += 1
+            invoice['number'] = number
+            yield invoice
+    
+    _print_alcohol_summary(alcohol_items_found)
+
+def iter_invoices_cached(sources, alcohol_items_found=None, jobs=1, use_cache=True,
+                         unchanged=None, skipped_ids=None):
+    """
+    Như iter_invoices_from_sources nhưng có cache trên đĩa (automation/parse_cache.py):
+    cùng nội dung file input + cùng menu → trả lại kết quả parse lần trước, không load menu
+    và không parse lại. Cache miss → load menu, parse streaming và lưu cache khi đọc hết.
     
-    # Extract footer
-    footer_pos = max(
-        content1.rfind('</table>'),
-        content1.rfind('</tbody>'),
-        content1.rfind('</html>')
-    )
-    footer = ''
-    if footer_pos >= 0:
-        tag_end = content1.find('>', footer_pos)
-        footer = content1[tag_end + 1:] if tag_end >= 0 else content1[footer_pos:]
+    unchanged / skipped_ids: lọc hóa đơn không đổi theo ledger. Cache chỉ lưu kết quả
+    parse đầy đủ (lần chạy không bỏ qua hóa đơn nào).
+    """
+    if alcohol_items_found is None:
+        alcohol_items_found = []
+    if skipped_ids is None:
+        skipped_ids = []
+    
+    key = None
+    if use_cache:
+        key = parse_cache_key(sources, menu_fingerprint(script_dir / menu_file for menu_file in MENU_FILES))
+        cached = load_parse_cache(key)
+        if cached is not None:
+            invoices, cached_alcohol_items = cached
+            print(f"   ⚡ Dùng kết quả parse đã cache ({len(invoices)} hóa đơn), bỏ qua load menu / parse")
+            if unchanged:
+                kept = []
+                for invoice in invoices:
+                    if unchanged.get(invoice['invoice_id']) == invoice.get('content_hash'):
+                        skipped_ids.append(invoice['invoice_id'])
+                    else:
+                        kept.append(invoice)
+                invoices = kept
+                kept_ids = {invoice['invoice_id'] for invoice in invoices}
+                cached_alcohol_items = [item for item in cached_alcohol_items if item['invoice_id'] in kept_ids]
+            alcohol_items_found.extend(cached_alcohol_items)
+            yield from invoices
+            _print_alcohol_summary(alcohol_items_found)
+            return
     
-    # Combine
-    combined_content = header + '\n'.join(rows1 + rows2) + footer
+    print(f"\n📚 Đang load menu...")
+    all_menu_items, name_mapping, price_to_items = load_menus()
+    print(f"   ✓ Tổng số món: {len(all_menu_items)}")
     
-    return combined_content, len(rows1)
+    # Chụp JSON từng hóa đơn trước khi yield (bước ghi file sẽ sửa invoice: phí dịch vụ...)
+    encoded_invoices = []
+    skipped_before = len(skipped_ids)
+    for invoice in iter_invoices_from_sources(sources, all_menu_items, name_mapping, price_to_items,
+                                              alcohol_items_found, jobs=jobs,
+                                              unchanged=unchanged, skipped_ids=skipped_ids):
+        if key is not None:
+            encoded_invoices.append(encode_invoice(invoice))
+        yield invoice
+    
+    if key is not None and len(skipped_ids) == skipped_before:
+        try:
+            store_parse_cache(key, encoded_invoices, alcohol_items_found)
+        except OSError as e:
+            print(f"⚠️  Không ghi được cache parse: {e}")
 
 # ============================================================================
-# PARSE FILE XLS
+# PARSE SONG SONG (--jobs N)
 # ============================================================================
+# Các hóa đơn độc lập với nhau nên file được chia thành shard tại ranh giới hóa đơn
+# (scan_invoice_spans trên mmap). Mỗi shard = header của file + các hóa đơn liên tiếp,
+# parse trong ProcessPoolExecutor; menu được gửi 1 lần cho mỗi worker (initializer).
 
-def parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined=False):
+_worker_menus = None      # (all_menu_items, name_mapping, price_to_items) trong process worker
+_worker_unchanged = None  # {invoice_id: content_hash} từ ledger (None = không bỏ qua)
+
+def _init_parse_worker(all_menu_items, name_mapping, price_to_items, unchanged=None):
+    global _worker_menus, _worker_unchanged
+    _worker_menus = (all_menu_items, name_mapping, price_to_items)
+    _worker_unchanged = unchanged
+
+def _parse_invoice_shard(task):
     """
-    Parse HTML content và group theo hóa đơn
-    Returns list of invoices
+    Worker: parse 1 shard. task = (file_path, header_length, offset, length, payment_method)
+    Returns (invoices, alcohol_items_found, skipped_ids, log) — log là output print của worker
+    để in lại theo thứ tự.
     """
+    file_path, header_length, offset, length, payment_method = task
+    content = read_export_span(file_path, 0, header_length) + read_export_span(file_path, offset, length)
+    
+    alcohol_items_found = []
+    skipped_ids = []
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        invoices = list(_iter_invoice_rows(content.split(ROW_MARKER), *_worker_menus,
+                                           alcohol_items_found, payment_method, print_summary=False,
+                                           unchanged=_worker_unchanged, skipped_ids=skipped_ids))
+    return invoices, alcohol_items_found, skipped_ids, log.getvalue()
+
+def _shard_invoice_spans(spans, n_shards):
+    """Gom các span liên tiếp thành tối đa n_shards shard (offset, length) có số byte gần bằng nhau"""
+    total = sum(length for _, _, length in spans)
+    target = max(1, total // max(1, n_shards))
+    shards = []
+    shard_start = None
+    shard_size = 0
+    for _, offset, length in spans:
+        if shard_start is None:
+            shard_start = offset
+        shard_size += length
+        if shard_size >= target:
+            shards.append((shard_start, shard_size))
+            shard_start = None
+            shard_size = 0
+    if shard_start is not None:
+        shards.append((shard_start, shard_size))
+    return shards
+
+def _iter_invoices_parallel(file_path, all_menu_items, name_mapping, price_to_items, payment_method=None,
+                            alcohol_items_found=None, print_summary=True, jobs=2,
+                            unchanged=None, skipped_ids=None):
+    """
+    Như iter_invoices nhưng parse các shard song song bằng jobs process.
+    Kết quả (hóa đơn, món bia/rượu, log) được ghép lại đúng thứ tự shard trong file.
+    """
+    if alcohol_items_found is None:
+        alcohol_items_found = []
     
-    # Count total invoices if combined
-    total_invoice_count = 0
-    if is_combined:
-        rows_temp = content.split('<tr>')
-        for temp_row in rows_temp:
-            if re.search(r'rowspan="\d+">(\d{6})</td>', temp_row):
-                total_invoice_count += 1
+    with open_export_map(file_path) as data:
+        spans = scan_invoice_spans(data)
     
-    invoices = []
-    current_invoice = None
-    invoice_counter = 0
-    alcohol_items_found = []  # Track alcohol items for reporting
+    if spans:
+        header_length = spans[0][1]
+        tasks = [(str(file_path), header_length, offset, length, payment_method)
+                 for offset, length in _shard_invoice_spans(spans, jobs * SHARDS_PER_JOB)]
+        
+        number = 0
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_parse_worker,
+                                 initargs=(all_menu_items, name_mapping, price_to_items, unchanged)) as executor:
+            for invoices, shard_alcohol_items, shard_skipped_ids, log in executor.map(_parse_invoice_shard, tasks):
+                if log:
+                    sys.stdout.write(log)
+                alcohol_items_found.extend(shard_alcohol_items)
+                if skipped_ids is not None:
+                    skipped_ids.extend(shard_skipped_ids)
+                for invoice in invoices:
+                    number += 1
+                    invoice['number'] = number
+                    yield invoice
+    
+    if print_summary:
+        _print_alcohol_summary(alcohol_items_found)
+
+def _clean_number(cell, strip_minus=False):
+    """'1,234.000' -> '1234000' (để kiểm tra isdigit)"""
+    cell_clean = cell.replace(' ', '').replace(',', '').replace('.', '')
+    if strip_minus:
+        cell_clean = cell_clean.replace('-', '')
+    return cell_clean
+
+def _invoice_amounts_heuristic(cells):
+    """
+    Heuristic cũ: tổng tiền = số >= 50.000 đầu tiên ở cell 15-25,
+    giảm giá = cell ngay sau, chiết khấu thanh toán = cell thứ 5 sau đó,
+    tổng cuối = cell cuối cùng.
+    Returns (discount, payment_discount, final_total)
+    """
+    discount = 0
+    payment_discount = 0
+    total_amount_pos = -1
+    
+    for i, cell in enumerate(cells):
+        if 15 <= i <= 25:
+            cell_clean = _clean_number(cell)
+            if cell_clean.isdigit() and len(cell_clean) >= 4:
+                value = float(cell_clean)
+                if value >= 50000 and total_amount_pos == -1:
+                    total_amount_pos = i
+                    break
+    
+    if total_amount_pos >= 0:
+        if total_amount_pos + 1 < len(cells):
+            cell_clean = _clean_number(cells[total_amount_pos + 1])
+            if cell_clean.isdigit():
+                discount = float(cell_clean)
+        
+        if total_amount_pos + 5 < len(cells):
+            cell_clean = _clean_number(cells[total_amount_pos + 5], strip_minus=True)
+            if cell_clean.isdigit():
+                payment_discount = float(cell_clean)
+    
+    final_total = 0
+    if len(cells) > 0:
+        last_cell_clean = _clean_number(cells[-1])
+        if last_cell_clean.isdigit() and len(last_cell_clean) >= 4:
+            final_total = float(last_cell_clean)
+    
+    return discount, payment_discount, final_total
+
+def _invoice_amounts_from_schema(cells, schema):
+    """
+    Đọc giảm giá / chiết khấu thanh toán / tổng cuối trực tiếp theo vị trí cột trong header.
+    Cột nào không có trong header thì dùng kết quả heuristic cho field đó.
+    Returns (discount, payment_discount, final_total)
+    """
+    fallback = None
+    values = []
+    for column, strip_minus, min_len in (('discount', False, 1),
+                                         ('payment_discount', True, 1),
+                                         ('final_total', False, 4)):
+        idx = schema['columns'].get(column)
+        if idx is None:
+            if fallback is None:
+                fallback = _invoice_amounts_heuristic(cells)
+            values.append(fallback[len(values)])
+            continue
+        cell_clean = _clean_number(cells[idx], strip_minus=strip_minus)
+        values.append(float(cell_clean) if cell_clean.isdigit() and len(cell_clean) >= min_len else 0)
+    return tuple(values)
+
+def _invoice_date_from_schema(cells, schema):
+    """Ngày hóa đơn từ cột 'Ngày' (DD/MM/YYYY, có thể kèm giờ phía sau), None nếu không có"""
+    idx = schema['columns'].get('date')
+    if idx is None:
+        return None
+    date_match = DATE_VALUE_RE.match(cells[idx])
+    return date_match.group(0) if date_match else None
+
+def _detect_payment_method(cells, row):
+    """Tìm phương thức thanh toán (atm / transfer) trong các cell, sau đó trong cả row"""
+    for cell in cells:
+        cell_upper = cell.upper()
+        if 'ATM (' in cell_upper or cell_upper.startswith('ATM'):
+            return 'atm'
+        elif 'TRANSFER (' in cell_upper or cell_upper.startswith('TRANSFER'):
+            return 'transfer'
+    
+    row_upper = row.upper()
+    if 'ATM (' in row_upper:
+        return 'atm'
+    elif 'TRANSFER (' in row_upper:
+        return 'transfer'
+    return None
+
+def _is_valid_item(name, qty, price_value):
+    """Điều kiện chung cho 1 món (tên hợp lệ, giá 500đ - 2.000.000đ, số lượng 1 - 200)"""
+    # Bỏ qua các tên không hợp lệ (STT, Mã hoá đơn, crispy, payment, ghi chú, ...)
+    # LƯU Ý: Cho phép tên là số (như "333" là tên bia) nếu có giá và số lượng hợp lệ
+    if len(name) <= 2 or is_skipped_name(name):
+        return False
+    
+    # Mở rộng điều kiện để không bỏ sót món
+    # Cho phép giá từ 500 VND (có thể có món rẻ) đến 2,000,000 VND (có thể có món đắt)
+    # Cho phép số lượng từ 1 đến 200 (có thể có món order nhiều)
+    return (MIN_ITEM_PRICE <= price_value <= MAX_ITEM_PRICE and 
+            1 <= qty <= MAX_ITEM_QTY)
+
+def _row_items_from_schema(cells, item_columns):
+    """
+    Đọc 1 món trong row theo vị trí cột (tên, số lượng, đơn vị, đơn giá).
+    Returns list of (name, qty, unit, price_value) — rỗng nếu row không có món hợp lệ
+    """
+    name_idx, qty_idx, unit_idx, price_idx = item_columns
+    name = cells[name_idx]
+    qty_candidate = cells[qty_idx]
+    unit_candidate = cells[unit_idx] if unit_idx is not None else ''
+    price_clean = _clean_number(cells[price_idx])
+    try:
+        if not (qty_candidate.isdigit() and price_clean.isdigit()):
+            return []
+        qty = int(qty_candidate)
+        price_value = float(price_clean)
+    except ValueError:
+        return []
+    unit = unit_candidate if unit_candidate and not unit_candidate.isdigit() else 'Phần'
+    if not _is_valid_item(name, qty, price_value):
+        return []
+    return [(name, qty, unit, price_value)]
+
+def _append_invoice_item(current_invoice, name, qty, unit, price_value,
+                         all_menu_items, name_mapping, price_to_items, alcohol_items_found):
+    """Match món với menu, thay thế bia/rượu/Coke (nếu có) và thêm vào hóa đơn"""
+    raw_unit = unit.strip() if unit else ''
+    raw_unit_lower = raw_unit.lower()
+    if not raw_unit or raw_unit.isdigit():
+        clean_unit = 'Phần'
+    elif raw_unit_lower in {'món', 'mon', 'dish'}:
+        clean_unit = 'Phần'
+    else:
+        clean_unit = raw_unit
+    
+    # Lưu tên gốc để check từ khóa bia/rượu trước khi match menu
+    original_name = name.strip()
+    
+    # Match với menu
+    matched_name = match_menu_name(original_name, all_menu_items, name_mapping)
+    
+    # Tự động sửa format nếu không đúng
+    full_name = fix_item_name_format(matched_name)
+    
+    # Đảm bảo format cuối cùng luôn có " / "
+    if ' / ' not in full_name:
+        full_name = f"{full_name} / {full_name}"
+    
+    # KHÔNG kiểm tra duplicate trong invoice nữa
+    # Cho phép có nhiều món giống nhau (cùng tên, giá, số lượng) trong cùng hóa đơn
+    # Vì có thể là các món riêng biệt được order ở các thời điểm khác nhau
+    
+    # Xác định bia/rượu và Coke (thuế 10%) dựa trên Tên nhóm của menu
+    # Chỉ các nhóm: BEER & CRAFT BEERS, SANGRIA, RED, WHITE mới bị coi là bia/rượu (tính thuế 10%)
+    # Ngoài ra, Coke (Coca-Cola) THƯỜNG có 10% đường nên cũng tính thuế 10% (giống bia/rượu)
+    # LƯU Ý: Coke Light và Coke Zero có lượng đường < 10g nên tính thuế 8%, KHÔNG phải 10%
+    menu_index = get_menu_index(all_menu_items)
+    group_name = menu_index['groups'].get(full_name, '')
+    
+    # QUAN TRỌNG: Check từ khóa trong CẢ tên gốc (original_name) VÀ tên đã match (full_name)
+    # Để phát hiện các món như "333", "Saigon" ngay cả khi không match được với menu.
+    # Coke Light / Zero ở 1 trong 2 tên → không tính là Coke 10% đường
+    tax_class = classify_tax_names(original_name, full_name, group=group_name)
+    is_alcohol = tax_class != TAX_STANDARD
+    if tax_class == TAX_COKE:
+        # Log để rõ ràng
+        print(f"⚠️  PHÁT HIỆN COKE (10% đường) - Mã HĐ: {current_invoice.get('invoice_id', 'N/A')} | Món: {full_name} | Tính thuế 10% (giống bia/rượu)")
+    
+    if is_alcohol:
+        # Log alcohol/beverage detection (bao gồm bia/rượu và Coke 10% đường)
+        original_amount = price_value * qty
+        invoice_id = current_invoice.get('invoice_id', 'N/A')
+        
+        # Xác định loại: bia/rượu hay Coke
+        is_coke = bool(tax_name_flags(full_name) & FLAG_COKE) and group_name not in ALCOHOL_GROUPS
+        item_type = "COKE (10% đường)" if is_coke else "BIA/RƯỢU"
+        
+        alcohol_items_found.append({
+            'invoice_id': invoice_id,
+            'alcohol_name': full_name,
+            'quantity': qty,
+            'unit': clean_unit,
+            'price': price_value,
+            'total_amount': original_amount
+        })
+        
+        # Tính thuế 10% (áp dụng cho cả bia/rượu và Coke 10% đường)
+        tax_10_percent = price_value * 0.10
+        total_with_10_tax = price_value * 1.10
+        
+        print(f"⚠️  PHÁT HIỆN {item_type} - Mã HĐ: {invoice_id} | Món: {full_name} | SL: {qty} | Giá: {price_value:,.0f}đ | Tổng: {original_amount:,.0f}đ")
+        print(f"   Thuế 10%: {tax_10_percent:,.0f}đ | Tổng với thuế 10%: {total_with_10_tax:,.0f}đ")
+        
+        # Replace with food item: thêm số tiền bằng thuế 10% để tổng đủ sau thuế 8%
+        # Áp dụng cho cả bia/rượu và Coke 10% đường
+        # Ghi lại món gốc trên món thay thế → sổ thay thế (replacement_ledger) lúc ghi file
+        replaced = {
+            'original_name': full_name,
+            'original_unit': clean_unit,
+            'quantity': qty,
+            'original_price': price_value,
+        }
+        full_name, clean_unit, adjusted_price = find_replacement_for_alcohol(
+            full_name, price_value, price_to_items)
+        replaced['tax_delta'] = (adjusted_price - price_value) * qty
+        price_value = adjusted_price
+        
+        # Tính lại để kiểm tra
+        replacement_total_with_8_tax = adjusted_price * 1.08
+        print(f"   → Đã thay bằng: {full_name} | Giá mới: {price_value:,.0f}đ (đã thêm {tax_10_percent:,.0f}đ = thuế 10% của {item_type.lower()})")
+        print(f"   → Tổng sau thuế 8%: {replacement_total_with_8_tax:,.0f}đ (bằng tổng {item_type.lower()} với thuế 10%: {total_with_10_tax:,.0f}đ)")
+    
+    item = {
+        'name': full_name,
+        'quantity': qty,
+        'unit': clean_unit,
+        'price': price_value
+    }
+    if is_alcohol:
+        item['replaced'] = replaced
+    current_invoice['items'].append(item)
+
+def _apply_invoice_discount(invoice):
+    """
+    Áp dụng giảm giá + chiết khấu thanh toán của 1 hóa đơn vào giá món (sửa trực tiếp invoice['items']).
+    """
+    if len(invoice['items']) == 0:
+        return
+        
+    total_discount = invoice['discount'] + invoice['payment_discount']
     
-    rows = content.split('<tr>')
+    # Bỏ qua giảm giá quá nhỏ (có thể là parse sai)
+    if total_discount > 0 and total_discount < 1000:
+        # Giảm giá < 1000đ có thể là parse sai, bỏ qua
+        return
     
-    for row in rows:
-        invoice_match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
+    if total_discount > 0 and len(invoice['items']) > 0:
+        # Tính tổng giá trị tất cả các món
+        total_items_value = sum(item['quantity'] * item['price'] for item in invoice['items'])
         
-        if invoice_match:
-            invoice_num = invoice_match.group(1)
-            invoice_counter += 1
+        if total_items_value > 0:
+            # VALIDATION: Chỉ áp dụng giảm giá nếu hợp lý
+            # - Giảm giá không được vượt quá 50% tổng giá trị (tránh parse sai)
+            # - Giảm giá phải nhỏ hơn tổng giá trị
+            max_reasonable_discount = total_items_value * 0.5  # Tối đa 50%
             
-            date_match = re.search(r'>(\d{2}/\d{2}/\d{4})</td>', row)
-            invoice_date = date_match.group(1) if date_match else datetime.now().strftime('%d/%m/%Y')
+            if total_discount > max_reasonable_discount:
+                # Nếu giảm giá quá lớn, có thể là parse sai - bỏ qua
+                print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} có giảm giá bất thường ({total_discount:,.0f}đ > 50% tổng {total_items_value:,.0f}đ). Bỏ qua phân bổ giảm giá.")
+                return
             
-            cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-            cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
+            if total_discount >= total_items_value:
+                # Giảm giá >= tổng giá trị là không hợp lý
+                print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} có giảm giá >= tổng giá trị. Bỏ qua phân bổ giảm giá.")
+                return
             
-            discount = 0
-            payment_discount = 0
-            total_amount_pos = -1
+            # CHỈ ÁP DỤNG GIẢM GIÁ CHO 1 MÓN (món có giá trị cao nhất)
+            # Tìm món có giá trị cao nhất để áp dụng giảm giá
+            target_item = max(invoice['items'], 
+                            key=lambda x: x['quantity'] * x['price'])
             
-            for i, cell in enumerate(cells):
-                if 15 <= i <= 25:
-                    cell_clean = cell.replace(' ', '').replace(',', '').replace('.', '')
-                    if cell_clean.isdigit() and len(cell_clean) >= 4:
-                        value = float(cell_clean)
-                        if value >= 50000 and total_amount_pos == -1:
-                            total_amount_pos = i
-                            break
+            target_item_total = target_item['quantity'] * target_item['price']
             
-            if total_amount_pos >= 0:
-                if total_amount_pos + 1 < len(cells):
-                    cell_clean = cells[total_amount_pos + 1].replace(' ', '').replace(',', '').replace('.', '')
-                    if cell_clean.isdigit():
-                        discount = float(cell_clean)
-                
-                if total_amount_pos + 5 < len(cells):
-                    cell_clean = cells[total_amount_pos + 5].replace(' ', '').replace(',', '').replace('.', '').replace('-', '')
-                    if cell_clean.isdigit():
-                        payment_discount = float(cell_clean)
+            # Đảm bảo giảm giá không vượt quá 90% giá trị món (để giá > 0)
+            max_discount_for_item = min(total_discount, target_item_total * 0.9)
             
-            final_total = 0
-            if len(cells) > 0:
-                last_cell_clean = cells[-1].replace(' ', '').replace(',', '').replace('.', '')
-                if last_cell_clean.isdigit() and len(last_cell_clean) >= 4:
-                    final_total = float(last_cell_clean)
+            # Tính giá mới cho món được chọn
+            new_item_total = target_item_total - max_discount_for_item
+            new_price = max(new_item_total / target_item['quantity'], 1.0)  # Giá tối thiểu là 1 đồng
             
-            # Detect payment method
-            payment_method = None
-            for cell in cells:
-                cell_upper = cell.upper()
-                if 'ATM (' in cell_upper or cell_upper.startswith('ATM'):
-                    payment_method = 'atm'
-                    break
-                elif 'TRANSFER (' in cell_upper or cell_upper.startswith('TRANSFER'):
-                    payment_method = 'transfer'
-                    break
+            # Áp dụng giá mới
+            old_price = target_item['price']
+            target_item['price'] = new_price
             
-            if payment_method is None:
-                row_upper = row.upper()
-                if 'ATM (' in row_upper:
-                    payment_method = 'atm'
-                elif 'TRANSFER (' in row_upper:
-                    payment_method = 'transfer'
+            # Log thông tin
+            print(f"   💰 HĐ {invoice['invoice_id']}: Áp dụng giảm giá {max_discount_for_item:,.0f}đ cho món '{target_item['name']}' (giá: {old_price:,.0f}đ → {new_price:,.0f}đ)")
             
-            # Default for combined files: first half = transfer, second half = atm
-            if payment_method is None and is_combined and total_invoice_count > 0:
-                boundary = total_invoice_count // 2
-                payment_method = 'transfer' if invoice_counter <= boundary else 'atm'
+            # Nếu giảm giá còn thừa (do giới hạn 90%), cảnh báo
+            remaining_discount = total_discount - max_discount_for_item
+            if remaining_discount > 1:
+                print(f"   ⚠️  Cảnh báo: Còn {remaining_discount:,.0f}đ giảm giá chưa được áp dụng (do giới hạn 90% giá trị món)")
             
-            current_invoice = {
-                'number': len(invoices) + 1,
-                'invoice_id': invoice_num,
-                'date': invoice_date,
-                'items': [],
-                'discount': discount,
-                'payment_discount': payment_discount,
-                'final_total': final_total,
-                'payment_method': payment_method
-            }
-            invoices.append(current_invoice)
-        
-        # Extract items
-        if current_invoice is not None:
-            if current_invoice.get('payment_method') is None:
-                row_upper = row.upper()
-                if 'ATM (' in row_upper:
-                    current_invoice['payment_method'] = 'atm'
-                elif 'TRANSFER (' in row_upper:
-                    current_invoice['payment_method'] = 'transfer'
-            
-            cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-            cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
+            # Validation: Kiểm tra tổng sau giảm giá có hợp lý không
+            final_total_after_discount = sum(item['quantity'] * item['price'] for item in invoice['items'])
+            # Tính expected_final dựa trên giảm giá thực tế đã áp dụng (có thể nhỏ hơn total_discount nếu bị giới hạn)
+            actual_discount_applied = total_items_value - final_total_after_discount
+            expected_final = total_items_value - max_discount_for_item
+            diff = abs(final_total_after_discount - expected_final)
             
-            # Track items đã parse trong row này để tránh duplicate
-            parsed_in_row = set()
-            
-            # Parse tất cả các món có thể trong row
-            # Bắt đầu từ đầu row và parse đến khi không còn đủ 4 cells (name, qty, unit, price)
-            for i in range(len(cells) - 3):
-                try:
-                    name = cells[i]
-                    qty_candidate = cells[i + 1]
-                    unit_candidate = cells[i + 2]
-                    price_candidate = cells[i + 3]
-                    
-                    # Mở rộng điều kiện số lượng để không bỏ sót món
-                    # Cho phép số lượng từ 1 đến 200
-                    if not (qty_candidate.isdigit() and 1 <= int(qty_candidate) <= 200):
-                        continue
-                    
-                    qty = int(qty_candidate)
-                    price_clean = price_candidate.replace(' ', '').replace(',', '').replace('.', '')
-                    if not price_clean.isdigit():
-                        continue
-                    
-                    price_value = float(price_clean)
-                    unit = unit_candidate if unit_candidate and not unit_candidate.isdigit() else 'Phần'
-                    
-                    # Bỏ qua các tên không hợp lệ
-                    # LƯU Ý: Cho phép tên là số (như "333" là tên bia) nếu có giá và số lượng hợp lệ
-                    if (len(name) < 1 or 
-                        name in ['', 'STT', 'Mã hoá đơn', 'Simple Place']):
-                        continue
-                    
-                    # Chỉ bỏ qua tên là số nếu không có context hợp lệ (giá và số lượng)
-                    # Nếu có giá và số lượng hợp lệ, có thể là tên món đặc biệt (như "333" là bia)
-                    if name.isdigit() and (not price_clean.isdigit() or not qty_candidate.isdigit()):
-                        continue
-                    
-                    skip_patterns = [
-                        r'\bcrispy\b', r'\bsoft\b', r'cut in 4', r'- edit\s*$',
-                        r'đổi phương thức', r'\bpayment\b', r'\btransfer\b',
-                        r'\bcod\b', r'\batm\b', 'background-color', 'vertical-align',
-                        'ghi chú', 'giảm sốt'
-                    ]
-                    if any(re.search(pattern, name.lower()) for pattern in skip_patterns):
-                        continue
-                    
-                    # Mở rộng điều kiện để không bỏ sót món
-                    # Cho phép giá từ 500 VND (có thể có món rẻ) đến 2,000,000 VND (có thể có món đắt)
-                    # Cho phép số lượng từ 1 đến 200 (có thể có món order nhiều)
-                    if (price_value >= 500 and price_value <= 2000000 and 
-                        qty >= 1 and qty <= 200 and len(name) > 2):
-                        
-                        raw_unit = unit.strip() if unit else ''
-                        raw_unit_lower = raw_unit.lower()
-                        if not raw_unit or raw_unit.isdigit():
-                            clean_unit = 'Phần'
-                        elif raw_unit_lower in {'món', 'mon', 'dish'}:
-                            clean_unit = 'Phần'
-                        else:
-                            clean_unit = raw_unit
-                        
-                        # Lưu tên gốc để check từ khóa bia/rượu trước khi match menu
-                        original_name = name.strip()
-                        original_name_lower = original_name.lower()
-                        
-                        # Match với menu
-                        matched_name = match_menu_name(original_name, all_menu_items, name_mapping)
-                        
-                        # Tự động sửa format nếu không đúng
-                        full_name = fix_item_name_format(matched_name)
-                        
-                        # Đảm bảo format cuối cùng luôn có " / "
-                        if ' / ' not in full_name:
-                            full_name = f"{full_name} / {full_name}"
-                        
-                        # Tạo key để check duplicate dựa trên VỊ TRÍ CELL trong row này
-                        # Tránh parse cùng 1 cell nhiều lần (do logic loop có thể parse lại)
-                        # Sử dụng vị trí cell (i) thay vì nội dung món để tránh bỏ sót món giống nhau
-                        cell_position_key = i
-                        
-                        # CHỈ kiểm tra duplicate dựa trên vị trí cell trong row này
-                        # Cho phép có nhiều món giống nhau (cùng tên, giá, số lượng) trong cùng row hoặc khác row
-                        # Vì có thể là các món riêng biệt được order ở các thời điểm khác nhau
-                        if cell_position_key in parsed_in_row:
-                            continue
-                        
-                        # Đánh dấu đã parse cell ở vị trí này trong row này
-                        parsed_in_row.add(cell_position_key)
-                        
-                        # KHÔNG kiểm tra duplicate trong invoice nữa
-                        # Cho phép có nhiều món giống nhau (cùng tên, giá, số lượng) trong cùng hóa đơn
-                        # Vì có thể là các món riêng biệt được order ở các thời điểm khác nhau
-                        
-                        # Xác định bia/rượu và Coke (thuế 10%) dựa trên Tên nhóm của menu
-                        # Chỉ các nhóm: BEER & CRAFT BEERS, SANGRIA, RED, WHITE mới bị coi là bia/rượu (tính thuế 10%)
-                        # Ngoài ra, Coke (Coca-Cola) THƯỜNG có 10% đường nên cũng tính thuế 10% (giống bia/rượu)
-                        # LƯU Ý: Coke Light và Coke Zero có lượng đường < 10g nên tính thuế 8%, KHÔNG phải 10%
-                        alcohol_groups = {'BEER & CRAFT BEERS', 'SANGRIA', 'RED', 'WHITE'}
-                        matched_item = next((m for m in all_menu_items if m['name'] == full_name), None)
-                        group_name = str(matched_item.get('group', '')).strip().upper() if matched_item else ''
-                        is_alcohol = group_name in alcohol_groups
-                        
-                        # QUAN TRỌNG: Check từ khóa bia/rượu trong CẢ tên gốc (original_name) VÀ tên đã match (full_name)
-                        # Để phát hiện các món như "333", "Saigon" ngay cả khi không match được với menu
-                        if not is_alcohol:
-                            # Danh sách từ khóa bia/rượu
-                            alcohol_keywords = ['bia', 'beer', 'heineken', 'tiger', 'saigon', '333', 'rượu', 'wine', 'whisky', 'vodka', 'sapporo', 'craft']
-                            
-                            # Check trong tên gốc (trước khi match menu)
-                            is_alcohol = any(keyword in original_name_lower for keyword in alcohol_keywords)
-                            
-                            # Nếu chưa phát hiện, check trong tên đã match (sau khi match menu)
-                            if not is_alcohol:
-                                full_name_lower = full_name.lower()
-                                is_alcohol = any(keyword in full_name_lower for keyword in alcohol_keywords)
-                        
-                        # Kiểm tra nếu là Coke (Coca-Cola) THƯỜNG - có 10% đường nên tính thuế 10% (giống bia/rượu)
-                        # LƯU Ý: Chỉ Coke thường (có 10% đường) tính thuế 10%, Coke Light và Coke Zero (ít đường) tính thuế 8%
-                        if not is_alcohol:
-                            # Check trong cả tên gốc và tên đã match
-                            if ('coke' in original_name_lower or 'coca' in original_name_lower) or ('coke' in full_name.lower() or 'coca' in full_name.lower()):
-                                # Loại trừ Coke Light và Coke Zero (có lượng đường < 10g)
-                                exclude_keywords = ['light', 'zero', 'ít đường', 'không đường', 'it duong', 'khong duong', 'less sugar', 'no sugar']
-                                # Check trong cả tên gốc và tên đã match
-                                is_coke_light_or_zero = (any(exclude_kw in original_name_lower for exclude_kw in exclude_keywords) or
-                                                         any(exclude_kw in full_name.lower() for exclude_kw in exclude_keywords))
-                                if not is_coke_light_or_zero:
-                                    is_alcohol = True
-                                    # Log để rõ ràng
-                                    print(f"⚠️  PHÁT HIỆN COKE (10% đường) - Mã HĐ: {current_invoice.get('invoice_id', 'N/A')} | Món: {full_name} | Tính thuế 10% (giống bia/rượu)")
-                        
-                        if is_alcohol:
-                            # Log alcohol/beverage detection (bao gồm bia/rượu và Coke 10% đường)
-                            original_amount = price_value * qty
-                            invoice_id = current_invoice.get('invoice_id', 'N/A')
-                            
-                            # Xác định loại: bia/rượu hay Coke
-                            item_name_lower = full_name.lower()
-                            is_coke = ('coke' in item_name_lower or 'coca' in item_name_lower) and group_name not in alcohol_groups
-                            item_type = "COKE (10% đường)" if is_coke else "BIA/RƯỢU"
-                            
-                            alcohol_items_found.append({
-                                'invoice_id': invoice_id,
-                                'alcohol_name': full_name,
-                                'quantity': qty,
-                                'unit': clean_unit,
-                                'price': price_value,
-                                'total_amount': original_amount
-                            })
-                            
-                            # Tính thuế 10% (áp dụng cho cả bia/rượu và Coke 10% đường)
-                            tax_10_percent = price_value * 0.10
-                            total_with_10_tax = price_value * 1.10
-                            
-                            print(f"⚠️  PHÁT HIỆN {item_type} - Mã HĐ: {invoice_id} | Món: {full_name} | SL: {qty} | Giá: {price_value:,.0f}đ | Tổng: {original_amount:,.0f}đ")
-                            print(f"   Thuế 10%: {tax_10_percent:,.0f}đ | Tổng với thuế 10%: {total_with_10_tax:,.0f}đ")
-                            
-                            # Replace with food item: thêm số tiền bằng thuế 10% để tổng đủ sau thuế 8%
-                            # Áp dụng cho cả bia/rượu và Coke 10% đường
-                            full_name, clean_unit, adjusted_price = find_replacement_for_alcohol(
-                                full_name, price_value, price_to_items)
-                            price_value = adjusted_price
-                            
-                            # Tính lại để kiểm tra
-                            replacement_total_with_8_tax = adjusted_price * 1.08
-                            print(f"   → Đã thay bằng: {full_name} | Giá mới: {price_value:,.0f}đ (đã thêm {tax_10_percent:,.0f}đ = thuế 10% của {item_type.lower()})")
-                            print(f"   → Tổng sau thuế 8%: {replacement_total_with_8_tax:,.0f}đ (bằng tổng {item_type.lower()} với thuế 10%: {total_with_10_tax:,.0f}đ)")
-                        
-                        current_invoice['items'].append({
-                            'name': full_name,
-                            'quantity': qty,
-                            'unit': clean_unit,
-                            'price': price_value
-                        })
-                        
-                except (ValueError, IndexError):
-                    continue
+            if diff > 1000:  # Chênh lệch > 1000đ là bất thường
+                print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} sau giảm giá có chênh lệch lớn ({diff:,.0f}đ). Có thể giảm giá bị parse sai.")
+
+def _print_alcohol_summary(alcohol_items_found):
+    """In tổng hợp các món bia/rượu đã phát hiện và thay thế"""
+    if alcohol_items_found:
+        print("\n" + "=" * 70)
+        print("📋 TỔNG HỢP BIA/RƯỢU ĐÃ PHÁT HIỆN VÀ THAY THẾ")
+        print("=" * 70)
+        total_alcohol_amount = 0
+        for item in alcohol_items_found:
+            print(f"   Mã HĐ: {item['invoice_id']:<10} | {item['alcohol_name']:<40} | SL: {item['quantity']:<3} | Tổng: {item['total_amount']:>12,.0f}đ")
+            total_alcohol_amount += item['total_amount']
+        print("-" * 70)
+        print(f"   Tổng số hóa đơn có bia/rượu: {len(set(item['invoice_id'] for item in alcohol_items_found))}")
+        print(f"   Tổng số món bia/rượu: {len(alcohol_items_found)}")
+        print(f"   Tổng tiền bia/rượu: {total_alcohol_amount:,.0f}đ")
+        print("=" * 70)
+        print("💡 Vui lòng kiểm tra lại các hóa đơn trên hệ thống!\n")
+
+def _finish_invoice(invoice, raw_items, all_menu_items, name_mapping, price_to_items,
+                    alcohol_items_found, unchanged=None, skipped_ids=None):
+    """
+    Hoàn tất 1 hóa đơn đã đủ row: gắn content_hash, bỏ qua nếu không đổi so với ledger,
+    match từng món với menu và áp dụng giảm giá. Returns True nếu hóa đơn cần được yield.
+    """
+    if not raw_items:
+        return False
+    
+    invoice['content_hash'] = invoice_content_hash(invoice, raw_items)
+    if unchanged and unchanged.get(invoice['invoice_id']) == invoice['content_hash']:
+        if skipped_ids is not None:
+            skipped_ids.append(invoice['invoice_id'])
+        return False
     
-    # Apply discounts
-    for invoice in invoices:
-        if len(invoice['items']) == 0:
+    for name, qty, unit, price_value in raw_items:
+        try:
+            _append_invoice_item(invoice, name, qty, unit, price_value,
+                                 all_menu_items, name_mapping, price_to_items, alcohol_items_found)
+        except (ValueError, IndexError):
             continue
-            
-        total_discount = invoice['discount'] + invoice['payment_discount']
+    
+    if not invoice['items']:
+        return False
+    _apply_invoice_discount(invoice)
+    return True
+
+def _iter_invoice_rows(rows, all_menu_items, name_mapping, price_to_items,
+                       alcohol_items_found=None, default_payment_method=None, print_summary=True,
+                       unchanged=None, skipped_ids=None):
+    """
+    Parse từng row (chuỗi giữa 2 thẻ <tr>), group theo hóa đơn và yield từng hóa đơn
+    ngay khi gặp row mở đầu hóa đơn kế tiếp (hoặc hết file).
+    default_payment_method dùng cho hóa đơn không tự ghi rõ ATM / TRANSFER.
+    
+    Nếu header (<thead>) của file export có đủ các cột cần thiết thì đọc từng field
+    theo vị trí cột (detect_column_schema); nếu không nhận diện được header thì dùng heuristic cũ
+    (dò tổng tiền ở cell 15-25, trượt cửa sổ 4 cell để tìm món).
+    Hóa đơn yield ra đã áp dụng giảm giá; hóa đơn không có món bị bỏ qua.
+    Khi hết row sẽ in tổng hợp bia/rượu (alcohol_items_found) nếu print_summary.
+    
+    Món thô của mỗi hóa đơn được gom lại và chỉ match menu khi hóa đơn đã đủ row, sau khi
+    tính invoice['content_hash']. unchanged ({invoice_id: content_hash}, từ ledger): hóa đơn
+    trùng hash được bỏ qua hoàn toàn (không match, không yield), mã được thêm vào skipped_ids.
+    """
+    current_invoice = None
+    raw_items = []        # Món thô (name, qty, unit, price) của hóa đơn hiện tại
+    invoice_counter = 0
+    if alcohol_items_found is None:
+        alcohol_items_found = []  # Track alcohol items for reporting
+    
+    schema = None         # Schema cột đọc từ header (None = dùng heuristic)
+    row_layout = None     # Vị trí cột món của hóa đơn hiện tại (theo rowspan của row đầu)
+    
+    for row in rows:
+        invoice_match = INVOICE_MARKER_RE.search(row)
         
-        # Bỏ qua giảm giá quá nhỏ (có thể là parse sai)
-        if total_discount > 0 and total_discount < 1000:
-            # Giảm giá < 1000đ có thể là parse sai, bỏ qua
+        if invoice_match is None and current_invoice is None:
+            # Chỉ đọc header 1 lần, trước hóa đơn đầu tiên
+            if schema is None:
+                schema = detect_column_schema(row)
             continue
         
-        if total_discount > 0 and len(invoice['items']) > 0:
-            # Tính tổng giá trị tất cả các món
-            total_items_value = sum(item['quantity'] * item['price'] for item in invoice['items'])
+        if invoice_match:
+            # Hóa đơn trước đã đủ row → match món, áp dụng giảm giá và trả về ngay
+            if current_invoice is not None and _finish_invoice(
+                    current_invoice, raw_items, all_menu_items, name_mapping, price_to_items,
+                    alcohol_items_found, unchanged, skipped_ids):
+                yield current_invoice
+            raw_items = []
             
-            if total_items_value > 0:
-                # VALIDATION: Chỉ áp dụng giảm giá nếu hợp lý
-                # - Giảm giá không được vượt quá 50% tổng giá trị (tránh parse sai)
-                # - Giảm giá phải nhỏ hơn tổng giá trị
-                max_reasonable_discount = total_items_value * 0.5  # Tối đa 50%
-                
-                if total_discount > max_reasonable_discount:
-                    # Nếu giảm giá quá lớn, có thể là parse sai - bỏ qua
-                    print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} có giảm giá bất thường ({total_discount:,.0f}đ > 50% tổng {total_items_value:,.0f}đ). Bỏ qua phân bổ giảm giá.")
-                    continue
-                
-                if total_discount >= total_items_value:
-                    # Giảm giá >= tổng giá trị là không hợp lý
-                    print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} có giảm giá >= tổng giá trị. Bỏ qua phân bổ giảm giá.")
-                    continue
-                
-                # CHỈ ÁP DỤNG GIẢM GIÁ CHO 1 MÓN (món có giá trị cao nhất)
-                # Tìm món có giá trị cao nhất để áp dụng giảm giá
-                target_item = max(invoice['items'], 
-                                key=lambda x: x['quantity'] * x['price'])
-                
-                target_item_total = target_item['quantity'] * target_item['price']
-                
-                # Đảm bảo giảm giá không vượt quá 90% giá trị món (để giá > 0)
-                max_discount_for_item = min(total_discount, target_item_total * 0.9)
-                
-                # Tính giá mới cho món được chọn
-                new_item_total = target_item_total - max_discount_for_item
-                new_price = max(new_item_total / target_item['quantity'], 1.0)  # Giá tối thiểu là 1 đồng
-                
-                # Áp dụng giá mới
-                old_price = target_item['price']
-                target_item['price'] = new_price
-                
-                # Log thông tin
-                print(f"   💰 HĐ {invoice['invoice_id']}: Áp dụng giảm giá {max_discount_for_item:,.0f}đ cho món '{target_item['name']}' (giá: {old_price:,.0f}đ → {new_price:,.0f}đ)")
-                
-                # Nếu giảm giá còn thừa (do giới hạn 90%), cảnh báo
-                remaining_discount = total_discount - max_discount_for_item
-                if remaining_discount > 1:
-                    print(f"   ⚠️  Cảnh báo: Còn {remaining_discount:,.0f}đ giảm giá chưa được áp dụng (do giới hạn 90% giá trị món)")
-                
-                # Validation: Kiểm tra tổng sau giảm giá có hợp lý không
-                final_total_after_discount = sum(item['quantity'] * item['price'] for item in invoice['items'])
-                # Tính expected_final dựa trên giảm giá thực tế đã áp dụng (có thể nhỏ hơn total_discount nếu bị giới hạn)
-                actual_discount_applied = total_items_value - final_total_after_discount
-                expected_final = total_items_value - max_discount_for_item
-                diff = abs(final_total_after_discount - expected_final)
-                
-                if diff > 1000:  # Chênh lệch > 1000đ là bất thường
-                    print(f"⚠️  Cảnh báo: Hóa đơn {invoice['invoice_id']} sau giảm giá có chênh lệch lớn ({diff:,.0f}đ). Có thể giảm giá bị parse sai.")
-    
-    # Filter empty invoices
-    invoices = [inv for inv in invoices if len(inv['items']) > 0]
+            if schema is not None:
+                cell_attrs, cells = extract_cells_with_attrs(row)
+                row_layout = schema_row_layout(schema, cell_attrs)
+            else:
+                cells = extract_cells(row)
+            
+            invoice_num = invoice_match.group(1)
+            invoice_counter += 1
+            
+            invoice_date = None
+            if row_layout is not None and len(cells) == row_layout['full_width']:
+                invoice_date = _invoice_date_from_schema(cells, schema)
+                discount, payment_discount, final_total = _invoice_amounts_from_schema(cells, schema)
+            else:
+                discount, payment_discount, final_total = _invoice_amounts_heuristic(cells)
+            
+            if invoice_date is None:
+                date_match = DATE_RE.search(row)
+                invoice_date = date_match.group(1) if date_match else datetime.now().strftime('%d/%m/%Y')
+            
+            payment_method = _detect_payment_method(cells, row) or default_payment_method
+            
+            current_invoice = {
+                'number': invoice_counter,
+                'invoice_id': invoice_num,
+                'date': invoice_date,
+                'items': [],
+                'discount': discount,
+                'payment_discount': payment_discount,
+                'final_total': final_total,
+                'payment_method': payment_method
+            }
+        else:
+            cells = extract_cells(row)
+        
+        # Extract items
+        if current_invoice.get('payment_method') is None:
+            row_upper = row.upper()
+            if 'ATM (' in row_upper:
+                current_invoice['payment_method'] = 'atm'
+            elif 'TRANSFER (' in row_upper:
+                current_invoice['payment_method'] = 'transfer'
+        
+        item_columns = layout_item_columns(row_layout, cells) if row_layout is not None else None
+        if item_columns is not None:
+            row_items = _row_items_from_schema(cells, item_columns)
+        else:
+            # Heuristic: trượt cửa sổ 4 cell (name, qty, unit, price) trên các cell đã phân loại
+            row_items = scan_item_windows(cells)
+        
+        raw_items.extend(row_items)
     
-    # Print summary of alcohol items found
-    if alcohol_items_found:
-        print("\n" + "=" * 70)
-        print("📋 TỔNG HỢP BIA/RƯỢU ĐÃ PHÁT HIỆN VÀ THAY THẾ")
-        print("=" * 70)
-        total_alcohol_amount = 0
-        for item in alcohol_items_found:
-            print(f"   Mã HĐ: {item['invoice_id']:<10} | {item['alcohol_name']:<40} | SL: {item['quantity']:<3} | Tổng: {item['total_amount']:>12,.0f}đ")
-            total_alcohol_amount += item['total_amount']
-        print("-" * 70)
-        print(f"   Tổng số hóa đơn có bia/rượu: {len(set(item['invoice_id'] for item in alcohol_items_found))}")
-        print(f"   Tổng số món bia/rượu: {len(alcohol_items_found)}")
-        print(f"   Tổng tiền bia/rượu: {total_alcohol_amount:,.0f}đ")
-        print("=" * 70)
-        print("💡 Vui lòng kiểm tra lại các hóa đơn trên hệ thống!\n")
+    if current_invoice is not None and _finish_invoice(
+            current_invoice, raw_items, all_menu_items, name_mapping, price_to_items,
+            alcohol_items_found, unchanged, skipped_ids):
+        yield current_invoice
     
-    return invoices, alcohol_items_found
+    if print_summary:
+        _print_alcohol_summary(alcohol_items_found)
 
 # ============================================================================
 # GRAB INVOICE FUNCTIONS
 # ============================================================================
 
-def generate_random_items_with_target(menu_items, target_amount_before_tax, min_items=20, max_items=30):
-    """Generate random menu items với INTEGER quantities để match target amount"""
-    
-    # Filter out alcoholic beverages
-    alcohol_keywords = ['bia', 'beer', 'heineken', 'tiger', 'saigon', '333', 'rượu', 'wine', 'whisky', 'vodka']
-    menu_items = [item for item in menu_items 
-                  if not any(keyword in item['name'].lower() for keyword in alcohol_keywords)]
-    
-    # Check menu size to adjust parameters
-    menu_size = len(menu_items)
+def _grab_item_limits(target_amount_before_tax, menu_size, min_items=20, max_items=30):
+    """(min_items, max_items, num_attempts) theo tổng tiền và độ lớn menu (dùng chung cho generator random và solver)"""
     is_small_menu = menu_size < 150  # Taco Place has ~123 items
     
     # Adjust parameters based on target amount and menu size
@@ -799,7 +1319,7 @@ def generate_random_items_with_target(menu_items, target_amount_before_tax, min_
             max_items = min(30, menu_size - 5)  # Cap max_items based on menu size
         else:
             min_items = max(25, min_items)
-            max_items = min(40, len(menu_items))
+            max_items = min(40, menu_size)
         num_attempts = 200
     elif target_amount_before_tax > 2000000:
         if is_small_menu:
@@ -817,26 +1337,53 @@ def generate_random_items_with_target(menu_items, target_amount_before_tax, min_
             min_items = max(20, min_items)
             max_items = 30
         num_attempts = 50
-    
-    best_result = None
-    best_diff = float('inf')
-    
-    # Find tacos and burritos to ensure they're always included
+    return min_items, max_items, num_attempts
+
+def _grab_required_items(menu_items, rng=random):
+    """1 taco + 1 burrito chọn ngẫu nhiên (nếu menu có), luôn có trong hóa đơn Grab"""
     required_items = []
     tacos = [item for item in menu_items if 'taco' in item['name'].lower()]
     burritos = [item for item in menu_items if 'burrito' in item['name'].lower()]
     
     if tacos:
-        required_items.append(random.choice(tacos))
+        required_items.append(rng.choice(tacos))
     if burritos:
-        required_items.append(random.choice(burritos))
+        required_items.append(rng.choice(burritos))
+    
+    return list({item['name']: item for item in required_items}.values())
+
+def generate_random_items_with_target(menu_items, target_amount_before_tax, min_items=20, max_items=30,
+                                      vectorized=None, rng=None):
+    """
+    Generate random menu items với INTEGER quantities để match target amount.
+    vectorized (mặc định GRAB_VECTORIZED): sinh + đánh giá hàng nghìn bộ món bằng NumPy.
+    rng: random.Random có seed (mặc định module random).
+    """
+    
+    rng = rng or random
+    if (GRAB_VECTORIZED if vectorized is None else vectorized) and _load_numpy() is not None:
+        return generate_random_items_vectorized(menu_items, target_amount_before_tax, min_items, max_items,
+                                                rng=rng)
+    
+    # Filter out alcoholic beverages (và Coke thường - thuế 10%)
+    menu_items = [item for item in menu_items if classify_menu_item(item) == TAX_STANDARD]
+    
+    # Check menu size to adjust parameters
+    menu_size = len(menu_items)
+    is_small_menu = menu_size < 150  # Taco Place has ~123 items
+    min_items, max_items, num_attempts = _grab_item_limits(
+        target_amount_before_tax, menu_size, min_items, max_items)
+    
+    best_result = None
+    best_diff = float('inf')
     
-    required_items = list({item['name']: item for item in required_items}.values())
+    # Find tacos and burritos to ensure they're always included
+    required_items = _grab_required_items(menu_items, rng)
     num_required = len(required_items)
     num_attempts = num_attempts * 5
     
     for attempt in range(num_attempts):
-        num_additional_items = random.randint(min_items - num_required, max_items - num_required)
+        num_additional_items = rng.randint(min_items - num_required, max_items - num_required)
         avg_price_needed = target_amount_before_tax / (num_additional_items + num_required)
         available_items = [item for item in menu_items if item not in required_items]
         
@@ -850,9 +1397,9 @@ def generate_random_items_with_target(menu_items, target_amount_before_tax, min_
             pool = sorted_by_price[:pool_size]
             if len(pool) < num_additional_items:
                 # If pool too small, use all available items
-                selected_additional = random.sample(available_items, min(num_additional_items, len(available_items)))
+                selected_additional = rng.sample(available_items, min(num_additional_items, len(available_items)))
             else:
-                selected_additional = random.sample(pool, min(num_additional_items, len(pool)))
+                selected_additional = rng.sample(pool, min(num_additional_items, len(pool)))
         elif target_amount_before_tax > 1000000:
             # For medium invoices, use more flexible price range for small menus
             if is_small_menu:
@@ -863,18 +1410,18 @@ def generate_random_items_with_target(menu_items, target_amount_before_tax, min_
                 suitable_items = [item for item in available_items 
                                 if avg_price_needed * 0.3 <= item['price'] <= avg_price_needed * 2.5]
             if len(suitable_items) >= num_additional_items:
-                selected_additional = random.sample(suitable_items, num_additional_items)
+                selected_additional = rng.sample(suitable_items, num_additional_items)
             else:
                 selected_additional = suitable_items.copy()
                 remaining_needed = num_additional_items - len(suitable_items)
                 remaining_pool = [item for item in available_items if item not in suitable_items]
                 if remaining_needed > 0 and remaining_pool:
-                    selected_additional.extend(random.sample(remaining_pool, min(remaining_needed, len(remaining_pool))))
+                    selected_additional.extend(rng.sample(remaining_pool, min(remaining_needed, len(remaining_pool))))
                 # If still not enough, use all available items
                 if len(selected_additional) < num_additional_items:
                     remaining_needed = num_additional_items - len(selected_additional)
                     if remaining_needed > 0 and len(available_items) > len(selected_additional):
-                        additional = random.sample([item for item in available_items if item not in selected_additional], 
+                        additional = rng.sample([item for item in available_items if item not in selected_additional], 
                                                   min(remaining_needed, len(available_items) - len(selected_additional)))
                         selected_additional.extend(additional)
         else:
@@ -885,9 +1432,9 @@ def generate_random_items_with_target(menu_items, target_amount_before_tax, min_
                 pool_size = max(num_additional_items * 3, len(available_items) // 2)
             pool = sorted_by_price[:pool_size]
             if len(pool) < num_additional_items:
-                selected_additional = random.sample(available_items, min(num_additional_items, len(available_items)))
+                selected_additional = rng.sample(available_items, min(num_additional_items, len(available_items)))
             else:
-                selected_additional = random.sample(pool, min(num_additional_items, len(pool)))
+                selected_additional = rng.sample(pool, min(num_additional_items, len(pool)))
         
         selected_items = required_items + selected_additional
         result = []
@@ -1020,7 +1567,7 @@ def generate_random_items_with_target(menu_items, target_amount_before_tax, min_
                         if target_qty >= 1:
                             quantity = min(max_affordable, max(1, int(target_qty)))
                         else:
-                            quantity = min(max_affordable, random.randint(1, 2))
+                            quantity = min(max_affordable, rng.randint(1, 2))
                 else:
                     quantity = 1
                 
@@ -1061,8 +1608,345 @@ def generate_random_items_with_target(menu_items, target_amount_before_tax, min_
     
     return best_result
 
-def create_grab_invoice(total_with_tax, menu_items, date_str=None, invoice_number=None):
-    """Tạo file hóa đơn Grab với món ăn random từ menu"""
+# ============================================================================
+# GENERATOR RANDOM DẠNG MA TRẬN (NUMPY)
+# ============================================================================
+# Mỗi hàng = 1 bộ món: cột đầu là món bắt buộc (taco/burrito), các cột sau là chỉ số món
+# bốc ngẫu nhiên (không lặp trong hàng), cột thừa so với số món của hàng bị che (mask).
+# Tổng tiền, số lượng + giá điều chỉnh của món cuối tính cho cả ma trận 1 lần; chỉ bộ món
+# tốt nhất mới được đổi thành list dict.
+
+_numpy = None
+
+def _load_numpy():
+    """Import numpy khi cần; None nếu môi trường không có numpy"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:  # numpy might not be available in some environments
+            _numpy = False
+        else:
+            _numpy = numpy
+    return _numpy or None
+
+def _evaluate_grab_candidates(np, gen, n, target, required_prices, pool_prices,
+                              min_additional, max_additional, max_price_adjustment):
+    """
+    Sinh + đánh giá n bộ món. Returns (picks, valid, quantities, last, last_qty, adjusted_price,
+    best) — best = chỉ số hàng tốt nhất, None nếu không hàng nào khả thi.
+    """
+    num_required = len(required_prices)
+    num_additional = gen.integers(min_additional, max_additional + 1, size=n)
+    # Mẫu không lặp trong mỗi hàng: argsort khóa ngẫu nhiên
+    picks = np.argsort(gen.random((n, len(pool_prices))), axis=1)[:, :max_additional]
+    valid = np.concatenate([
+        np.ones((n, num_required), dtype=bool),
+        np.arange(max_additional) < num_additional[:, None],
+    ], axis=1)
+    prices = np.concatenate([np.broadcast_to(required_prices, (n, num_required)), pool_prices[picks]], axis=1)
+    prices = np.where(valid, prices, 0.0)
+    num_items = valid.sum(axis=1)
+    
+    # Số lượng: phần nguyên của số lượng trung bình cần thiết (như vòng lặp cũ), nhân hệ số
+    # ngẫu nhiên cho đa dạng; giới hạn như default_max_qty
+    avg_price = prices.sum(axis=1) / num_items
+    estimated_avg_qty = target / (num_items * avg_price)
+    max_qty = np.where(num_items >= 20, np.clip((estimated_avg_qty * 1.5).astype(int), 2, 5), 9)
+    ideal_qty = target / (num_items[:, None] * np.where(valid, prices, np.inf))
+    quantities = np.floor(ideal_qty * gen.uniform(0.6, 1.2, size=prices.shape))
+    quantities = np.where(valid, np.clip(quantities, 1, max_qty[:, None]), 0.0)
+    
+    # Món cuối = món rẻ nhất của hàng: làm tròn số lượng, giá điều chỉnh để đạt đúng target
+    rows = np.arange(n)
+    last = np.argmin(np.where(valid, prices, np.inf), axis=1)
+    last_price = prices[rows, last]
+    remaining = target - (quantities * prices).sum(axis=1) + quantities[rows, last] * last_price
+    last_qty = np.maximum(1.0, np.rint(remaining / last_price))
+    adjusted_price = remaining / last_qty
+    adjustment = np.abs(adjusted_price - last_price)
+    feasible = (remaining > 0) & (adjusted_price >= 1000) & (adjustment <= max_price_adjustment)
+    if not feasible.any():
+        return None
+    # Ưu tiên món cuối có số lượng gần mức của các món khác, rồi điều chỉnh giá nhỏ
+    score = np.abs(last_qty - estimated_avg_qty) + adjustment / max_price_adjustment
+    best = int(np.argmin(np.where(feasible, score, np.inf)))
+    return picks[best], valid[best], quantities[best], int(last[best]), int(last_qty[best]), \
+        float(adjusted_price[best])
+
+def generate_random_items_vectorized(menu_items, target_amount_before_tax, min_items=20, max_items=30,
+                                     num_candidates=GRAB_VECTOR_CANDIDATES, rng=None):
+    """
+    Như generate_random_items_with_target nhưng sinh bộ món (chỉ số món + số lượng) dạng ma
+    trận: lô 64 bộ, chưa có bộ khả thi thì lô gấp 4, tối đa num_candidates bộ mỗi lô.
+    rng: random.Random (mặc định module random) — chỉ dùng để tạo seed cho NumPy.
+    Returns list món hoặc None nếu không bộ món nào đạt giới hạn điều chỉnh giá món cuối.
+    """
+    np = _load_numpy()
+    rng = rng or random
+    target = float(target_amount_before_tax)
+    menu_items = [item for item in menu_items
+                  if classify_menu_item(item) == TAX_STANDARD and item['price'] > 0]
+    if not menu_items:
+        return None
+    min_items, max_items, num_attempts = _grab_item_limits(target, len(menu_items), min_items, max_items)
+    
+    required_items = _grab_required_items(menu_items, rng)
+    available_items = [item for item in menu_items if item not in required_items]
+    num_required = len(required_items)
+    min_additional = max(0, min(min_items - num_required, len(available_items)))
+    max_additional = max(min_additional, min(max_items - num_required, len(available_items)))
+    
+    # Pool: các món có giá gần giá trung bình cần thiết (như pool theo khoảng giá của vòng lặp cũ),
+    # tính với số lượng trung bình ~1.5 để tổng tối thiểu (mỗi món 1) không vượt target
+    avg_price_needed = target / (1.5 * max(1, (min_additional + max_additional) // 2 + num_required))
+    by_fit = sorted(available_items, key=lambda x: abs(math.log(x['price'] / avg_price_needed)))
+    pool = by_fit[:max(max_additional * 3, max_additional + 10)]
+    pool_prices = np.array([item['price'] for item in pool], dtype=float)
+    required_prices = np.array([item['price'] for item in required_items], dtype=float)
+    
+    gen = np.random.default_rng(rng.getrandbits(63))
+    batch_size = 64
+    evaluated = 0
+    # Cùng ngân sách với vòng lặp cũ (num_attempts * 5 bộ món), tính theo từng lô ma trận
+    while evaluated < max(num_candidates, num_attempts * 5):
+        found = _evaluate_grab_candidates(np, gen, batch_size, target, required_prices, pool_prices,
+                                          min_additional, max_additional, GRAB_MAX_PRICE_ADJUSTMENT)
+        evaluated += batch_size
+        if found is not None:
+            break
+        batch_size = min(batch_size * 4, num_candidates)
+    else:
+        return None
+    
+    picks, valid, quantities, last, last_qty, adjusted_price = found
+    row_items = required_items + [pool[i] for i in picks]
+    chosen = [(row_items[col], int(quantities[col])) for col in np.flatnonzero(valid) if col != last]
+    chosen.sort(key=lambda x: x[0]['price'], reverse=True)
+    result = [{
+        'name': item['name'],
+        'unit': item['unit'],
+        'price': item['price'],
+        'quantity': quantity
+    } for item, quantity in chosen]
+    result.append({
+        'name': row_items[last]['name'],
+        'unit': row_items[last]['unit'],
+        'price': adjusted_price,
+        'quantity': last_qty
+    })
+    return result
+
+# ============================================================================
+# SOLVER CHÍNH XÁC CHO HÓA ĐƠN GRAB (BOUNDED KNAPSACK)
+# ============================================================================
+# Bài toán: chọn N món (min_items..max_items, có taco + burrito), mỗi món số lượng
+# 1..max_quantity, sao cho tổng = tiền trước thuế (làm tròn VND). Món cuối (rẻ nhất) được
+# đổi giá tối đa GRAB_MAX_PRICE_ADJUSTMENT nên chỉ cần tổng các món còn lại rơi vào
+# 1 cửa sổ. Các tổng "thêm số lượng" đạt được lưu dạng bitset (int Python, bit e = tổng e
+# đơn vị giá), mỗi món dịch bitset theo cách tách nhị phân số lượng → vài chục phép dịch.
+
+def _bounded_reach_stages(units, max_extra, limit):
+    """
+    stages[i]: bitset các tổng Σ extra_j * units[j] (j <= i, 0 <= extra_j <= max_extra)
+    đạt được, chỉ giữ các bit <= limit.
+    """
+    mask = (1 << (limit + 1)) - 1
+    reach = 1
+    stages = []
+    for unit in units:
+        remaining = max_extra
+        chunk = 1
+        while remaining > 0:
+            step = min(chunk, remaining)
+            reach = (reach | (reach << (step * unit))) & mask
+            remaining -= step
+            chunk <<= 1
+        stages.append(reach)
+    return stages
+
+def _split_extra_units(stages, units, max_extra, total):
+    """Truy vết bitset: số lượng thêm cho từng món (tổng = total), chia đều nhất có thể"""
+    extras = [0] * len(units)
+    for i in range(len(units) - 1, -1, -1):
+        previous = stages[i - 1] if i else 1
+        share = round(total / (i + 1) / units[i])
+        for extra in sorted(range(max_extra + 1), key=lambda e: (abs(e - share), e)):
+            rest = total - extra * units[i]
+            if rest >= 0 and (previous >> rest) & 1:
+                extras[i] = extra
+                total = rest
+                break
+    return extras
+
+def _solve_grab_selection(selected_items, target, max_quantity, max_price_adjustment):
+    """
+    Số lượng chính xác cho 1 bộ món đã chọn (món rẻ nhất đứng cuối, được đổi giá).
+    Returns list món hoặc None nếu bộ món này không có nghiệm.
+    """
+    selected_items = sorted(selected_items, key=lambda x: x['price'], reverse=True)
+    last_item = selected_items[-1]
+    other_items = selected_items[:-1]
+    prices = [int(round(item['price'])) for item in other_items]
+    last_price = int(round(last_item['price']))
+    base_total = sum(prices)
+    step = math.gcd(*prices) or 1
+    units = [price // step for price in prices]
+    max_extra = max_quantity - 1
+
+    # Tổng thêm lớn nhất có thể dùng: món cuối số lượng 1, giá thấp nhất cho phép
+    limit = (target - base_total - max(1000, last_price - max_price_adjustment)) // step
+    if limit < 0:
+        return None
+    stages = _bounded_reach_stages(units, max_extra, limit)
+    reach = stages[-1] if stages else 1
+
+    # (điều chỉnh giá, số lượng món cuối, tổng thêm, giá món cuối): ưu tiên điều chỉnh nhỏ nhất
+    best = None
+    for quantity in range(1, max_quantity + 1):
+        center = target - base_total - quantity * last_price
+        low = max(0, -(-(center - quantity * max_price_adjustment) // step))
+        high = min(limit, (center + quantity * max_price_adjustment) // step)
+        if high < low:
+            continue
+        window = reach >> low
+        for extra_units in range(low, high + 1):
+            if not (window >> (extra_units - low)) & 1:
+                continue
+            last_total = target - base_total - extra_units * step
+            if last_total % quantity:
+                continue
+            price = last_total // quantity
+            adjustment = abs(price - last_price)
+            if price >= 1000 and adjustment <= max_price_adjustment and (best is None or adjustment < best[0]):
+                best = (adjustment, quantity, extra_units, price)
+        if best and best[0] == 0:
+            break
+    if best is None:
+        return None
+
+    _, last_quantity, extra_units, last_unit_price = best
+    extras = _split_extra_units(stages, units, max_extra, extra_units)
+    result = [{
+        'name': item['name'],
+        'unit': item['unit'],
+        'price': item['price'],
+        'quantity': 1 + extra
+    } for item, extra in zip(other_items, extras)]
+    result.append({
+        'name': last_item['name'],
+        'unit': last_item['unit'],
+        'price': float(last_unit_price),
+        'quantity': last_quantity
+    })
+    return result
+
+def solve_grab_basket(menu_items, target_amount_before_tax, min_items=20, max_items=30,
+                      max_quantity=None, max_price_adjustment=GRAB_MAX_PRICE_ADJUSTMENT, rng=None):
+    """
+    Chọn món cho hóa đơn Grab với tổng CHÍNH XÁC (số nguyên VND, chênh lệch < 1 VND so với
+    tiền trước thuế). Giữ các ràng buộc của generator random: số món theo tổng tiền / menu,
+    có taco + burrito, mỗi món <= max_quantity, món cuối đổi giá <= max_price_adjustment.
+    rng: đối tượng random.Random (mặc định module random) — chỉ dùng để chọn bộ món.
+    Returns list món như generate_random_items_with_target, hoặc None nếu không có nghiệm.
+    """
+    rng = rng or random
+    # Tên trùng (cùng món, nhiều giá): giữ món đầu tiên như by_name, mỗi tên chỉ 1 dòng
+    unique_items = {}
+    for item in menu_items:
+        if classify_menu_item(item) == TAX_STANDARD and item['price'] >= 1000:
+            unique_items.setdefault(item['name'], item)
+    menu_items = list(unique_items.values())
+    if not menu_items:
+        return None
+    target = int(round(target_amount_before_tax))
+    min_items, max_items, _ = _grab_item_limits(target, len(menu_items), min_items, max_items)
+    max_items = min(max_items, len(menu_items))
+    min_items = max(1, min(min_items, max_items))
+
+    required_items = _grab_required_items(menu_items, rng)
+    required_names = {item['name'] for item in required_items}
+    available_items = [item for item in menu_items if item['name'] not in required_names]
+    num_required = len(required_items)
+    max_menu_price = max(item['price'] for item in menu_items)
+
+    for _ in range(GRAB_SOLVER_ATTEMPTS):
+        num_items = rng.randint(max(min_items, num_required), max(max_items, num_required))
+        num_additional = min(num_items - num_required, len(available_items))
+        quantity_cap = max_quantity
+        if not quantity_cap:
+            # Tổng lớn so với menu: tăng số lượng tối đa để vẫn đủ tiền với các món đắt
+            needed_cap = math.ceil(2 * target / (num_items * max_menu_price * 0.8)) - 1
+            quantity_cap = max(5 if num_items >= 20 else 9, needed_cap)
+
+        # Giá mỗi món lý tưởng để số lượng trung bình nằm giữa 1..quantity_cap
+        ideal_price = target / (num_items * (quantity_cap + 1) / 2)
+        by_fit = sorted(available_items, key=lambda x: abs(math.log(x['price'] / ideal_price)))
+        pool = by_fit[:max(num_additional * 2, num_additional + 10)]
+        selected_items = required_items + rng.sample(pool, num_additional)
+
+        result = _solve_grab_selection(selected_items, target, quantity_cap, max_price_adjustment)
+        if result:
+            return result
+    return None
+
+def grab_items_check(items, amount_before_tax, menu_by_name):
+    """
+    (chênh lệch tổng so với tiền trước thuế, mức điều chỉnh giá món cuối so với menu).
+    Món cuối không có trong menu → điều chỉnh = inf.
+    """
+    actual_total = sum(item['price'] * item['quantity'] for item in items)
+    last_item_original = menu_by_name.get(items[-1]['name'])
+    if last_item_original is None:
+        return abs(amount_before_tax - actual_total), float('inf')
+    return abs(amount_before_tax - actual_total), abs(items[-1]['price'] - last_item_original['price'])
+
+def select_grab_items(amount_before_tax, menu_items, solver=None, rng=None):
+    """
+    Chọn món cho hóa đơn Grab: solver chính xác (nếu solver / GRAB_SOLVER = 'exact'),
+    không có nghiệm thì generator random tối đa 20 lần. Returns list món hoặc None.
+    rng: random.Random có seed (mặc định module random).
+    """
+    max_retries = 20
+    items = None
+    
+    # Không được điều chỉnh giá món cuối quá 10,000 VND
+    # Ưu tiên điều chỉnh số lượng để đạt chính xác 100%
+    max_price_adjustment = GRAB_MAX_PRICE_ADJUSTMENT
+    menu_by_name = get_menu_index(menu_items)['by_name']
+    
+    if (solver or GRAB_SOLVER) == 'exact':
+        items = solve_grab_basket(menu_items, amount_before_tax, max_price_adjustment=max_price_adjustment,
+                                  rng=rng)
+        if items is None:
+            print("   ⚠️  Solver không tìm được bộ món chính xác, dùng generator random")
+    
+    for retry in range(0 if items else max_retries):
+        items = generate_random_items_with_target(menu_items, amount_before_tax, rng=rng)
+        if items and len(items) > 0:
+            diff, adjustment = grab_items_check(items, amount_before_tax, menu_by_name)
+            # Kiểm tra: điều chỉnh giá <= 10,000 VND và chênh lệch < 1 VND (chính xác 100%)
+            if diff < 1 and adjustment <= max_price_adjustment:
+                break
+    
+    return items
+
+def grab_invoice_created(date_str):
+    """Thời điểm 'created' ghi trong file Grab = ngày hóa đơn (file tạo lại giống hệt từng byte)"""
+    try:
+        return datetime.strptime(date_str, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        return datetime(2000, 1, 1)
+
+def create_grab_invoice(total_with_tax, menu_items, date_str=None, invoice_number=None, solver=None,
+                        chosen_items=None, seed=None, use_cache=True):
+    """
+    Tạo file hóa đơn Grab với món ăn random từ menu.
+    solver: 'exact' (solve_grab_basket, fallback random) hoặc 'random'; mặc định GRAB_SOLVER.
+    chosen_items: list (tùy chọn) nhận các món đã chọn (trước phí dịch vụ) để kiểm tra.
+    seed: seed chọn món; mặc định suy ra từ (fingerprint menu, ngày, tổng tiền, mã hóa đơn).
+    use_cache: dùng lại / lưu bộ món đã giải (automation/grab_cache.py).
+    """
     
     try:
         total_with_tax = float(total_with_tax)
@@ -1086,27 +1970,24 @@ def create_grab_invoice(total_with_tax, menu_items, date_str=None, invoice_numbe
     print(f"   Tiền trước thuế:         {amount_before_tax:,.2f} VND")
     print(f"   Thuế VAT (8%):           {vat_amount:,.2f} VND")
     
-    max_retries = 20
-    items = None
-    
-    # Không được điều chỉnh giá món cuối quá 10,000 VND
-    # Ưu tiên điều chỉnh số lượng để đạt chính xác 100%
-    max_price_adjustment = 10000
-    
-    for retry in range(max_retries):
-        items = generate_random_items_with_target(menu_items, amount_before_tax)
-        if items and len(items) > 0:
-            last_item_name = items[-1]['name']
-            last_item_original = [m for m in menu_items if m['name'] == last_item_name]
-            if last_item_original:
-                last_item_original_price = last_item_original[0]['price']
-                last_item_actual_price = items[-1]['price']
-                adjustment = abs(last_item_actual_price - last_item_original_price)
-                actual_total = sum(item['price'] * item['quantity'] for item in items)
-                diff = abs(amount_before_tax - actual_total)
-                # Kiểm tra: điều chỉnh giá <= 10,000 VND và chênh lệch < 1 VND (chính xác 100%)
-                if diff < 1 and adjustment <= max_price_adjustment:
-                    break
+    # Cùng (menu, ngày, tổng, mã hóa đơn, solver, seed) → cùng bộ món, lấy từ cache nếu đã giải
+    solver = solver or GRAB_SOLVER
+    menu_fp = get_menu_index(menu_items)['fingerprint']
+    if seed is None:
+        seed = default_grab_seed(menu_fp, date_str, total_with_tax, invoice_number)
+    basket_key = grab_basket_key(menu_fp, date_str, total_with_tax, invoice_number, solver, seed)
+    items = load_grab_basket(basket_key) if use_cache else None
+    if items:
+        print("   ♻️  Dùng lại bộ món đã tạo trước đó (cache)")
+    else:
+        items = select_grab_items(amount_before_tax, menu_items, solver, rng=random.Random(seed))
+        if not items:
+            print("❌ Lỗi: Không chọn được món phù hợp với số tiền này")
+            return None
+        if use_cache:
+            store_grab_basket(basket_key, items)
+    if chosen_items is not None:
+        chosen_items.extend(dict(item) for item in items)
     
     print(f"\n📋 Món ăn được chọn ({len(items)} món):")
     total_check = 0
@@ -1135,7 +2016,8 @@ def create_grab_invoice(total_with_tax, menu_items, date_str=None, invoice_numbe
     # Thêm phí dịch vụ vào hóa đơn Grab (nếu được bật)
     add_service_fee_to_invoice(invoice_data)
     
-    create_invoice_file(invoice_data, str(output_file))
+    create_invoice_file(invoice_data, str(output_file), created=grab_invoice_created(date_str))
+    record_invoice_file(output_file, invoice_file_rows(invoice_data))
     
     return str(output_file)
 
@@ -1150,14 +2032,9 @@ def process_grab_invoice():
     all_menu_items, _, _ = load_menus()
     
     # Separate Simple Place and Taco Place based on source menu
-    simple_menu_items = []
-    taco_menu_items = []
-    for item in all_menu_items:
-        menu_source = item.get('menu_source', 'simple')  # Default to simple if not set
-        if menu_source == 'taco':
-            taco_menu_items.append(item)
-        else:
-            simple_menu_items.append(item)
+    menu_by_source = get_menu_index(all_menu_items)['by_source']
+    simple_menu_items = menu_by_source['simple']
+    taco_menu_items = menu_by_source['taco']
     
     print(f"   ✓ Simple Place: {len(simple_menu_items)} món")
     print(f"   ✓ Taco Place: {len(taco_menu_items)} món")
@@ -1213,52 +2090,37 @@ def process_grab_invoice():
         print(f"📁 File đã được tạo: {output_file}")
         print(f"\n💡 File sẵn sàng để upload lên website thuế!")
 
-def process_sale_by_payment_method():
-    """Process sale_by_payment_method files (combine and split)"""
+def process_sale_by_payment_method(sources=None, jobs=1, incremental=True, write_jobs=1, bundle=None):
+    """
+    Process sale_by_payment_method files (mỗi file 1 phương thức thanh toán) và tách hóa đơn.
+    sources: list of (file_path, payment_method); mặc định DEFAULT_SOURCES trong thư mục gốc.
+    jobs: số process parse song song (1 = parse tuần tự)
+    incremental: bỏ qua hóa đơn không đổi so với lần chạy trước (False = ghi lại tất cả)
+    write_jobs: số process ghi file xlsx song song (1 = ghi tuần tự)
+    bundle: ZipFile để ghi tất cả hóa đơn vào 1 file zip (None = ghi ra tax_files/)
+    """
     print("\n" + "=" * 70)
     print("🔄 XỬ LÝ SALE BY PAYMENT METHOD")
     print("=" * 70)
     
-    file1 = DEFAULT_FILE1
-    file2 = DEFAULT_FILE2
+    if sources is None:
+        for file_name, _ in DEFAULT_SOURCES:
+            if not (script_dir / file_name).exists():
+                print(f"\n⚠️  File không tồn tại, bỏ qua: {file_name}")
+        sources = resolve_payment_sources(script_dir)
     
-    file1_path = script_dir / file1
-    file2_path = script_dir / file2
-    
-    if not file1_path.exists():
-        print(f"\n❌ File không tồn tại: {file1}")
-        return
-    
-    if not file2_path.exists():
-        print(f"\n❌ File không tồn tại: {file2}")
+    if not sources:
+        print(f"\n❌ Không có file sale_by_payment_method nào để xử lý")
         return
     
-    print(f"\n📂 File 1 (transfer): {file1}")
-    print(f"📂 File 2 (atm): {file2}")
-    
-    print(f"\n🔗 Đang kết hợp files...")
-    content, _ = combine_files(str(file1_path), str(file2_path))
-    print(f"   ✓ Đã kết hợp files")
-    
-    is_combined = True
-    source_type = 'combined'
-    
-    # Load menus
-    print(f"\n📚 Đang load menu...")
-    all_menu_items, name_mapping, price_to_items = load_menus()
-    print(f"   ✓ Tổng số món: {len(all_menu_items)}")
-    
-    # Parse invoices
-    print(f"\n📖 Đang phân tích dữ liệu...")
-    invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
-    print(f"   ✓ Tìm thấy {len(invoices)} hóa đơn")
-    
-    if len(invoices) == 0:
-        print("\n⚠️  Không tìm thấy hóa đơn nào!")
-        return
+    print()
+    for idx, (file_path, payment_method) in enumerate(sources, 1):
+        print(f"📂 File {idx} ({payment_method or 'tự nhận diện'}): {Path(file_path).name}")
     
-    # Process invoices
-    _process_and_save_invoices(invoices, source_type, alcohol_items_found)
+    # Đọc lần lượt từng file (không gộp nội dung), ghi file ngay khi từng hóa đơn parse xong.
+    # File không đổi so với lần trước → dùng cache, không load menu / parse lại
+    return process_invoice_sources(sources, 'combined', jobs=jobs, incremental=incremental,
+                                   write_jobs=write_jobs, bundle=bundle)
 
 def process_single_file():
     """Process single file"""
@@ -1291,33 +2153,184 @@ def process_single_file():
     
     print(f"📋 Source type: {source_type}")
     
-    # Load content
-    with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-    
-    is_combined = 'sale_by_payment_method' in input_path.name.lower()
-    
-    # Load menus
-    print(f"\n📚 Đang load menu...")
-    all_menu_items, name_mapping, price_to_items = load_menus()
-    print(f"   ✓ Tổng số món: {len(all_menu_items)}")
-    
-    # Parse invoices
-    print(f"\n📖 Đang phân tích dữ liệu...")
-    invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
-    print(f"   ✓ Tìm thấy {len(invoices)} hóa đơn")
+    # Parse invoices (đọc streaming, không load cả file vào memory, có cache) và ghi file
+    # ngay khi từng hóa đơn parse xong
+    return process_invoice_sources([(input_path, None)], source_type)
+
+def ledger_context():
+    """Những gì ngoài file export ảnh hưởng tới file output: version parse, menu, cấu hình phí dịch vụ"""
+    menu_fp = menu_fingerprint(script_dir / menu_file for menu_file in MENU_FILES)
+    return f"v{PARSE_CACHE_VERSION}|{menu_fp}|{SERVICE_FEE_ENABLED}|{SERVICE_FEE_PERCENTAGE}|{SERVICE_FEE_NAME}|{SERVICE_FEE_UNIT}"
+
+def process_invoice_sources(sources, source_type, jobs=1, incremental=True, write_jobs=1, bundle=None):
+    """
+    Parse (có cache, có thể song song) và ghi file cho các file export trong sources.
+    incremental: chỉ match / ghi / báo cáo hóa đơn mới hoặc thay đổi so với ledger
+    (automation/invoice_ledger.py); False = ghi lại tất cả.
+    write_jobs: số process ghi file xlsx song song.
+    bundle (ZipFile, tùy chọn): ghi tất cả hóa đơn vào zip (automation/invoice_bundle.py) —
+    không tạo file trong tax_files/, không dùng / cập nhật ledger. Returns số file đã tạo.
+    """
+    output_dir = script_dir / OUTPUT_DIR
+    if bundle is not None:
+        # Zip phải có đủ hóa đơn của lần chạy; file không nằm trong tax_files/ nên không ghi ledger
+        ledger = None
+        context = None
+        unchanged = None
+    else:
+        ledger = load_ledger()
+        context = ledger_context()
+        unchanged = unchanged_invoice_hashes(ledger, context, output_dir) if incremental else None
+    
+    alcohol_items_found = []
+    skipped_ids = []
+    invoices = iter_invoices_cached(sources, alcohol_items_found, jobs=jobs,
+                                    unchanged=unchanged, skipped_ids=skipped_ids)
+    total_created = _process_and_save_invoices(invoices, source_type, alcohol_items_found,
+                                               ledger=ledger, ledger_context=context, write_jobs=write_jobs,
+                                               bundle=bundle)
+    if ledger is not None:
+        try:
+            save_ledger(ledger)
+        except OSError as e:
+            print(f"⚠️  Không ghi được ledger: {e}")
     
-    if len(invoices) == 0:
+    if skipped_ids:
+        print(f"⏭️  Bỏ qua {len(skipped_ids)} hóa đơn không thay đổi (file đã tạo từ lần chạy trước)")
+    elif total_created == 0:
         print("\n⚠️  Không tìm thấy hóa đơn nào!")
+    return total_created
+
+# ============================================================================
+# GHI FILE SONG SONG (--write-jobs N)
+# ============================================================================
+# Ghi xlsx (sinh XML + nén zip) tốn CPU. Hàng đợi giới hạn đưa hóa đơn cho write_jobs process
+# gọi create_invoice_file; kết quả lấy lại đúng thứ tự hóa đơn nên bảng in ra, cảnh báo
+# validate và tổng hợp bia/rượu giống hệt khi ghi tuần tự.
+
+def _write_invoice_task(task):
+    """Worker: ghi 1 file hóa đơn. task = (invoice, output_file); output_file None → trả về bytes xlsx"""
+    invoice, output_file = task
+    if output_file is None:
+        buffer = io.BytesIO()
+        create_invoice_file(invoice, buffer)
+        return buffer.getvalue()
+    create_invoice_file(invoice, output_file)
+
+def _prepare_invoice_files(invoices, source_type, output_dir, capture_logs=False):
+    """
+    Chuẩn bị từng hóa đơn trước khi ghi: thêm phí dịch vụ, tính tổng / VAT, tên file.
+    Yields dict invoice, total, final_with_tax, source_type, filename, log.
+    capture_logs: gom output print (parse + thêm phí dịch vụ) của từng hóa đơn vào 'log' để
+    in lại cùng dòng của hóa đơn đó (ghi song song đọc trước nhiều hóa đơn). Output còn lại
+    sau hóa đơn cuối (vd. tổng hợp bia/rượu của parser) nằm trong entry cuối, invoice = None.
+    """
+    invoices = iter(invoices)
+    while True:
+        log = io.StringIO()
+        with capture_stdout(log) if capture_logs else contextlib.nullcontext():
+            invoice = next(invoices, None)
+            if invoice is not None:
+                # Bước 1: Thêm phí dịch vụ vào hóa đơn (nếu được bật)
+                # Phí dịch vụ = 8% của tổng bill TRƯỚC khi có phí dịch vụ (chưa có VAT)
+                add_service_fee_to_invoice(invoice)
+        if invoice is None:
+            yield {'invoice': None, 'log': log.getvalue()}
+            return
+        report_job_progress(parsed=1)
+        
+        # Bước 2: Tính tổng bill sau khi đã có phí dịch vụ (chưa có VAT)
+        total = sum(item['quantity'] * item['price'] for item in invoice['items'])
+        
+        # Bước 3: Tính VAT 8% trên tổng bill đã có phí dịch vụ
+        final_with_tax = total * 1.08
+        total_str = f"{int(final_with_tax):,}".replace(',', '.')
+        
+        invoice_source_type = invoice.get('payment_method') or source_type
+        
+        yield {
+            'invoice': invoice,
+            'total': total,
+            'final_with_tax': final_with_tax,
+            'source_type': invoice_source_type,
+            'filename': output_dir / f"{invoice['invoice_id']} - {invoice_source_type} - {total_str}đ.xlsx",
+            'log': log.getvalue(),
+        }
+
+def _wait_written(pending, bundle=None):
+    future, entry = pending.popleft()
+    if future is not None:
+        data = future.result()  # Lỗi ghi file trong worker được raise lại ở đây
+        if bundle is not None:
+            add_invoice_to_bundle(bundle, entry['filename'].name, data)
+    return entry
+
+def _iter_written_invoices(entries, write_jobs=1, bundle=None):
+    """
+    Ghi file cho từng entry của _prepare_invoice_files và yield lại entry theo đúng thứ tự
+    khi file đã ghi xong. write_jobs > 1: ghi trên write_jobs process, tối đa
+    write_jobs * WRITE_QUEUE_PER_JOB file chờ ghi cùng lúc.
+    bundle (ZipFile, tùy chọn): workbook tạo trong memory và ghi vào zip thay vì ra file.
+    """
+    if write_jobs <= 1:
+        for entry in entries:
+            if entry['invoice'] is None:
+                pass
+            elif bundle is not None:
+                add_invoice_to_bundle(bundle, entry['filename'].name, _write_invoice_task((entry['invoice'], None)))
+            else:
+                create_invoice_file(entry['invoice'], str(entry['filename']))
+            yield entry
         return
     
-    # Process invoices
-    _process_and_save_invoices(invoices, source_type, alcohol_items_found)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=write_jobs) as executor:
+        for entry in entries:
+            future = None
+            if entry['invoice'] is not None:
+                output_file = None if bundle is not None else str(entry['filename'])
+                future = executor.submit(_write_invoice_task, (entry['invoice'], output_file))
+            pending.append((future, entry))
+            if len(pending) > write_jobs * WRITE_QUEUE_PER_JOB:
+                yield _wait_written(pending, bundle)
+        while pending:
+            yield _wait_written(pending, bundle)
+
+def invoice_replacement_rows(invoice):
+    """
+    Các dòng thay thế bia/rượu/Coke của hóa đơn (món có 'replaced' do parser gắn vào) cho
+    sổ thay thế. Giá sau điều chỉnh = giá ghi trong file (đã trừ giảm giá nếu có).
+    """
+    rows = []
+    for item in invoice['items']:
+        replaced = item.get('replaced')
+        if replaced:
+            rows.append({
+                **replaced,
+                'replacement_name': item['name'],
+                'replacement_unit': item['unit'],
+                'adjusted_price': item['price'],
+            })
+    return rows
 
-def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
-    """Helper function để process và save invoices"""
+def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None, ledger=None, ledger_context=None,
+                               write_jobs=1, bundle=None):
+    """
+    Helper function để process và save invoices.
+    invoices có thể là list hoặc generator (iter_invoices) — mỗi hóa đơn được ghi file
+    ngay khi nhận được. ledger (tùy chọn): ghi nhận hash + tên file của từng hóa đơn đã tạo.
+    write_jobs > 1: ghi file song song (output in ra không đổi).
+    bundle (ZipFile, tùy chọn): ghi các file vào zip thay vì tax_files/. Returns số file đã tạo.
+    File ghi vào tax_files/ được ghi nhận trong sổ thay thế bia/rượu (replacement_ledger) và
+    manifest tax_files (invoice_manifest).
+    """
     output_dir = script_dir / OUTPUT_DIR
-    output_dir.mkdir(exist_ok=True)
+    replacement_ledger = None
+    manifest = None
+    if bundle is None:
+        output_dir.mkdir(exist_ok=True)
+        replacement_ledger = open_replacement_ledger()
+        manifest = open_manifest(tax_dir=output_dir)
     
     print(f"\n📝 Đang tạo file cho từng hóa đơn...")
     print(f"    {'ID':<10} {'Món':<5} {'Tổng tiền':<15} {'Giảm giá':<30} {'Validate':<10}")
@@ -1331,27 +2344,36 @@ def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
     if SERVICE_FEE_ENABLED:
         print(f"\n💰 Phí dịch vụ đã được bật: {SERVICE_FEE_PERCENTAGE * 100:.0f}% của tổng bill")
     
-    for invoice in invoices:
-        # Bước 1: Thêm phí dịch vụ vào hóa đơn (nếu được bật)
-        # Phí dịch vụ = 8% của tổng bill TRƯỚC khi có phí dịch vụ (chưa có VAT)
-        add_service_fee_to_invoice(invoice)
-        
-        # Bước 2: Tính tổng bill sau khi đã có phí dịch vụ (chưa có VAT)
-        total = sum(item['quantity'] * item['price'] for item in invoice['items'])
-        
-        # Bước 3: Tính VAT 8% trên tổng bill đã có phí dịch vụ
-        final_with_tax = total * 1.08
-        total_str = f"{int(final_with_tax):,}".replace(',', '.')
-        
-        invoice_source_type = invoice.get('payment_method') or source_type
-        
-        filename = output_dir / f"{invoice['invoice_id']} - {invoice_source_type} - {total_str}đ.xlsx"
-        create_invoice_file(invoice, str(filename))
-        
-        # Track if this invoice has alcohol
-        if alcohol_items_found:
-            invoice_has_alcohol = any(item['invoice_id'] == invoice['invoice_id'] for item in alcohol_items_found)
-            if invoice_has_alcohol:
+    entries = _prepare_invoice_files(invoices, source_type, output_dir, capture_logs=write_jobs > 1)
+    try:
+        for entry in _iter_written_invoices(entries, write_jobs, bundle):
+            if entry['log']:
+                sys.stdout.write(entry['log'])
+            invoice = entry['invoice']
+            if invoice is None:
+                continue
+            total = entry['total']
+            final_with_tax = entry['final_with_tax']
+            invoice_source_type = entry['source_type']
+            filename = entry['filename']
+            
+            if ledger is not None:
+                # Hóa đơn thay đổi tổng tiền → tên file khác: xóa file cũ để không upload trùng
+                previous_file = record_invoice(ledger, invoice, filename.name, ledger_context)
+                if previous_file and previous_file != filename.name and (output_dir / previous_file).exists():
+                    (output_dir / previous_file).unlink()
+                    if manifest is not None:
+                        remove_manifest_files(manifest, [previous_file])
+            
+            if manifest is not None:
+                record_manifest_entry(manifest, manifest_entry(filename, invoice_file_rows(invoice)))
+            
+            replacements = invoice_replacement_rows(invoice)
+            if replacement_ledger is not None:
+                record_invoice_replacements(replacement_ledger, invoice['invoice_id'], filename.name, replacements)
+            
+            # Track if this invoice has alcohol
+            if replacements:
                 alcohol_invoices_info.append({
                     'invoice_id': invoice['invoice_id'],
                     'date': invoice.get('date', ''),
@@ -1359,28 +2381,37 @@ def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
                     'total_amount': final_with_tax,
                     'payment_method': invoice_source_type
                 })
-        
-        expected_final = total * 1.08
-        validation_status = "✓"
-        if invoice['final_total'] > 0:
-            diff = abs(expected_final - invoice['final_total'])
-            if diff > 10:
-                validation_status = f"⚠️ ±{diff:,.0f}"
-                validation_warnings.append({
-                    'id': invoice['invoice_id'],
-                    'calculated': expected_final,
-                    'actual': invoice['final_total'],
-                    'diff': diff
-                })
-        else:
-            validation_status = "N/A"
-        
-        discount_info = ""
-        if invoice['discount'] > 0 or invoice['payment_discount'] > 0:
-            discount_info = f"GG: {invoice['discount']:>7,.0f} + CK: {invoice['payment_discount']:>7,.0f}"
-        
-        print(f"   #{invoice['invoice_id']:<10} {len(invoice['items']):>3}  {total:>13,.0f}đ  {discount_info:<30} {validation_status}")
-        total_created += 1
+            
+            expected_final = total * 1.08
+            validation_status = "✓"
+            if invoice['final_total'] > 0:
+                diff = abs(expected_final - invoice['final_total'])
+                if diff > 10:
+                    validation_status = f"⚠️ ±{diff:,.0f}"
+                    validation_warnings.append({
+                        'id': invoice['invoice_id'],
+                        'calculated': expected_final,
+                        'actual': invoice['final_total'],
+                        'diff': diff
+                    })
+            else:
+                validation_status = "N/A"
+            
+            discount_info = ""
+            if invoice['discount'] > 0 or invoice['payment_discount'] > 0:
+                discount_info = f"GG: {invoice['discount']:>7,.0f} + CK: {invoice['payment_discount']:>7,.0f}"
+            
+            print(f"   #{invoice['invoice_id']:<10} {len(invoice['items']):>3}  {total:>13,.0f}đ  {discount_info:<30} {validation_status}")
+            total_created += 1
+            report_job_progress(written=1)
+    finally:
+        # Job bị hủy / lỗi giữa chừng: các file đã ghi vẫn được ghi nhận
+        if replacement_ledger is not None:
+            replacement_ledger.commit()
+            replacement_ledger.close()
+        if manifest is not None:
+            manifest.commit()
+            manifest.close()
     
     # Show warnings
     if validation_warnings:
@@ -1398,9 +2429,14 @@ def _process_and_save_invoices(invoices, source_type, alcohol_items_found=None):
     
     print("\n" + "=" * 70)
     print(f"✅ HOÀN THÀNH!")
-    print(f"📁 Thư mục: {OUTPUT_DIR}/")
+    if bundle is not None:
+        print(f"📦 File zip: {Path(bundle.filename).name if bundle.filename else 'stream'}")
+    else:
+        print(f"📁 Thư mục: {OUTPUT_DIR}/")
     print(f"📊 Tổng số file: {total_created}")
     print("=" * 70)
+    
+    return total_created
 
 # ============================================================================
 # TẠO FILE EXCEL TỔNG HỢP BIA/RƯỢU
@@ -1602,27 +2638,10 @@ def add_service_fee_to_invoice(invoice):
 # TẠO FILE EXCEL
 # ============================================================================
 
-def create_invoice_file(invoice, output_file):
-    """Tạo file Excel"""
-    workbook = xlsxwriter.Workbook(output_file)
-    worksheet = workbook.add_worksheet()
-    
-    header_format = workbook.add_format({'bold': True, 'bg_color': '#D9D9D9', 'border': 1})
-    cell_format = workbook.add_format({'border': 1})
-    number_format = workbook.add_format({'border': 1, 'num_format': '#,##0.00'})
-    
-    worksheet.set_column('A:A', 11.57)
-    worksheet.set_column('B:B', 9.14)
-    worksheet.set_column('C:C', 26.57)
-    worksheet.set_column('D:D', 13.71)
-    worksheet.set_column('E:E', 11.29)
-    worksheet.set_column('F:F', 11)
-    
-    headers = ['Tinh_chat', 'Ma_so', 'Ten_san_pham', 'Don_vi_tinh', 'So_luong', 'Don_gia']
-    for col, header in enumerate(headers):
-        worksheet.write(0, col, header, header_format)
-    
-    for row_idx, item in enumerate(invoice['items'], 1):
+def invoice_file_rows(invoice):
+    """Các dòng món ghi ra file: (tên đã chuẩn hóa, đơn vị, số lượng, đơn giá)"""
+    rows = []
+    for item in invoice['items']:
         # Đảm bảo tên món có format đúng trước khi ghi vào file
         item_name = item['name']
         
@@ -1635,22 +2654,80 @@ def create_invoice_file(invoice, output_file):
                 if ' / ' not in item_name:
                     item_name = f"{item_name} / {item_name}"
         
-        worksheet.write(row_idx, 0, 1, cell_format)
-        worksheet.write(row_idx, 1, '', cell_format)
-        worksheet.write(row_idx, 2, item_name, cell_format)
         # Phí dịch vụ: để trống đơn vị, nhưng vẫn có số lượng = 1
         unit_value = item['unit'] if item['unit'] else ''
-        worksheet.write(row_idx, 3, unit_value, cell_format)
-        # Số lượng = 1 cho phí dịch vụ
-        worksheet.write(row_idx, 4, float(item['quantity']), number_format)
-        worksheet.write(row_idx, 5, float(item['price']), number_format)
-    
-    workbook.close()
+        rows.append((item_name, unit_value, float(item['quantity']), float(item['price'])))
+    return rows
+
+def create_invoice_file(invoice, output_file, created=None, writer=None):
+    """
+    Tạo file Excel. created: datetime ghi vào thuộc tính file (mặc định: lúc tạo)
+    writer: 'template' / 'xlsxwriter' (mặc định INVOICE_WRITER)
+    """
+    rows = invoice_file_rows(invoice)
+    if (writer or INVOICE_WRITER) == 'template':
+        write_invoice_template(rows, output_file, created)
+    else:
+        write_invoice_xlsxwriter(rows, output_file, created)
 
 # ============================================================================
 # MAIN FUNCTION
 # ============================================================================
 
+def parse_zip_arg(args):
+    """Tách '--zip FILE' / '--zip=FILE' khỏi danh sách tham số. Returns (các tham số còn lại, FILE hoặc None)"""
+    remaining = []
+    zip_path = None
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '--zip' and i + 1 < len(args):
+            zip_path = args[i + 1]
+            i += 1
+        elif arg.startswith('--zip='):
+            zip_path = arg.split('=', 1)[1]
+        else:
+            remaining.append(arg)
+        i += 1
+    return remaining, zip_path
+
+def _run_cli_sources(args, jobs, write_jobs, full, bundle=None):
+    """Xử lý các file export truyền trên dòng lệnh (không có → file mặc định)"""
+    if not args:
+        process_sale_by_payment_method(jobs=jobs, incremental=not full, write_jobs=write_jobs, bundle=bundle)
+        return
+    
+    if len(args) > 1 or '=' in args[0]:
+        sources = []
+        for arg in args:
+            file_name, payment_method = parse_source_arg(arg)
+            file_path = script_dir / file_name
+            if not file_path.exists():
+                print(f"\n❌ File không tồn tại: {file_name}")
+                sys.exit(1)
+            sources.append((file_path, payment_method))
+        process_sale_by_payment_method(sources, jobs=jobs, incremental=not full, write_jobs=write_jobs,
+                                       bundle=bundle)
+        return
+    
+    input_file = args[0]
+    input_path = script_dir / input_file
+    
+    if not input_path.exists():
+        print(f"\n❌ File không tồn tại: {input_file}")
+        sys.exit(1)
+    
+    input_basename = input_path.name.lower()
+    if 'atm' in input_basename:
+        source_type = 'atm'
+    elif 'transfer' in input_basename:
+        source_type = 'transfer'
+    else:
+        source_type = input_path.stem
+    
+    process_invoice_sources([(input_path, None)], source_type, jobs=jobs, incremental=not full,
+                            write_jobs=write_jobs, bundle=bundle)
+
 def main():
     """Main function với menu chọn option"""
     
@@ -1659,33 +2736,21 @@ def main():
     print("=" * 70)
     
     # Check if command line argument provided (backward compatibility)
-    if len(sys.argv) >= 2:
-        input_file = sys.argv[1]
-        input_path = script_dir / input_file
-        
-        if not input_path.exists():
-            print(f"\n❌ File không tồn tại: {input_file}")
-            sys.exit(1)
-        
-        # Load menus
-        print(f"\n📚 Đang load menu...")
-        all_menu_items, name_mapping, price_to_items = load_menus()
-        
-        # Load content
-        with open(input_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-        
-        input_basename = input_path.name.lower()
-        if 'atm' in input_basename:
-            source_type = 'atm'
-        elif 'transfer' in input_basename:
-            source_type = 'transfer'
-        else:
-            source_type = input_path.stem
-        
-        is_combined = 'sale_by_payment_method' in input_path.name.lower()
-        invoices, alcohol_items_found = parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items, is_combined)
-        _process_and_save_invoices(invoices, source_type, alcohol_items_found)
+    # Nhiều file: python3 process_invoices.py "a.xls=transfer" "b.xls=atm" "c.xls=cod"
+    # Parse song song: thêm --jobs N (vd. --jobs 4); ghi file song song: --write-jobs N
+    # Mặc định chỉ xử lý hóa đơn mới / thay đổi (ledger); --full để ghi lại tất cả
+    # Ghi tất cả hóa đơn vào 1 file zip: --zip hoa_don.zip (không có file input → file mặc định)
+    args, jobs = parse_jobs_arg(sys.argv[1:])
+    args, write_jobs = parse_jobs_arg(args, '--write-jobs', '-w')
+    args, zip_path = parse_zip_arg(args)
+    full = '--full' in args
+    args = [arg for arg in args if arg != '--full']
+    if zip_path:
+        with open_invoice_bundle(zip_path) as bundle:
+            _run_cli_sources(args, jobs, write_jobs, full, bundle)
+        return
+    if args:
+        _run_cli_sources(args, jobs, write_jobs, full)
         return
     
     # Interactive menu
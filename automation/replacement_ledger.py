@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+SỔ THAY THẾ BIA/RƯỢU/COKE (SQLITE)
+==================================
+Ghi lại ngay lúc tạo file, thay vì đoán lại từ giá trong file xlsx (3 chữ số cuối khác 0,
+dò giá menu ±10.000đ):
+
+- Parse file export (_process_and_save_invoices): mỗi món thuế 10% đã được thay bằng món
+  thuế 8% → 1 dòng (món gốc, giá gốc, món thay thế, giá sau điều chỉnh, tiền thuế cộng thêm)
+- Hóa đơn bia/rượu hằng ngày (run_beverage_replacement): hóa đơn bị thay → 1 dòng
+  (món gốc = file hóa đơn cũ, giá gốc = tổng cũ, món thay thế = các món bia/rượu)
+
+Bảng invoices ghi mọi file đã tạo (kể cả không có thay thế) → file có trong bảng nhưng không
+có dòng thay thế = chắc chắn không có; file không có trong bảng (tạo trước khi có sổ) →
+checker dùng lại cách đoán theo giá. Tra cứu theo mã hóa đơn / tên file qua index.
+"""
+
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# ============================================================================
+# CẤU HÌNH
+# ============================================================================
+
+REPLACEMENT_LEDGER_FILE = PROJECT_ROOT / "replacement_ledger.sqlite3"
+
+# Nguồn của 1 file hóa đơn trong sổ
+KIND_PARSE = 'parse'                 # tạo từ file export (process_invoices)
+KIND_BEVERAGE = 'beverage_invoice'   # hóa đơn bia/rượu thay hóa đơn cũ (daily_beverage_invoices)
+
+REPLACEMENT_FIELDS = ('original_name', 'original_unit', 'quantity', 'original_price',
+                      'replacement_name', 'replacement_unit', 'adjusted_price', 'tax_delta')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    invoice_id TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_file ON invoices(file);
+CREATE TABLE IF NOT EXISTS replacements (
+    invoice_id TEXT NOT NULL,
+    original_name TEXT NOT NULL,
+    original_unit TEXT,
+    quantity REAL NOT NULL,
+    original_price REAL NOT NULL,
+    replacement_name TEXT NOT NULL,
+    replacement_unit TEXT,
+    adjusted_price REAL NOT NULL,
+    tax_delta REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_replacements_invoice ON replacements(invoice_id);
+"""
+
+# ============================================================================
+# GHI
+# ============================================================================
+
+
+def open_replacement_ledger(path=None):
+    """Mở sổ (tạo bảng nếu chưa có). Ghi xong gọi commit() / close() như connection sqlite3"""
+    conn = sqlite3.connect(str(path or REPLACEMENT_LEDGER_FILE), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def record_invoice_replacements(conn, invoice_id, file_name, replacements, kind=KIND_PARSE):
+    """
+    Ghi (thay thế bản ghi cũ của cùng mã hóa đơn) file vừa tạo + các dòng thay thế.
+    replacements: list dict theo REPLACEMENT_FIELDS (có thể rỗng). Không commit.
+    """
+    invoice_id = str(invoice_id)
+    conn.execute("DELETE FROM replacements WHERE invoice_id = ?", (invoice_id,))
+    conn.execute(
+        "INSERT OR REPLACE INTO invoices (invoice_id, file, kind, updated) VALUES (?, ?, ?, ?)",
+        (invoice_id, file_name, kind, datetime.now().isoformat(timespec='seconds')))
+    if replacements:
+        conn.executemany(
+            f"INSERT INTO replacements (invoice_id, {', '.join(REPLACEMENT_FIELDS)}) "
+            f"VALUES (?{', ?' * len(REPLACEMENT_FIELDS)})",
+            [(invoice_id, *(row.get(field) for field in REPLACEMENT_FIELDS)) for row in replacements])
+
+# ============================================================================
+# ĐỌC
+# ============================================================================
+
+
+def _replacement_rows(conn, invoice_id):
+    return [dict(row) for row in conn.execute(
+        f"SELECT {', '.join(REPLACEMENT_FIELDS)} FROM replacements WHERE invoice_id = ?", (invoice_id,))]
+
+
+def file_replacements(conn, file_name):
+    """Returns (invoice_id, kind, list dòng thay thế) của file trong tax_files, hoặc None nếu file không có trong sổ"""
+    row = conn.execute("SELECT invoice_id, kind FROM invoices WHERE file = ?", (file_name,)).fetchone()
+    if row is None:
+        return None
+    return row['invoice_id'], row['kind'], _replacement_rows(conn, row['invoice_id'])
+
+
+def invoices_by_kind(conn, kind):
+    """{file: invoice_id} của các file cùng nguồn (vd. KIND_BEVERAGE)"""
+    return {row['file']: row['invoice_id'] for row in conn.execute(
+        "SELECT file, invoice_id FROM invoices WHERE kind = ?", (kind,))}
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+PHÂN LOẠI THUẾ MÓN (8% / 10%)
+=============================
+Một nơi duy nhất quyết định món nào tính thuế 10%:
+    - bia / rượu (theo Tên nhóm menu hoặc từ khóa trong tên)
+    - Coke (Coca-Cola) THƯỜNG — có 10% đường
+Coke Light / Coke Zero / ít đường / không đường có lượng đường < 10g nên vẫn tính 8%.
+
+Tên món được quét 1 lần bằng automaton nhiều từ khóa (kiểu Aho-Corasick) thay vì
+lặp any(kw in name) cho từng danh sách; kết quả được nhớ theo từng tên.
+Dùng chung cho process_invoices (load menu, match món, thay thế bia/rượu, Grab)
+và check_invoices.
+"""
+
+import functools
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# ============================================================================
+# CẤU HÌNH TỪ KHÓA
+# ============================================================================
+
+# Nhóm được xem là bia/rượu (tính thuế 10%): chỉ các nhóm sau trong menu
+ALCOHOL_GROUPS = {'BEER & CRAFT BEERS', 'SANGRIA', 'RED', 'WHITE'}
+
+# Từ khóa bia/rượu: khớp ở bất kỳ vị trí nào trong tên
+ALCOHOL_KEYWORDS = [
+    'bia', 'beer', 'heineken', 'tiger', 'saigon', '333', 'sapporo', 'craft',
+    'rượu', 'wine', 'sangria', 'whisky', 'whiskey', 'vodka', 'tequila', 'soju',
+    'champagne', 'martini', 'margarita',
+]
+# Từ khóa ngắn / dễ trùng: chỉ khớp nguyên từ ('gin' không khớp 'Ginger Ale')
+ALCOHOL_WORD_KEYWORDS = ['gin', 'rum', 'sake', 'cocktail']
+
+COKE_KEYWORDS = ['coke', 'coca']
+# Coke Light / Zero / ít đường: thuế 8%
+COKE_EXCLUDE_KEYWORDS = [
+    'light', 'zero', 'ít đường', 'không đường', 'it duong', 'khong duong', 'less sugar', 'no sugar',
+]
+
+# Loại thuế
+TAX_STANDARD = 'standard'   # 8%
+TAX_ALCOHOL = 'alcohol'     # 10% - bia/rượu
+TAX_COKE = 'coke'           # 10% - Coke thường (10% đường)
+
+# Cờ trả về của automaton
+FLAG_ALCOHOL = 1
+FLAG_COKE = 2
+FLAG_COKE_EXCLUDE = 4
+
+# ============================================================================
+# AUTOMATON NHIỀU TỪ KHÓA
+# ============================================================================
+
+
+def build_keyword_automaton(keywords):
+    """
+    keywords: list of (từ khóa, cờ, chỉ khớp nguyên từ).
+    Returns dict automaton: goto (list dict ký tự -> state), fail, output (list of
+    (độ dài từ khóa, cờ, nguyên từ)) — output của state đã gộp theo fail link.
+    """
+    goto = [{}]
+    output = [[]]
+    for keyword, flag, whole_word in keywords:
+        state = 0
+        for char in keyword:
+            if char not in goto[state]:
+                goto.append({})
+                output.append([])
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        output[state].append((len(keyword), flag, whole_word))
+
+    # BFS dựng fail link
+    fail = [0] * len(goto)
+    queue = list(goto[0].values())
+    for state in queue:
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(char, 0)
+            output[next_state] = output[next_state] + output[fail[next_state]]
+    return {'goto': goto, 'fail': fail, 'output': output}
+
+
+def scan_keyword_flags(automaton, text):
+    """Quét text 1 lần, OR cờ của mọi từ khóa khớp (kiểm tra ranh giới từ nếu cần)"""
+    goto = automaton['goto']
+    fail = automaton['fail']
+    output = automaton['output']
+    flags = 0
+    state = 0
+    for end, char in enumerate(text):
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        for length, flag, whole_word in output[state]:
+            if whole_word:
+                start = end - length + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end + 1 < len(text) and text[end + 1].isalnum():
+                    continue
+            flags |= flag
+    return flags
+
+
+_TAX_AUTOMATON = build_keyword_automaton(
+    [(kw, FLAG_ALCOHOL, False) for kw in ALCOHOL_KEYWORDS] +
+    [(kw, FLAG_ALCOHOL, True) for kw in ALCOHOL_WORD_KEYWORDS] +
+    [(kw, FLAG_COKE, False) for kw in COKE_KEYWORDS] +
+    [(kw, FLAG_COKE_EXCLUDE, False) for kw in COKE_EXCLUDE_KEYWORDS]
+)
+
+# ============================================================================
+# PHÂN LOẠI
+# ============================================================================
+
+
+@functools.lru_cache(maxsize=65536)
+def tax_name_flags(name):
+    """Cờ FLAG_* của 1 tên món (không phân biệt hoa thường), nhớ theo từng tên"""
+    return scan_keyword_flags(_TAX_AUTOMATON, str(name or '').lower())
+
+
+def tax_class_from_flags(flags):
+    if flags & FLAG_ALCOHOL:
+        return TAX_ALCOHOL
+    if flags & FLAG_COKE and not flags & FLAG_COKE_EXCLUDE:
+        return TAX_COKE
+    return TAX_STANDARD
+
+
+def classify_tax_names(*names, group=None):
+    """
+    Loại thuế của 1 món theo Tên nhóm menu + 1 hoặc nhiều tên (VD tên gốc trên POS và
+    tên đã match menu). Từ khóa Light/Zero ở bất kỳ tên nào cũng loại trừ Coke.
+    """
+    if group and str(group).strip().upper() in ALCOHOL_GROUPS:
+        return TAX_ALCOHOL
+    flags = 0
+    for name in names:
+        flags |= tax_name_flags(name)
+    return tax_class_from_flags(flags)
+
+
+def classify_menu_item(item):
+    """Loại thuế của 1 món trong menu (dict có 'name', có thể có 'group')"""
+    return classify_tax_names(item.get('name', ''), group=item.get('group'))
+
+
+def is_tax_10_name(name):
+    """Tên món (không có nhóm menu) có tính thuế 10% không"""
+    return classify_tax_names(name) != TAX_STANDARD
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Benchmark các bước xử lý hóa đơn trên file export giả lập (synthetic)
+
+Sử dụng:
+    python3 benchmark_invoices.py parse [--rows 100000]
+    python3 benchmark_invoices.py classify [--rows 100000]
+    python3 benchmark_invoices.py jobs [--rows 100000] [--jobs 4]
+    python3 benchmark_invoices.py menu [--rows 50000]
+    python3 benchmark_invoices.py xlsx [--count 1000]
+
+- parse: so sánh parser cũ (đọc cả file + split('<tr>')) với parser streaming
+- classify: so sánh vòng lặp cửa sổ 4 cell cũ với bộ phân loại cell (scan_item_windows)
+- jobs: parse tuần tự so với parse song song theo shard (iter_invoices(jobs=N))
+- menu: thời gian import (cold start) + đọc file menu xlsx lớn: ElementTree đọc cả sheet
+  (code cũ), iterparse streaming (parse_excel_menu) và pandas (nếu có)
+- xlsx: ghi file hóa đơn bằng xlsxwriter so với template dựng sẵn (invoice_xlsx), kiểm tra
+  file giống hệt từng byte và openpyxl đọc lại đúng dữ liệu
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from automation.process_invoices import (
+    load_menus,
+    get_menu_index,
+    generate_random_items_with_target,
+    solve_grab_basket,
+    grab_items_check,
+    GRAB_MAX_PRICE_ADJUSTMENT,
+    iter_invoices,
+    parse_invoices_from_html,
+    parse_invoices_from_file,
+    invoice_file_rows,
+)
+from automation.invoice_xlsx import write_invoice_template, write_invoice_xlsxwriter
+from automation.export_reader import extract_cells, iter_export_rows, scan_item_windows
+from Menu.parse_menu import parse_excel_menu, _load_pandas, _parse_menu_pandas
+
+# ============================================================================
+# TẠO FILE EXPORT GIẢ LẬP
+# ============================================================================
+
+SYNTHETIC_HEADERS = [
+    'STT', 'Mã hoá đơn', 'Ngày', 'Giờ vào', 'Giờ ra', 'Bàn', 'Nhân viên', 'Số khách',
+    'Tên món', 'Số lượng', 'Đơn vị', 'Đơn giá', 'Thành tiền món', 'Ghi chú',
+    'Khu vực', 'Tổng tiền', 'Giảm giá', 'Phí dịch vụ', 'VAT', 'Tiền mặt',
+    'Chiết khấu thanh toán', 'Phương thức thanh toán', 'Thành tiền',
+]
+# Các cột theo từng món (không có rowspan)
+SYNTHETIC_ITEM_COLUMNS = range(8, 14)
+
+FALLBACK_ITEMS = [
+    ('Taco Gà / Chicken Taco', 'Phần', 55000),
+    ('Burrito Bò / Beef Burrito', 'Phần', 120000),
+    ('Khoai Tây Chiên / French Fries', 'Phần', 75000),
+    ('Bia 333 / 333', 'Lon', 35000),
+    ('Coke / Coke', 'Lon', 25000),
+]
+
+
+def _fmt(value):
+    return f"{int(value):,}"
+
+
+def make_synthetic_export(file_path, n_rows, seed=0, menu_items=None):
+    """
+    Ghi file HTML giống format B07 sale_by_payment_method với khoảng n_rows row món.
+    Mỗi hóa đơn có 1-6 món; các cột cấp hóa đơn dùng rowspan như file thật.
+    """
+    rng = random.Random(seed)
+    if menu_items:
+        pool = [(m['name'].split(' / ')[-1], m['unit'], m['price']) for m in menu_items]
+    else:
+        pool = [(name.split(' / ')[-1], unit, price) for name, unit, price in FALLBACK_ITEMS]
+
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('<html><head><meta charset="utf-8"></head><body><table border="1"><thead>\n')
+        f.write('<tr>' + ''.join(f'<th>{h}</th>' for h in SYNTHETIC_HEADERS) + '</tr>\n')
+        f.write('</thead><tbody>\n')
+
+        rows_written = 0
+        invoice_no = 0
+        while rows_written < n_rows:
+            invoice_no += 1
+            n_items = rng.randint(1, 6)
+            items = [rng.choice(pool) for _ in range(n_items)]
+            quantities = [rng.randint(1, 4) for _ in range(n_items)]
+            total = sum(price * qty for (_, _, price), qty in zip(items, quantities))
+            discount = rng.choice([0, 0, 0, 10000, 20000])
+            final_total = (total - discount) * 1.08
+            method = rng.choice(['TRANSFER (Chuyển khoản)', 'ATM (Thẻ)'])
+            rs = f' rowspan="{n_items}"'
+
+            for idx, ((name, unit, price), qty) in enumerate(zip(items, quantities)):
+                item_cells = [name, str(qty), unit, _fmt(price), _fmt(price * qty), '']
+                if idx == 0:
+                    invoice_cells = [
+                        f'<td{rs}>{invoice_no}</td>',
+                        f'<td{rs}>{240000 + invoice_no % 760000:06d}</td>',
+                        f'<td{rs}>{rng.randint(1, 28):02d}/01/2026</td>',
+                        f'<td{rs}>11:00</td>', f'<td{rs}>12:00</td>',
+                        f'<td{rs}>B{rng.randint(1, 20)}</td>', f'<td{rs}>NV01</td>',
+                        f'<td{rs}>{rng.randint(1, 6)}</td>',
+                    ]
+                    tail_cells = [
+                        f'<td{rs}>Tầng 1</td>',
+                        f'<td{rs}>{_fmt(total)}</td>', f'<td{rs}>{_fmt(discount)}</td>',
+                        f'<td{rs}>0</td>', f'<td{rs}>{_fmt(total * 0.08)}</td>', f'<td{rs}>0</td>',
+                        f'<td{rs}>0</td>', f'<td{rs}>{method}</td>',
+                        f'<td{rs}>{_fmt(final_total)}</td>',
+                    ]
+                    cells = invoice_cells + [f'<td>{c}</td>' for c in item_cells] + tail_cells
+                else:
+                    cells = [f'<td>{c}</td>' for c in item_cells]
+                f.write('<tr>' + ''.join(cells) + '</tr>\n')
+                rows_written += 1
+
+        f.write('</tbody></table></body></html>\n')
+    return invoice_no
+
+# ============================================================================
+# ĐO THỜI GIAN / MEMORY
+# ============================================================================
+
+
+def _measure(func, repeat=1):
+    """Chạy func, trả về (kết quả, thời gian tốt nhất (s), peak memory (bytes))"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def _print_row(label, seconds, peak):
+    print(f"   {label:<32} {seconds:>8.2f}s   peak {peak / 1024 / 1024:>8.1f} MB")
+
+
+def bench_parse(args):
+    """So sánh parser split-based với parser streaming"""
+    all_menu_items, name_mapping, price_to_items = load_menus()
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = os.path.join(tmp, 'sale_by_payment_method.xls')
+        n_invoices = make_synthetic_export(export_path, args.rows, menu_items=all_menu_items)
+        size_mb = os.path.getsize(export_path) / 1024 / 1024
+        print(f"📄 File giả lập: {args.rows:,} rows, {n_invoices:,} hóa đơn, {size_mb:.1f} MB")
+
+        def split_based():
+            random.seed(0)  # món thay thế bia/rượu chọn random → cố định seed để so sánh
+            with open(export_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+            return parse_invoices_from_html(content, all_menu_items, name_mapping, price_to_items)
+
+        def streaming():
+            random.seed(0)
+            return parse_invoices_from_file(export_path, all_menu_items, name_mapping, price_to_items)
+
+        (old_invoices, _), old_time, old_peak = _measure(split_based, args.repeat)
+        (new_invoices, _), new_time, new_peak = _measure(streaming, args.repeat)
+
+        _print_row('split-based (đọc cả file)', old_time, old_peak)
+        _print_row('streaming (iter_export_rows)', new_time, new_peak)
+        same = old_invoices == new_invoices
+        print(f"   Số hóa đơn: {len(old_invoices):,} / {len(new_invoices):,} | "
+              f"Kết quả giống nhau: {'✓' if same else '✗'}")
+
+
+def legacy_row_items(cells):
+    """Vòng lặp cửa sổ 4 cell trước khi có classify_cells (giữ lại để so sánh)"""
+    items = []
+    for i in range(len(cells) - 3):
+        try:
+            name = cells[i]
+            qty_candidate = cells[i + 1]
+            unit_candidate = cells[i + 2]
+            price_candidate = cells[i + 3]
+            if not (qty_candidate.isdigit() and 1 <= int(qty_candidate) <= 200):
+                continue
+            qty = int(qty_candidate)
+            price_clean = price_candidate.replace(' ', '').replace(',', '').replace('.', '')
+            if not price_clean.isdigit():
+                continue
+            price_value = float(price_clean)
+            unit = unit_candidate if unit_candidate and not unit_candidate.isdigit() else 'Phần'
+            if (len(name) < 1 or
+                    name in ['', 'STT', 'Mã hoá đơn', 'Simple Place']):
+                continue
+            skip_patterns = [
+                r'\bcrispy\b', r'\bsoft\b', r'cut in 4', r'- edit\s*$',
+                r'đổi phương thức', r'\bpayment\b', r'\btransfer\b',
+                r'\bcod\b', r'\batm\b', 'background-color', 'vertical-align',
+                'ghi chú', 'giảm sốt'
+            ]
+            if any(re.search(pattern, name.lower()) for pattern in skip_patterns):
+                continue
+            if (price_value >= 500 and price_value <= 2000000 and
+                    qty >= 1 and qty <= 200 and len(name) > 2):
+                items.append((name, qty, unit, price_value))
+        except (ValueError, IndexError):
+            continue
+    return items
+
+
+def bench_classify(args):
+    """So sánh vòng lặp tìm món cũ với scan_item_windows trên toàn bộ row của file lớn"""
+    all_menu_items, _, _ = load_menus()
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = os.path.join(tmp, 'sale_by_payment_method.xls')
+        make_synthetic_export(export_path, args.rows, menu_items=all_menu_items)
+        all_cells = [extract_cells(row) for row in iter_export_rows(export_path)]
+    n_cells = sum(len(cells) for cells in all_cells)
+    print(f"📄 {len(all_cells):,} rows, {n_cells:,} cells")
+
+    def run(func):
+        return [func(cells) for cells in all_cells]
+
+    old_items, old_time, old_peak = _measure(lambda: run(legacy_row_items), args.repeat)
+    new_items, new_time, new_peak = _measure(lambda: run(scan_item_windows), args.repeat)
+    _print_row('cửa sổ 4 cell (cũ)', old_time, old_peak)
+    _print_row('classify_cells + tag', new_time, new_peak)
+    print(f"   Tăng tốc: x{old_time / new_time:.1f} | "
+          f"Kết quả giống nhau: {'✓' if old_items == new_items else '✗'}")
+
+
+def bench_jobs(args):
+    """So sánh parse tuần tự với parse song song theo shard"""
+    all_menu_items, name_mapping, price_to_items = load_menus()
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = os.path.join(tmp, 'sale_by_payment_method.xls')
+        n_invoices = make_synthetic_export(export_path, args.rows, menu_items=all_menu_items)
+        print(f"📄 File giả lập: {args.rows:,} rows, {n_invoices:,} hóa đơn | CPU: {os.cpu_count()}")
+
+        def run(jobs):
+            return list(iter_invoices(export_path, all_menu_items, name_mapping, price_to_items, jobs=jobs))
+
+        serial, serial_time, serial_peak = _measure(lambda: run(1), args.repeat)
+        parallel, parallel_time, parallel_peak = _measure(lambda: run(args.jobs), args.repeat)
+        _print_row('tuần tự (jobs=1)', serial_time, serial_peak)
+        _print_row(f'song song (jobs={args.jobs}, process chính)', parallel_time, parallel_peak)
+        same_ids = [inv['invoice_id'] for inv in serial] == [inv['invoice_id'] for inv in parallel]
+        print(f"   Tăng tốc: x{serial_time / parallel_time:.1f} | "
+              f"Cùng thứ tự hóa đơn: {'✓' if same_ids else '✗'}")
+
+
+def make_synthetic_menu(file_path, n_rows, seed=0):
+    """Ghi file menu .xlsx (header Ten_san_pham / Don_vi_tinh / Don_gia như taco-place-menu)"""
+    import xlsxwriter
+
+    rng = random.Random(seed)
+    workbook = xlsxwriter.Workbook(file_path)
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, ['Ten_san_pham', 'Don_vi_tinh', 'Don_gia'])
+    for row in range(1, n_rows + 1):
+        name, unit, price = rng.choice(FALLBACK_ITEMS)
+        worksheet.write_row(row, 0, [f"{name} {row}", unit, price + rng.randint(0, 20) * 1000])
+    workbook.close()
+
+
+def legacy_parse_menu_xml(filepath):
+    """Đường ElementTree cũ của parse_excel_menu: đọc cả sheet vào bộ nhớ (giữ lại để so sánh)"""
+    ns = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    menu_items = []
+    with zipfile.ZipFile(filepath, 'r') as zip_ref:
+        strings = []
+        try:
+            strings_root = ET.fromstring(zip_ref.read('xl/sharedStrings.xml'))
+            for t in strings_root.findall('.//main:t', ns):
+                strings.append(t.text if t.text else '')
+        except KeyError:
+            pass
+        sheet_root = ET.fromstring(zip_ref.read('xl/worksheets/sheet1.xml'))
+        for row in sheet_root.findall('.//main:row', ns)[1:]:
+            cells = row.findall('./main:c', ns)
+            if len(cells) < 3:
+                continue
+            values = []
+            for cell in cells[:3]:
+                v = cell.find('./main:v', ns)
+                text = v.text if v is not None and v.text else ''
+                values.append(strings[int(text)] if cell.get('t') == 's' and text else text)
+            name, unit, price = values
+            try:
+                price = float(price) if price else 0
+            except ValueError:
+                continue
+            if name and price > 0:
+                menu_items.append({'name': name.strip(), 'unit': unit.strip() or 'Phần', 'price': price})
+    return menu_items
+
+
+def _import_seconds(statement, repeat=3):
+    """Thời gian chạy `python -c statement` trong process mới (cold start), lấy lần tốt nhất"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=BASE_DIR, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_menu(args):
+    """Cold start + đọc file menu lớn: ElementTree cũ vs iterparse streaming vs pandas"""
+    pd = _load_pandas()
+    print("🚀 Cold start (process mới):")
+    base_time = _import_seconds('pass')
+    print(f"   {'python (không import gì)':<32} {base_time:>8.2f}s")
+    menu_time = _import_seconds('import Menu.parse_menu')
+    print(f"   {'import Menu.parse_menu':<32} {menu_time:>8.2f}s")
+    if pd is not None:
+        pandas_time = _import_seconds('import pandas')
+        print(f"   {'import pandas (code cũ)':<32} {pandas_time:>8.2f}s")
+    else:
+        print("   (không có pandas: code cũ dùng đường ElementTree)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        menu_path = os.path.join(tmp, 'menu.xlsx')
+        make_synthetic_menu(menu_path, args.rows)
+        size_mb = os.path.getsize(menu_path) / 1024 / 1024
+        print(f"\n📄 Menu giả lập: {args.rows:,} dòng, {size_mb:.1f} MB")
+
+        old_items, old_time, old_peak = _measure(lambda: legacy_parse_menu_xml(menu_path), args.repeat)
+        new_items, new_time, new_peak = _measure(lambda: parse_excel_menu(menu_path), args.repeat)
+        _print_row('ElementTree cả sheet (cũ)', old_time, old_peak)
+        _print_row('iterparse streaming', new_time, new_peak)
+        if pd is not None:
+            pd_items, pd_time, pd_peak = _measure(lambda: _parse_menu_pandas(menu_path, pd), args.repeat)
+            _print_row('pandas read_excel + iterrows', pd_time, pd_peak)
+            print(f"   Giống pandas: {'✓' if pd_items == new_items else '✗'}")
+        print(f"   µs/dòng: cũ {old_time / args.rows * 1e6:.1f} | streaming {new_time / args.rows * 1e6:.1f} | "
+              f"Kết quả giống nhau: {'✓' if old_items == new_items else '✗'}")
+
+
+def _grab_exact(items, target, menu_by_name):
+    """Bộ món đạt yêu cầu của create_grab_invoice: chênh lệch < 1 VND, món cuối lệch giá <= giới hạn"""
+    if not items:
+        return False
+    difference, adjustment = grab_items_check(items, target, menu_by_name)
+    return difference < 1 and adjustment <= GRAB_MAX_PRICE_ADJUSTMENT
+
+
+def legacy_grab_items(menu_items, target, menu_by_name, max_retries=20, vectorized=False):
+    """Vòng retry cũ của create_grab_invoice quanh generate_random_items_with_target"""
+    items = None
+    for _ in range(max_retries):
+        items = generate_random_items_with_target(menu_items, target, vectorized=vectorized)
+        if _grab_exact(items, target, menu_by_name):
+            break
+    return items
+
+
+def bench_grab(args):
+    """Hóa đơn Grab: generator random + retry (cũ) vs NumPy vs solver knapsack, trên các tổng tiền ngẫu nhiên"""
+    all_menu_items, _, _ = load_menus()
+    menu_by_source = get_menu_index(all_menu_items)['by_source']
+    rng = random.Random(args.seed)
+    totals = [rng.randint(args.min_total, args.max_total) for _ in range(args.count)]
+    for source, menu_items in menu_by_source.items():
+        menu_by_name = get_menu_index(menu_items)['by_name']
+        print(f"\n📋 Menu {source}: {len(menu_items)} món, {len(totals)} tổng tiền "
+              f"{args.min_total:,}-{args.max_total:,} VND")
+        modes = (
+            ('random + 20 retry (cũ)', lambda target: legacy_grab_items(menu_items, target, menu_by_name)),
+            ('random NumPy + 20 retry', lambda target: legacy_grab_items(
+                menu_items, target, menu_by_name, vectorized=True)),
+            ('solver knapsack', lambda target: solve_grab_basket(menu_items, target)),
+        )
+        for label, func in modes:
+            random.seed(args.seed)
+            start = time.perf_counter()
+            exact = 0
+            for total in totals:
+                target = total / 1.08
+                exact += _grab_exact(func(target), target, menu_by_name)
+            elapsed = time.perf_counter() - start
+            print(f"   {label:<32} {elapsed / len(totals) * 1000:>8.1f} ms/hóa đơn | "
+                  f"chính xác {exact}/{len(totals)}")
+
+
+def bench_xlsx(args):
+    """Ghi file hóa đơn: xlsxwriter (1 Workbook / file) vs template dựng sẵn"""
+    import openpyxl
+    from datetime import datetime
+
+    all_menu_items, name_mapping, price_to_items = load_menus()
+    created = datetime(2024, 1, 1, 12, 0, 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = os.path.join(tmp, 'sale_by_payment_method.xls')
+        random.seed(args.seed)
+        make_synthetic_export(export_path, args.count * 8, seed=args.seed, menu_items=all_menu_items)
+        with contextlib.redirect_stdout(io.StringIO()):
+            invoices, _ = parse_invoices_from_file(export_path, all_menu_items, name_mapping, price_to_items)
+        invoices = invoices[:args.count]
+        all_rows = [invoice_file_rows(invoice) for invoice in invoices]
+        n_rows = sum(len(rows) for rows in all_rows)
+        print(f"📄 {len(invoices):,} hóa đơn, {n_rows:,} dòng món")
+
+        def run(writer, out_dir):
+            os.makedirs(out_dir, exist_ok=True)
+            for i, rows in enumerate(all_rows):
+                writer(rows, os.path.join(out_dir, f'{i}.xlsx'), created)
+
+        old_dir = os.path.join(tmp, 'xlsxwriter')
+        new_dir = os.path.join(tmp, 'template')
+        _, old_time, old_peak = _measure(lambda: run(write_invoice_xlsxwriter, old_dir), args.repeat)
+        _, new_time, new_peak = _measure(lambda: run(write_invoice_template, new_dir), args.repeat)
+        _print_row('xlsxwriter', old_time, old_peak)
+        _print_row('template', new_time, new_peak)
+
+        same = 0
+        readable = 0
+        for i, rows in enumerate(all_rows):
+            with open(os.path.join(old_dir, f'{i}.xlsx'), 'rb') as f_old, \
+                    open(os.path.join(new_dir, f'{i}.xlsx'), 'rb') as f_new:
+                same += f_old.read() == f_new.read()
+            wb = openpyxl.load_workbook(os.path.join(new_dir, f'{i}.xlsx'), read_only=True)
+            values = [tuple(row) for row in wb.active.iter_rows(min_row=2, values_only=True)]
+            wb.close()
+            # Số được ghi với 16 chữ số có nghĩa (như xlsxwriter)
+            expected = [(1, None, name, unit or None, float(f'{quantity:.16G}'), float(f'{price:.16G}'))
+                        for name, unit, quantity, price in rows]
+            readable += values == expected
+        print(f"   Tăng tốc: x{old_time / new_time:.1f} | Giống hệt từng byte: {same}/{len(all_rows)} | "
+              f"openpyxl đọc đúng: {readable}/{len(all_rows)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark xử lý hóa đơn trên file giả lập.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_parse = sub.add_parser('parse', help='Parser split-based vs streaming')
+    p_parse.add_argument('--rows', type=int, default=100_000)
+    p_parse.add_argument('--repeat', type=int, default=1)
+    p_parse.set_defaults(func=bench_parse)
+
+    p_classify = sub.add_parser('classify', help='Vòng lặp tìm món cũ vs classify_cells')
+    p_classify.add_argument('--rows', type=int, default=100_000)
+    p_classify.add_argument('--repeat', type=int, default=3)
+    p_classify.set_defaults(func=bench_classify)
+
+    p_jobs = sub.add_parser('jobs', help='Parse tuần tự vs song song (--jobs N)')
+    p_jobs.add_argument('--rows', type=int, default=100_000)
+    p_jobs.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    p_jobs.add_argument('--repeat', type=int, default=1)
+    p_jobs.set_defaults(func=bench_jobs)
+
+    p_menu = sub.add_parser('menu', help='Đọc menu xlsx: ElementTree cũ vs iterparse (vs pandas)')
+    p_menu.add_argument('--rows', type=int, default=50_000)
+    p_menu.add_argument('--repeat', type=int, default=3)
+    p_menu.set_defaults(func=bench_menu)
+
+    p_grab = sub.add_parser('grab', help='Hóa đơn Grab: generator random (cũ) vs NumPy vs solver knapsack')
+    p_grab.add_argument('--count', type=int, default=20)
+    p_grab.add_argument('--min-total', type=int, default=300_000)
+    p_grab.add_argument('--max-total', type=int, default=12_000_000)
+    p_grab.add_argument('--seed', type=int, default=0)
+    p_grab.set_defaults(func=bench_grab)
+
+    p_xlsx = sub.add_parser('xlsx', help='Ghi file hóa đơn: xlsxwriter vs template dựng sẵn')
+    p_xlsx.add_argument('--count', type=int, default=1000)
+    p_xlsx.add_argument('--seed', type=int, default=0)
+    p_xlsx.add_argument('--repeat', type=int, default=1)
+    p_xlsx.set_defaults(func=bench_xlsx)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
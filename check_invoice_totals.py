@@ -2,11 +2,18 @@
 """
 Kiểm tra tổng tiền các món trong tất cả file hóa đơn
 Xem có khớp với tổng tiền trong tên file không
+(tổng tiền các món / số món lấy từ manifest tax_files, đối chiếu trước với thư mục)
 """
 
-import openpyxl
 from pathlib import Path
 import re
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation.invoice_manifest import open_manifest, rebuild_manifest, manifest_files
 
 def extract_total_from_filename(filename):
     """Trích xuất tổng tiền từ tên file (VD: 240002 - transfer - 642.600đ.xlsx -> 642600)"""
@@ -34,93 +41,75 @@ def check_invoice_totals():
     print("=" * 80)
     print()
     
+    manifest = open_manifest(tax_dir=tax_dir)
+    rebuild_manifest(manifest, tax_dir)
+    manifest.commit()
+    file_entries = manifest_files(manifest)
+    manifest.close()
+    
     issues = []
     total_files = 0
     correct_files = 0
     
-    for invoice_file in sorted(tax_dir.glob("*.xlsx")):
-        if invoice_file.name.startswith('.'):
-            continue
-            
+    for file_entry in file_entries:
         total_files += 1
-        try:
-            wb = openpyxl.load_workbook(invoice_file)
-            ws = wb.active
-            
-            # Lấy số hóa đơn từ tên file
-            invoice_number = invoice_file.stem.split(' - ')[0] if ' - ' in invoice_file.stem else invoice_file.stem
-            
-            # Trích xuất tổng tiền từ tên file (đã bao gồm VAT 8%)
-            expected_total_with_vat = extract_total_from_filename(invoice_file.name)
-            
-            # Tính tổng tiền các món từ file Excel
-            items_total = 0.0
-            items_count = 0
-            
-            for row in range(2, ws.max_row + 1):
-                product_name = ws.cell(row=row, column=3).value  # Ten_san_pham
-                quantity = ws.cell(row=row, column=5).value      # So_luong
-                price = ws.cell(row=row, column=6).value         # Don_gia
-                
-                if not product_name:
-                    continue
-                
-                # Bỏ qua header nếu có
-                if str(product_name).strip().lower() in ['ten_san_pham', 'tên sản phẩm', 'ten san pham']:
-                    continue
-                
-                try:
-                    qty = float(quantity) if quantity else 0
-                    prc = float(price) if price else 0
-                    item_total = qty * prc
-                    items_total += item_total
-                    items_count += 1
-                except (ValueError, TypeError):
-                    continue
+        file_name = file_entry['file']
+        
+        # Lấy số hóa đơn từ tên file
+        stem = Path(file_name).stem
+        invoice_number = stem.split(' - ')[0] if ' - ' in stem else stem
+        
+        if file_entry['read_error']:
+            issues.append({
+                'file': file_name,
+                'invoice_number': stem,
+                'error': f"Lỗi khi đọc file: {file_entry['read_error']}"
+            })
+            continue
+        
+        # Trích xuất tổng tiền từ tên file (đã bao gồm VAT 8%)
+        expected_total_with_vat = extract_total_from_filename(file_name)
+        
+        # Tổng tiền các món (chưa VAT) đã tính sẵn trong manifest
+        items_total = file_entry['items_total']
+        items_count = file_entry['item_count']
+        
+        # Tính tổng tiền có VAT (items_total * 1.08)
+        calculated_total_with_vat = items_total * 1.08
+        
+        # So sánh với tổng tiền trong tên file
+        if expected_total_with_vat:
+            diff = abs(calculated_total_with_vat - expected_total_with_vat)
+            diff_percent = (diff / expected_total_with_vat * 100) if expected_total_with_vat > 0 else 0
             
-            # Tính tổng tiền có VAT (items_total * 1.08)
-            calculated_total_with_vat = items_total * 1.08
+            # Cho phép sai số nhỏ (do làm tròn)
+            tolerance = 1.0  # 1 VND
             
-            # So sánh với tổng tiền trong tên file
-            if expected_total_with_vat:
-                diff = abs(calculated_total_with_vat - expected_total_with_vat)
-                diff_percent = (diff / expected_total_with_vat * 100) if expected_total_with_vat > 0 else 0
-                
-                # Cho phép sai số nhỏ (do làm tròn)
-                tolerance = 1.0  # 1 VND
-                
-                if diff > tolerance:
-                    issues.append({
-                        'file': invoice_file.name,
-                        'invoice_number': invoice_number,
-                        'expected': expected_total_with_vat,
-                        'calculated': calculated_total_with_vat,
-                        'items_total': items_total,
-                        'diff': diff,
-                        'diff_percent': diff_percent,
-                        'items_count': items_count
-                    })
-                else:
-                    correct_files += 1
-            else:
-                # Không tìm thấy tổng tiền trong tên file
+            if diff > tolerance:
                 issues.append({
-                    'file': invoice_file.name,
+                    'file': file_name,
                     'invoice_number': invoice_number,
-                    'expected': None,
+                    'expected': expected_total_with_vat,
                     'calculated': calculated_total_with_vat,
                     'items_total': items_total,
-                    'diff': None,
-                    'diff_percent': None,
-                    'items_count': items_count,
-                    'error': 'Không tìm thấy tổng tiền trong tên file'
+                    'diff': diff,
+                    'diff_percent': diff_percent,
+                    'items_count': items_count
                 })
-        
-        except Exception as e:
+            else:
+                correct_files += 1
+        else:
+            # Không tìm thấy tổng tiền trong tên file
             issues.append({
-                'file': invoice_file.name,
-                'invoice_number': invoice_file.stem,
-                'error': f'Lỗi khi đọc file: {str(e)}'
+                'file': file_name,
+                'invoice_number': invoice_number,
+                'expected': None,
+                'calculated': calculated_total_with_vat,
+                'items_total': items_total,
+                'diff': None,
+                'diff_percent': None,
+                'items_count': items_count,
+                'error': 'Không tìm thấy tổng tiền trong tên file'
             })
     
     # In kết quả
@@ -135,45 +124,10 @@ def check_invoice_totals():
         print("📈 THỐNG KÊ CHI TIẾT:")
         print("=" * 80)
         
-        # Tính lại để lấy thông tin chi tiết
-        all_totals = []
-        all_items_counts = []
-        
-        for invoice_file in sorted(tax_dir.glob("*.xlsx")):
-            if invoice_file.name.startswith('.'):
-                continue
-            try:
-                wb = openpyxl.load_workbook(invoice_file)
-                ws = wb.active
-                
-                items_total = 0.0
-                items_count = 0
-                
-                for row in range(2, ws.max_row + 1):
-                    product_name = ws.cell(row=row, column=3).value
-                    quantity = ws.cell(row=row, column=5).value
-                    price = ws.cell(row=row, column=6).value
-                    
-                    if not product_name:
-                        continue
-                    
-                    if str(product_name).strip().lower() in ['ten_san_pham', 'tên sản phẩm', 'ten san pham']:
-                        continue
-                    
-                    try:
-                        qty = float(quantity) if quantity else 0
-                        prc = float(price) if price else 0
-                        item_total = qty * prc
-                        items_total += item_total
-                        items_count += 1
-                    except (ValueError, TypeError):
-                        continue
-                
-                if items_total > 0:
-                    all_totals.append(items_total * 1.08)
-                    all_items_counts.append(items_count)
-            except:
-                pass
+        all_totals = [entry['items_total'] * 1.08 for entry in file_entries
+                      if not entry['read_error'] and entry['items_total'] > 0]
+        all_items_counts = [entry['item_count'] for entry in file_entries
+                            if not entry['read_error'] and entry['items_total'] > 0]
         
         if all_totals:
             print(f"   💰 Tổng tiền nhỏ nhất (có VAT): {min(all_totals):,.0f} VND")
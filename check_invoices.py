@@ -3,7 +3,8 @@
 """
 Script kiểm tra và lọc hóa đơn:
 1. Món chưa được chuyển sang format "Tiếng Việt / Tiếng Anh"
-2. Hóa đơn có bia/rượu đã được thay thế (bằng cách so sánh với menu gốc)
+2. Hóa đơn có bia/rượu đã được thay thế (theo sổ thay thế ghi lúc tạo file; file cũ chưa có
+   trong sổ → so sánh với menu gốc)
 """
 
 import openpyxl
@@ -18,7 +19,10 @@ PROJECT_ROOT = PACKAGE_DIR
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from Menu.parse_menu import parse_excel_menu
+from automation.menu_cache import load_cached_menu
+from automation.tax_classifier import is_tax_10_name, tax_name_flags, FLAG_COKE
+from automation.replacement_ledger import KIND_PARSE, open_replacement_ledger, file_replacements
+from automation.job_queue import report_job_progress
 
 def normalize_menu_key(s):
     """Chuẩn hóa chuỗi để so sánh tên món"""
@@ -36,29 +40,11 @@ def is_beverage_with_10_percent_tax(item_name):
     
     Lưu ý: Coke thường có 10% đường nên tính thuế 10% (giống bia/rượu)
     Coke Light và Coke Zero có lượng đường < 10g nên tính thuế 8%
+    Dùng chung bộ phân loại với process_invoices (automation/tax_classifier.py)
     """
     if not item_name:
         return False
-    
-    item_lower = item_name.lower()
-    
-    # Danh sách từ khóa cho bia/rượu
-    beverage_keywords = ['beer', 'bia', 'wine', 'rượu', 'whiskey', 'vodka', 'rum', 'gin', 'tequila', 
-                        'sake', 'soju', 'champagne', 'cocktail', 'martini', 'margarita']
-    
-    # Kiểm tra bia/rượu
-    if any(kw in item_lower for kw in beverage_keywords):
-        return True
-    
-    # Kiểm tra Coke (Coca-Cola) THƯỜNG - có 10% đường nên tính thuế 10% (giống bia/rượu)
-    # Loại trừ: Coke Zero, Coke Light, và các biến thể ít đường/không đường
-    if 'coke' in item_lower or 'coca' in item_lower:
-        exclude_keywords = ['zero', 'light', 'ít đường', 'không đường', 'it duong', 'khong duong', 'less sugar', 'no sugar']
-        is_coke_light_or_zero = any(exclude_kw in item_lower for exclude_kw in exclude_keywords)
-        if not is_coke_light_or_zero:
-            return True  # Coke thường (10% đường) tính thuế 10%
-    
-    return False
+    return is_tax_10_name(item_name)
 
 def load_menu_items():
     """Load tất cả menu items với giá gốc"""
@@ -74,7 +60,7 @@ def load_menu_items():
     for menu_file in menu_files:
         if menu_file.exists():
             try:
-                items = parse_excel_menu(str(menu_file))
+                items = load_cached_menu(menu_file)
                 for item in items:
                     all_menu_items.append(item)
                     price = item.get('price', 0)
@@ -119,8 +105,99 @@ def find_original_beverage_in_menu(original_price, menu_by_price):
     
     return None
 
+def beverage_item_type(original_name):
+    """Loại món gốc: Coke (10% đường) / Rượu / Bia/Rượu"""
+    original_name_lower = original_name.lower()
+    if tax_name_flags(original_name) & FLAG_COKE:
+        return "Coke (10% đường)"
+    if 'sangria' in original_name_lower or 'wine' in original_name_lower or 'rượu' in original_name_lower:
+        return "Rượu"
+    return "Bia/Rượu"
+
+def ledger_beverage_replacements(kind, rows):
+    """Món thay thế bia/rượu/Coke của 1 file theo sổ thay thế (replacement_ledger)"""
+    # Hóa đơn bia/rượu hằng ngày chỉ có món bia/rượu (không phải món thay thế) → không báo cáo
+    if kind != KIND_PARSE:
+        return []
+    return [{
+        'product': row['replacement_name'],
+        'price': float(row['adjusted_price']),
+        'original_beverage_name': row['original_name'],
+        'original_beverage_price': row['original_price'],
+        'item_type': beverage_item_type(row['original_name'])
+    } for row in rows if row['replacement_name'] != row['original_name']]
+
+def guess_beverage_replacements(product_rows, menu_by_price):
+    """
+    Đoán món thay thế bia/rượu/Coke từ giá trong file (file tạo trước khi có sổ thay thế):
+    giá có biến số ở 3 chữ số cuối + giá gốc tính ngược khớp với món bia/rượu/Coke trong menu.
+    product_rows: list of (tên món, đơn giá) đọc từ file.
+    """
+    beverages_replaced = []
+    for product_name_str, invoice_price in product_rows:
+        if not (invoice_price and isinstance(invoice_price, (int, float))):
+            continue
+        price_float = float(invoice_price)
+        price_int = int(price_float)
+        
+        # Bỏ qua nếu là phí dịch vụ
+        if 'phí dịch vụ' in product_name_str.lower() or 'service fee' in product_name_str.lower():
+            continue
+        
+        # Bỏ qua nếu món này là bia/rượu/Coke (không phải món thay thế)
+        if is_beverage_with_10_percent_tax(product_name_str):
+            continue
+        
+        # Giá có biến số ở 3 chữ số cuối (không phải số tròn)
+        last_3_digits = price_int % 1000
+        if last_3_digits == 0:
+            continue
+        
+        # Tính ngược lại giá gốc: giá_thay_thế * 1.08 / 1.1 = giá_bia_gốc
+        estimated_original_price = round(price_float * 1.08 / 1.1)
+        
+        # Giá gốc phải là số tròn (chia hết cho 1000) và trong khoảng hợp lý
+        is_round_price = (estimated_original_price % 1000 == 0)
+        if not (is_round_price and 20000 <= estimated_original_price <= 500000):
+            continue
+        
+        # Tìm món bia/rượu/Coke trong menu có giá thay thế khớp nhất với giá trong file
+        original_beverage = None
+        best_match = None
+        best_diff = float('inf')
+        
+        for menu_price, items in menu_by_price.items():
+            # Xét các giá trong khoảng ±10000 để bao quát hơn
+            if abs(menu_price - estimated_original_price) <= 10000:
+                for item in items:
+                    item_name = item.get('name', '')
+                    if is_beverage_with_10_percent_tax(item_name):
+                        # Tính giá thay thế từ giá menu này
+                        calc_replacement = round(menu_price * 1.10 / 1.08)
+                        diff = abs(price_float - calc_replacement)
+                        
+                        # Ưu tiên khớp chính xác (sai số <= 2), nhưng cũng chấp nhận gần đúng (sai số <= 10000)
+                        if diff <= 10000 and diff < best_diff:
+                            best_diff = diff
+                            best_match = menu_price
+                            original_beverage = item
+        
+        if original_beverage is not None and best_diff <= 10000:
+            original_name = original_beverage.get('name', f'Bia/Rượu/Coke giá {best_match:,}đ')
+            beverages_replaced.append({
+                'product': product_name_str,
+                'price': price_float,
+                'original_beverage_name': original_name,
+                'original_beverage_price': best_match,  # Sử dụng giá thực tế từ menu
+                'item_type': beverage_item_type(original_name)
+            })
+    return beverages_replaced
+
 def check_invoices():
-    """Kiểm tra tất cả hóa đơn trong tax_files bằng cách so sánh với menu gốc"""
+    """
+    Kiểm tra tất cả hóa đơn trong tax_files. Món thay thế bia/rượu lấy từ sổ thay thế
+    (ghi lúc tạo file); file không có trong sổ → đoán bằng cách so sánh với menu gốc.
+    """
     base_dir = Path(__file__).parent
     tax_dir = base_dir / "tax_files"
     
@@ -131,132 +208,42 @@ def check_invoices():
             'invoices_with_beverages': []
         }
     
-    # Load menu
-    print("📚 Đang load menu...")
-    all_menu_items, menu_by_price = load_menu_items()
-    print(f"   ✓ Đã load {len(all_menu_items)} món từ menu")
-    
-    # Tạo mapping tên món -> giá gốc từ menu
-    menu_name_to_price = {}
-    for item in all_menu_items:
-        name = item.get('name', '')
-        price = item.get('price', 0)
-        if name and price > 0:
-            # Map cả tên đầy đủ và phần tiếng Anh
-            menu_name_to_price[normalize_menu_key(name)] = price
-            if ' / ' in name:
-                parts = name.split(' / ', 1)
-                if len(parts) == 2:
-                    english_part = parts[1].strip()
-                    menu_name_to_price[normalize_menu_key(english_part)] = price
+    ledger = open_replacement_ledger()
+    menu_by_price = None  # Chỉ load menu khi có file không có trong sổ
     
     # Kết quả
     invoices_without_format = []  # Hóa đơn có món chưa format
     invoices_with_beverages = []  # Hóa đơn có bia/rượu đã thay thế
+    from_ledger = 0
     
     # Kiểm tra từng file hóa đơn
     print(f"\n🔍 Đang kiểm tra các file hóa đơn...")
     for invoice_file in sorted(tax_dir.glob("*.xlsx")):
         try:
-            wb = openpyxl.load_workbook(invoice_file)
+            wb = openpyxl.load_workbook(invoice_file, read_only=True)
             ws = wb.active
+            product_rows = [(str(row[2]), row[5]) for row in ws.iter_rows(min_row=2, max_col=6, values_only=True)
+                            if len(row) >= 6 and row[2]]
+            wb.close()
             
             # Lấy số hóa đơn từ tên file (format: SỐ_HÓA_ĐƠN - ...)
             invoice_number = invoice_file.stem.split(' - ')[0] if ' - ' in invoice_file.stem else invoice_file.stem
             
-            has_unformatted = False
-            beverages_replaced = []
+            # Kiểm tra 1: Món chưa có format "Tiếng Việt / Tiếng Anh"
+            has_unformatted = any(' / ' not in product_name for product_name, _ in product_rows)
             
-            # Kiểm tra từng món trong hóa đơn
-            for row in range(2, ws.max_row + 1):
-                product_name = ws.cell(row=row, column=3).value
-                invoice_price = ws.cell(row=row, column=6).value
-                
-                if not product_name:
-                    continue
-                
-                product_name_str = str(product_name)
-                
-                # Kiểm tra 1: Món chưa có format "Tiếng Việt / Tiếng Anh"
-                if ' / ' not in product_name_str:
-                    has_unformatted = True
-                
-                # Kiểm tra 2: Món có thể là bia/rượu đã được thay thế
-                # So sánh giá với menu để phát hiện món thay thế
-                if invoice_price and isinstance(invoice_price, (int, float)):
-                    price_float = float(invoice_price)
-                    price_int = int(price_float)
-                    
-                    # Bỏ qua nếu là phí dịch vụ
-                    if 'phí dịch vụ' in product_name_str.lower() or 'service fee' in product_name_str.lower():
-                        continue
-                    
-                    # Bỏ qua nếu món này là bia/rượu/Coke (không phải món thay thế)
-                    if is_beverage_with_10_percent_tax(product_name_str):
-                        continue
-                    
-                    # Tìm giá gốc của món này trong menu
-                    product_key = normalize_menu_key(product_name_str)
-                    menu_price = menu_name_to_price.get(product_key)
-                    
-                    # Nếu giá trong file khác với giá trong menu
-                    # VÀ giá có biến số ở 3 chữ số cuối (không phải số tròn)
-                    last_3_digits = price_int % 1000
-                    
-                    if last_3_digits != 0:  # Có biến số ở 3 chữ số cuối
-                        # Tính ngược lại giá gốc: giá_thay_thế * 1.08 / 1.1 = giá_bia_gốc
-                        estimated_original_price = round(price_float * 1.08 / 1.1)
-                        
-                        # Kiểm tra xem giá gốc có phải là số tròn (chia hết cho 1000) không
-                        is_round_price = (estimated_original_price % 1000 == 0)
-                        
-                        # Nếu giá gốc là số tròn và trong khoảng hợp lý
-                        if is_round_price and 20000 <= estimated_original_price <= 500000:
-                            # Tìm món bia/rượu/Coke trong menu có giá gần với giá gốc tính được
-                            # Tìm trong khoảng ±5000 để bao quát các giá khác nhau
-                            original_beverage = None
-                            best_match = None
-                            best_diff = float('inf')
-                            
-                            for menu_price, items in menu_by_price.items():
-                                # Xét các giá trong khoảng ±10000 để bao quát hơn
-                                if abs(menu_price - estimated_original_price) <= 10000:
-                                    for item in items:
-                                        item_name = item.get('name', '')
-                                        if is_beverage_with_10_percent_tax(item_name):
-                                            # Tính giá thay thế từ giá menu này
-                                            calc_replacement = round(menu_price * 1.10 / 1.08)
-                                            diff = abs(price_float - calc_replacement)
-                                            
-                                            # Tìm món có giá thay thế khớp nhất với giá trong file
-                                            # Ưu tiên khớp chính xác (sai số <= 2), nhưng cũng chấp nhận gần đúng (sai số <= 10000)
-                                            if diff <= 10000 and diff < best_diff:
-                                                best_diff = diff
-                                                best_match = menu_price
-                                                original_beverage = item
-                            
-                            # Nếu tìm thấy món bia/rượu/Coke với giá thay thế khớp (sai số <= 10000)
-                            # Ưu tiên khớp chính xác (sai số <= 2), nhưng cũng chấp nhận gần đúng (sai số <= 10000)
-                            if original_beverage is not None and best_diff <= 10000:
-                                original_name = original_beverage.get('name', f'Bia/Rượu/Coke giá {best_match:,}đ')
-                                original_beverage_price = best_match  # Sử dụng giá thực tế từ menu
-                                
-                                # Xác định loại: bia/rượu hay Coke (dựa vào giá và tên món)
-                                original_name_lower = original_name.lower()
-                                if 'coke' in original_name_lower or 'coca' in original_name_lower:
-                                    item_type = "Coke (10% đường)"
-                                elif 'sangria' in original_name_lower or 'wine' in original_name_lower or 'rượu' in original_name_lower:
-                                    item_type = "Rượu"
-                                else:
-                                    item_type = "Bia/Rượu"
-                                
-                                beverages_replaced.append({
-                                    'product': product_name_str,
-                                    'price': price_float,
-                                    'original_beverage_name': original_name,
-                                    'original_beverage_price': original_beverage_price,
-                                    'item_type': item_type
-                                })
+            # Kiểm tra 2: Món bia/rượu đã được thay thế
+            ledger_entry = file_replacements(ledger, invoice_file.name)
+            if ledger_entry is not None:
+                _, kind, rows = ledger_entry
+                beverages_replaced = ledger_beverage_replacements(kind, rows)
+                from_ledger += 1
+            else:
+                if menu_by_price is None:
+                    print("📚 Đang load menu...")
+                    all_menu_items, menu_by_price = load_menu_items()
+                    print(f"   ✓ Đã load {len(all_menu_items)} món từ menu")
+                beverages_replaced = guess_beverage_replacements(product_rows, menu_by_price)
             
             # Lưu kết quả
             if has_unformatted:
@@ -271,7 +258,11 @@ def check_invoices():
         
         except Exception as e:
             print(f"⚠️  Lỗi khi kiểm tra file {invoice_file.name}: {e}")
-            continue
+        
+        report_job_progress(checked=1)
+    
+    ledger.close()
+    print(f"   ✓ {from_ledger} file tra trong sổ thay thế")
     
     # Trả về kết quả
     return {
@@ -8,6 +8,13 @@ from pathlib import Path
 import openpyxl
 import sys
 
+PROJECT_ROOT = Path(__file__).resolve().parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation.export_reader import scan_export_file, read_export_span, span_rows
+from automation.invoice_manifest import open_manifest, rebuild_manifest, files_by_invoice
+
 def count_items_in_html_row(row, invoice_id):
     """Đếm số món trong 1 row HTML"""
     items = []
@@ -70,18 +77,24 @@ def count_items_in_html(content, invoice_id):
     if invoice_start_idx is None:
         return []
     
+    # Các row thuộc hóa đơn này (đến row mở đầu hóa đơn kế tiếp)
+    invoice_rows = [rows[invoice_start_idx]]
+    for row in rows[invoice_start_idx + 1:]:
+        if re.search(r'rowspan="\d+">(\d{6})</td>', row):
+            break
+        invoice_rows.append(row)
+    
+    return count_items_in_rows(invoice_rows)
+
+def count_items_in_span(file_path, offset, length):
+    """Đếm số món của 1 hóa đơn theo span (offset, length) — chỉ đọc đúng phần của hóa đơn đó"""
+    return count_items_in_rows(span_rows(read_export_span(file_path, offset, length)))
+
+def count_items_in_rows(invoice_rows):
+    """Đếm số món trong các row của 1 hóa đơn"""
     all_items = []
-    parsed_positions = set()  # Track vị trí đã parse trong mỗi row
     
-    # Parse các row thuộc hóa đơn này
-    for i in range(invoice_start_idx, len(rows)):
-        row = rows[i]
-        
-        # Kiểm tra xem có phải hóa đơn mới không
-        if i > invoice_start_idx:
-            if re.search(r'rowspan="\d+">(\d{6})</td>', row):
-                break
-        
+    for row in invoice_rows:
         # Parse items trong row này
         cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
         cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
@@ -331,23 +344,25 @@ def check_all_invoices():
     print("=" * 80)
     print()
     
-    # Đọc tất cả file input
-    all_html_content = ""
+    # Quét ranh giới hóa đơn của từng file (mmap, không decode cả file)
+    # invoice_id -> (file, offset, length); mã lặp lại thì lấy lần xuất hiện đầu tiên
+    invoice_spans = {}
     for input_file in input_files:
         print(f"📂 Đang đọc file: {input_file.name}")
         try:
-            with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-                all_html_content += f.read() + "\n"
+            for invoice_id, offset, length in scan_export_file(input_file):
+                invoice_spans.setdefault(invoice_id, (input_file, offset, length))
         except Exception as e:
             print(f"   ❌ Lỗi: {e}")
     
-    # Tìm tất cả số hóa đơn trong HTML
-    rows = all_html_content.split('<tr>')
-    invoice_ids = set()
-    for row in rows:
-        match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
-        if match:
-            invoice_ids.add(match.group(1))
+    invoice_ids = set(invoice_spans)
+    
+    # File output của từng mã hóa đơn: tra manifest (đối chiếu trước với thư mục)
+    manifest = open_manifest(tax_dir=tax_dir)
+    rebuild_manifest(manifest, tax_dir)
+    manifest.commit()
+    output_files = files_by_invoice(manifest, include_grab=False)
+    manifest.close()
     
     print(f"📊 Tìm thấy {len(invoice_ids)} hóa đơn trong file input")
     print()
@@ -358,15 +373,15 @@ def check_all_invoices():
     
     for invoice_id in sorted(invoice_ids):
         # Tìm file Excel tương ứng
-        matching_files = list(tax_dir.glob(f"{invoice_id} - *"))
-        if not matching_files:
+        output_file = output_files.get(invoice_id)
+        if not output_file:
             continue
         
-        excel_file = matching_files[0]
+        excel_file = tax_dir / output_file
         invoices_checked += 1
         
-        # Đếm món trong HTML
-        input_items = count_items_in_html(all_html_content, invoice_id)
+        # Đếm món trong HTML (chỉ đọc span của hóa đơn này)
+        input_items = count_items_in_span(*invoice_spans[invoice_id])
         
         # Đếm món trong Excel
         output_items = count_items_in_excel(excel_file)
@@ -5,8 +5,15 @@ Tìm các hóa đơn có tổng tiền 81k, 205k, 1.659k trong file gốc
 """
 
 import re
+import sys
 from pathlib import Path
 
+PROJECT_ROOT = Path(__file__).resolve().parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from automation.export_reader import ROW_MARKER_BYTES, open_export_map, scan_invoice_spans, span_rows
+
 def extract_invoices_from_html(content):
     """Trích xuất tất cả hóa đơn từ HTML content"""
     invoices_found = []
@@ -16,40 +23,64 @@ def extract_invoices_from_html(content):
         # Tìm số hóa đơn
         invoice_match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
         if invoice_match:
-            invoice_num = invoice_match.group(1)
-            
-            # Tìm tổng tiền trong row
-            cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-            cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
-            
-            # Tìm tổng tiền (thường ở cuối row)
-            total_amount = None
-            for cell in cells:
-                cell_clean = cell.replace(' ', '').replace(',', '').replace('.', '')
-                if cell_clean.isdigit() and len(cell_clean) >= 4:
-                    value = float(cell_clean)
-                    if value >= 50000:  # Tổng tiền thường >= 50k
-                        total_amount = value
-                        break
-            
-            # Tìm payment method
-            payment_method = None
-            row_upper = row.upper()
-            if 'ATM (' in row_upper or row_upper.startswith('ATM'):
-                payment_method = 'atm'
-            elif 'TRANSFER (' in row_upper or row_upper.startswith('TRANSFER'):
-                payment_method = 'transfer'
-            
-            if total_amount:
-                invoices_found.append({
-                    'invoice_id': invoice_num,
-                    'total': total_amount,
-                    'payment_method': payment_method,
-                    'row': row[:200]  # Lưu 200 ký tự đầu để debug
-                })
+            invoice = _invoice_summary_from_row(invoice_match.group(1), row)
+            if invoice:
+                invoices_found.append(invoice)
     
     return invoices_found
 
+def extract_invoices_from_file(file_path):
+    """
+    Giống extract_invoices_from_html nhưng quét ranh giới hóa đơn trên mmap:
+    chỉ decode row đầu (row có mã hóa đơn) của từng hóa đơn.
+    """
+    invoices_found = []
+    with open_export_map(file_path) as data:
+        for invoice_num, offset, length in scan_invoice_spans(data):
+            row_start = offset + len(ROW_MARKER_BYTES)
+            row_end = data.find(ROW_MARKER_BYTES, row_start, offset + length)
+            if row_end < 0:
+                row_end = offset + length
+            row = data[row_start:row_end].decode('utf-8', errors='ignore')
+            invoice = _invoice_summary_from_row(invoice_num, row)
+            if invoice:
+                invoices_found.append(invoice)
+    return invoices_found
+
+def _invoice_summary_from_row(invoice_num, row):
+    """Tổng tiền + payment method từ row mở đầu hóa đơn (None nếu không tìm thấy tổng tiền)"""
+    # Tìm tổng tiền trong row
+    cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
+    cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
+    
+    # Tìm tổng tiền (thường ở cuối row)
+    total_amount = None
+    for cell in cells:
+        cell_clean = cell.replace(' ', '').replace(',', '').replace('.', '')
+        if cell_clean.isdigit() and len(cell_clean) >= 4:
+            value = float(cell_clean)
+            if value >= 50000:  # Tổng tiền thường >= 50k
+                total_amount = value
+                break
+    
+    # Tìm payment method
+    payment_method = None
+    row_upper = row.upper()
+    if 'ATM (' in row_upper or row_upper.startswith('ATM'):
+        payment_method = 'atm'
+    elif 'TRANSFER (' in row_upper or row_upper.startswith('TRANSFER'):
+        payment_method = 'transfer'
+    
+    if not total_amount:
+        return None
+    
+    return {
+        'invoice_id': invoice_num,
+        'total': total_amount,
+        'payment_method': payment_method,
+        'row': row[:200]  # Lưu 200 ký tự đầu để debug
+    }
+
 def find_missing_invoices():
     """Tìm các hóa đơn bị bỏ sót"""
     base_dir = Path(__file__).parent
@@ -78,10 +109,7 @@ def find_missing_invoices():
     for input_file in input_files:
         print(f"📂 Đang đọc file: {input_file.name}")
         try:
-            with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            invoices = extract_invoices_from_html(content)
+            invoices = extract_invoices_from_file(input_file)
             all_invoices_from_input.extend(invoices)
             print(f"   ✓ Tìm thấy {len(invoices)} hóa đơn")
         except Exception as e:
@@ -157,35 +185,33 @@ def find_missing_invoices():
     print("=" * 80)
     print()
     
-    # Đọc lại file input để tìm bia 333
+    # Quét lại file input để tìm bia 333 — chỉ decode hóa đơn có chứa '333' / 'saigon'
     for input_file in input_files:
         try:
-            with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            
-            rows = content.split('<tr>')
-            current_invoice = None
+            with open_export_map(input_file) as data:
+                spans = scan_invoice_spans(data)
+                matched_spans = []
+                for current_invoice, offset, length in spans:
+                    raw = data[offset:offset + length]
+                    if b'333' in raw or b'saigon' in raw.lower():
+                        matched_spans.append((current_invoice, raw.decode('utf-8', errors='ignore')))
             
-            for row in rows:
-                # Tìm số hóa đơn
-                invoice_match = re.search(r'rowspan="\d+">(\d{6})</td>', row)
-                if invoice_match:
-                    current_invoice = invoice_match.group(1)
-                
-                # Tìm bia 333
-                if current_invoice and ('333' in row.upper() or 'saigon' in row.lower()):
-                    # Kiểm tra xem có phải là món bia không
-                    cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
-                    cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
+            for current_invoice, text in matched_spans:
+                for row in span_rows(text):
+                    # Tìm bia 333
+                    if '333' in row.upper() or 'saigon' in row.lower():
+                        # Kiểm tra xem có phải là món bia không
+                        cells = re.findall(r'<td[^>]*>(.*?)</td>', row)
+                        cells = [re.sub(r'<[^>]+>', '', cell).strip() for cell in cells]
                     
-                    for i, cell in enumerate(cells):
-                        if '333' in cell.upper() or 'saigon' in cell.lower():
-                            print(f"   HĐ {current_invoice}: Tìm thấy '{cell}' trong row")
-                            # In thêm context
-                            if i < len(cells) - 3:
-                                print(f"      Số lượng: {cells[i+1] if i+1 < len(cells) else 'N/A'}")
-                                print(f"      Đơn vị: {cells[i+2] if i+2 < len(cells) else 'N/A'}")
-                                print(f"      Giá: {cells[i+3] if i+3 < len(cells) else 'N/A'}")
+                        for i, cell in enumerate(cells):
+                            if '333' in cell.upper() or 'saigon' in cell.lower():
+                                print(f"   HĐ {current_invoice}: Tìm thấy '{cell}' trong row")
+                                # In thêm context
+                                if i < len(cells) - 3:
+                                    print(f"      Số lượng: {cells[i+1] if i+1 < len(cells) else 'N/A'}")
+                                    print(f"      Đơn vị: {cells[i+2] if i+2 < len(cells) else 'N/A'}")
+                                    print(f"      Giá: {cells[i+3] if i+3 < len(cells) else 'N/A'}")
         except Exception as e:
             print(f"   ❌ Lỗi khi đọc {input_file.name}: {e}")
 
@@ -164,7 +164,7 @@ async function resetSoftware() {
     }
 }
 
-// Process default
+// Process default (chạy thành job nền, theo dõi tiến độ qua /api/jobs/<id>)
 async function processDefault() {
     const btn = document.getElementById('btn-process');
     const originalText = btn.innerHTML;
@@ -172,14 +172,38 @@ async function processDefault() {
     btn.innerHTML = '<span class="btn-icon">⏳</span><span class="btn-text">Đang xử lý...</span>';
     
     try {
-        const response = await fetch(`${API_BASE}/api/process-default`, { method: 'POST' });
-        const data = await response.json();
+        const response = await fetch(`${API_BASE}/api/process-default`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ background: true })
+        });
+        const accepted = await response.json();
+        if (!accepted.job_id) {
+            throw new Error(accepted.error || 'Không tạo được job');
+        }
         
         const logPanel = document.getElementById('log-panel');
-        if (data.success) {
+        let job = null;
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            job = await (await fetch(`${API_BASE}/api/jobs/${accepted.job_id}`)).json();
+            const progress = job.progress || {};
+            btn.innerHTML = `<span class="btn-icon">⏳</span><span class="btn-text">Đang xử lý... ` +
+                `(đọc ${progress.parsed || 0}, ghi ${progress.written || 0})</span>`;
+            if (job.logs && job.logs.length) {
+                logPanel.innerHTML = `<div class="log-entry">${escapeHtml(job.logs.join('\n'))}</div>`;
+                logPanel.scrollTop = logPanel.scrollHeight;
+            }
+            if (!['queued', 'running'].includes(job.status)) {
+                break;
+            }
+        }
+        
+        const data = job.result || {};
+        if (job.status === 'done' && data.success) {
             const files = (data.files || []).map(f => `- ${f}`).join('\n');
             const msg = `✅ Đã tạo ${data.created} file trong tax_files\n${files}`;
-            const logs = (data.logs || []).join('\n');
+            const logs = (job.logs || []).join('\n');
             logPanel.innerHTML = `<div class="log-entry">${escapeHtml(msg)}</div>` +
                 (logs ? `<div class="log-entry">${escapeHtml(logs)}</div>` : '');
             logPanel.scrollTop = logPanel.scrollHeight;
@@ -196,7 +220,7 @@ async function processDefault() {
                 loadBeverageInvoices();
             }, 1500);
         } else {
-            logPanel.innerHTML = `<div class="log-entry">❌ Lỗi: ${escapeHtml(data.error || 'Unknown')}</div>`;
+            logPanel.innerHTML = `<div class="log-entry">❌ Lỗi: ${escapeHtml(job.error || data.error || job.status)}</div>`;
         }
     } catch (error) {
         alert('❌ Lỗi xử lý: ' + error.message);